@@ -1,35 +1,187 @@
 import os
+import threading
+import time
 
+import requests
 from dotenv import load_dotenv
 from fastapi import Depends, Header, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from jose import jwt
+from jose import JWTError, jwt
 
+from api.token_cache import token_cache
 from training.data_fetcher import get_data
+from training.metrics import TOKEN_VALIDATION_SECONDS
 
 load_dotenv()
 
 SERVER_URL = os.getenv('SERVER_URL')
 OAUTH2_SCHEME = OAuth2PasswordBearer(tokenUrl=f'{SERVER_URL}/api/token')
 
+# 'local' verifica a assinatura com a chave configurada, 'remote' consulta o backend Django e
+# 'auto' usa a verificação local sempre que houver uma chave ou um JWKS configurado.
+TOKEN_VALIDATION_MODE = os.getenv('TOKEN_VALIDATION_MODE', 'auto')
+JWT_SECRET_KEY = os.getenv('JWT_SECRET_KEY')
+JWT_ALGORITHMS = [algorithm.strip() for algorithm in os.getenv('JWT_ALGORITHMS', 'HS256').split(',')]
+JWT_JWKS_URL = os.getenv('JWT_JWKS_URL')
+JWT_JWKS_TTL = int(os.getenv('JWT_JWKS_TTL', 3600))
+# Intervalo mínimo (s) entre as buscas do JWKS disparadas por um ``kid`` desconhecido (rotação de chaves)
+JWT_JWKS_REFRESH_INTERVAL = int(os.getenv('JWT_JWKS_REFRESH_INTERVAL', 60))
+# Por quanto tempo (s) uma falha ao baixar o JWKS é lembrada, sem novas tentativas
+JWT_JWKS_FAILURE_TTL = int(os.getenv('JWT_JWKS_FAILURE_TTL', 30))
+# Claim e valor exigidos na verificação local: o SimpleJWT assina os refresh tokens com a mesma chave
+JWT_TOKEN_TYPE_CLAIM = os.getenv('JWT_TOKEN_TYPE_CLAIM', 'token_type')
+JWT_REQUIRED_TOKEN_TYPE = os.getenv('JWT_REQUIRED_TOKEN_TYPE', 'access')
+ADMIN_USER_IDS = {user.strip() for user in os.getenv('ADMIN_USER_IDS', '').split(',') if user.strip()}
+
+_jwks = {'keys': None, 'expires_at': 0.0, 'fetched_at': 0.0, 'failed_until': 0.0}
+_jwks_lock = threading.Lock()
+
+
+class SigningKeyUnavailable(Exception):
+    """O JWKS não pôde ser obtido ou não tem a chave do token; a validação deve ser feita pelo backend."""
+
+
+def get_validation_mode():
+    """
+    Resolve o modo de validação de tokens a partir da configuração.
+
+    :return: str - 'local' ou 'remote'.
+    """
+    if TOKEN_VALIDATION_MODE in ('local', 'remote'):
+        return TOKEN_VALIDATION_MODE
+    return 'local' if JWT_SECRET_KEY or JWT_JWKS_URL else 'remote'
+
+
+def _jwks_kids(keys):
+    return {key.get('kid') for key in (keys or {}).get('keys', [])}
+
+
+def _fetch_jwks(now: float):
+    # Chamado com _jwks_lock: uma falha fica registrada por JWT_JWKS_FAILURE_TTL para que as próximas requisições
+    # não esperem de novo pelo timeout antes de recorrer ao backend
+    try:
+        response = requests.get(JWT_JWKS_URL, timeout=5)
+        response.raise_for_status()
+        keys = response.json()
+    except (requests.RequestException, ValueError) as error:
+        _jwks['failed_until'] = now + JWT_JWKS_FAILURE_TTL
+        raise SigningKeyUnavailable(f'JWKS indisponível: {error}') from error
+    _jwks.update(keys=keys, expires_at=now + JWT_JWKS_TTL, fetched_at=now, failed_until=0.0)
+
+
+def get_signing_key(kid: str = None):
+    """
+    Obtém a chave usada para verificar a assinatura dos tokens.
+
+    Se houver um JWKS configurado, o conjunto de chaves é baixado uma vez e mantido em memória por JWT_JWKS_TTL
+    segundos. Um ``kid`` que não está no conjunto (chave nova, após uma rotação) provoca uma nova busca, no máximo
+    uma a cada JWT_JWKS_REFRESH_INTERVAL segundos. Caso contrário, é usada a chave secreta configurada.
+
+    :param kid: str (opcional) - Id da chave indicado no cabeçalho do token.
+    :return: str|dict - Chave secreta ou conjunto de chaves (JWKS).
+    :raises SigningKeyUnavailable: Se o JWKS não puder ser baixado (ou tiver falhado há pouco) ou não tiver a
+        chave do token.
+    """
+    if not JWT_JWKS_URL:
+        return JWT_SECRET_KEY
+
+    with _jwks_lock:
+        now = time.time()
+        expired = _jwks['keys'] is None or _jwks['expires_at'] <= now
+        unknown_kid = kid is not None and not expired and kid not in _jwks_kids(_jwks['keys'])
+        if expired or (unknown_kid and _jwks['fetched_at'] + JWT_JWKS_REFRESH_INTERVAL <= now):
+            if _jwks['failed_until'] > now:
+                raise SigningKeyUnavailable('JWKS indisponível (falha recente)')
+            _fetch_jwks(now)
+        if kid is not None and kid not in _jwks_kids(_jwks['keys']):
+            raise SigningKeyUnavailable(f'Chave {kid} não encontrada no JWKS')
+        return _jwks['keys']
+
+
+def verify_token_locally(token: str):
+    """
+    Verifica a assinatura, a expiração e o tipo do token (JWT_TOKEN_TYPE_CLAIM) sem consultar o backend.
+
+    :param token: str - Token JWT.
+    :return: dict|None - Payload decodificado ou None se o token for inválido.
+    :raises SigningKeyUnavailable: Se a chave do token não puder ser obtida do JWKS.
+    """
+    try:
+        kid = jwt.get_unverified_header(token).get('kid')
+        payload = jwt.decode(token, get_signing_key(kid), algorithms=JWT_ALGORITHMS)
+    except JWTError:
+        return None
+
+    if JWT_REQUIRED_TOKEN_TYPE and payload.get(JWT_TOKEN_TYPE_CLAIM) != JWT_REQUIRED_TOKEN_TYPE:
+        return None
+    return payload
+
+
+def verify_token_remotely(token: str):
+    """
+    Verifica o token consultando o backend Django e decodifica o payload sem verificar a assinatura.
+
+    :param token: str - Token JWT.
+    :return: dict|None - Payload decodificado ou None se o token for inválido.
+    """
+    result = get_data('validate-token', token=token)
+
+    if result and result.get('valid'):
+        return jwt.decode(token, key='', options={'verify_signature': False})
+    return None
+
 
 def verify_token(token: str = Depends(OAUTH2_SCHEME)):
     """
-    Verifica se a requisição possui um token válido (consultando o backend Django)
-    e retorna o payload, sem verificar a assinatura localmente.
+    Verifica se a requisição possui um token válido e retorna o payload.
+
+    A assinatura é verificada localmente (ou pelo backend Django, no modo 'remote' ou quando o JWKS não pode
+    ser obtido ou não tem a chave do token) e o resultado fica em cache até o TTL configurado ou a expiração do
+    token.
 
     :param token: str - Token JWT.
     :return: dict - Payload decodificado do token.
     """
-    token_is_valid = get_data('validate-token', token=token)['valid']
+    start = time.perf_counter()
+    payload = token_cache.get(token)
+    if payload is not None:
+        TOKEN_VALIDATION_SECONDS.observe(time.perf_counter() - start, source='cache', result='valid')
+        return payload
 
-    if token_is_valid:
-        payload = jwt.decode(token, key='', options={"verify_signature": False})
+    source = get_validation_mode()
+    if source == 'local':
+        try:
+            payload = verify_token_locally(token)
+        except SigningKeyUnavailable:
+            # Sem acesso ao JWKS (ou sem a chave do token nele), a validação volta a ser feita pelo backend Django
+            source = 'remote'
+            payload = verify_token_remotely(token)
+    else:
+        payload = verify_token_remotely(token)
+
+    TOKEN_VALIDATION_SECONDS.observe(
+        time.perf_counter() - start, source=source, result='valid' if payload is not None else 'invalid'
+    )
+    if payload is not None:
+        token_cache.put(token, payload)
         return payload
 
     raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Token inválido ou expirado')
 
 
+def verify_admin_token(payload: dict = Depends(verify_token)):
+    """
+    Verifica se o token pertence a um administrador: usuário listado em ADMIN_USER_IDS ou com as claims
+    ``is_staff``/``is_superuser`` do Django.
+
+    :param payload: dict - Payload do token já validado.
+    :return: dict - Payload decodificado do token.
+    """
+    if payload.get('is_staff') or payload.get('is_superuser') or str(payload.get('user_id')) in ADMIN_USER_IDS:
+        return payload
+    raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail='Acesso restrito a administradores')
+
+
 def get_token_from_header(authorization: str = Header(None)):
     """
     Extrai o token do header.
@@ -1,11 +1,106 @@
-from fastapi import Body, Depends, FastAPI, HTTPException
+import time
+from contextlib import asynccontextmanager
 
-from api.auth import get_token_from_header, verify_token
+from fastapi import Body, Depends, FastAPI, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
+
+from api.auth import get_token_from_header, verify_admin_token, verify_token
+from api.streaming import NDJSONStreamingResponse, stream_predictions
 from schemas.transaction import Transaction
-from training.predictors.description import DescriptionPredictor
-from training.predictors.subcategory import SubcategoryPredictor
+from training.feedback_buffer import feedback_buffer
+from training.jobs import get_predictor_class, job_manager
+from training.log import configure_logging
+from training.metrics import HTTP_REQUEST_SECONDS, registry
+from training.manifest import MODEL_DIR, manifest_for
+from training.model_cache import model_cache
+from training.prediction_cache import prediction_cache
+from training.warmup import warmup
+
+
+configure_logging()
+
+MAX_TOP_K = 20
+
+
+def subcategory_response(transaction: Transaction, result: dict, details: bool = False):
+    """
+    Monta a resposta de uma previsão de subcategoria: a categoria e a subcategoria previstas e, com ``details``, a
+    confiança, os candidatos e a origem da previsão (índice de descritores ou modelo).
+    """
+    if details:
+        return result
+    return {'category_id': result.get('category_id'), 'subcategory_id': result.get('subcategory_id')}
+
+
+def description_response(transaction: Transaction, result: dict, details: bool = False):
+    """
+    Monta a resposta de uma previsão de descrição: a descrição sugerida (ou a original, sem sugestão) e, com
+    ``details``, a confiança e os candidatos.
+    """
+    response = {'description': result.get('prediction') or transaction.description}
+    if details:
+        response['confidence'] = result.get('confidence')
+        response['candidates'] = result.get('candidates', [])
+    return response
+
+
+def retrain_if_evicted(classifier, token: str):
+    """
+    Enfileira um novo treinamento quando o modelo usado na previsão foi removido pela política de armazenamento
+    (ver training.model_store). Até o treinamento terminar, as previsões seguem como as de um usuário sem modelo.
+    Um novo pedido só é feito depois de MODEL_RETRAIN_BACKOFF segundos, caso o treinamento anterior tenha falhado.
+    """
+    if classifier.model_version == 0 and classifier.is_evicted() and classifier.claim_retrain():
+        job_manager.submit(classifier.type, classifier.user_id, token)
+
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Os preditores são importados e os modelos pré-carregados em segundo plano (ver training.warmup)
+    warmup.start()
+    yield
+    feedback_buffer.close()
+    job_manager.shutdown()
+
+
+app = FastAPI(lifespan=lifespan)
+
+
+@app.middleware('http')
+async def measure_request(request: Request, call_next):
+    """Mede a duração de cada requisição, usando o template da rota como label (ex: /jobs/{job_id})."""
+    start = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        route = request.scope.get('route')
+        HTTP_REQUEST_SECONDS.observe(
+            time.perf_counter() - start,
+            method=request.method,
+            route=route.path if route else 'unmatched',
+            status=status_code,
+        )
+
+
+@app.get('/metrics', response_class=PlainTextResponse)
+async def get_metrics():
+    """
+    Expõe as métricas do processo no formato do Prometheus.
+    """
+    return PlainTextResponse(registry.render(), media_type='text/plain; version=0.0.4')
+
+
+@app.get('/ready')
+async def get_ready():
+    """
+    Informa se o processo está aquecido (preditores importados e modelos pré-carregados), com o progresso do
+    aquecimento. Responde 503 enquanto não estiver pronto, para uso pelo balanceador de carga.
+    """
+    status = warmup.status()
+    return JSONResponse(status, status_code=200 if status['ready'] else 503)
 
 
 @app.get('/status')
@@ -13,21 +108,82 @@ async def get_status(payload: dict = Depends(verify_token)):
     """
     Obtém os dados do status de treinamento do modelo do usuário.
     """
-    classifier = SubcategoryPredictor(payload['user_id'])
+    classifier = get_predictor_class('subcategory')(payload['user_id'])
     return classifier.status()
 
 
+@app.get('/admin/models')
+async def list_models(
+    limit: int = Query(100, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
+    type: str = Query(None, pattern='^(subcategory|description)$'),
+    payload: dict = Depends(verify_admin_token),
+):
+    """
+    Lista os modelos treinados de todos os usuários a partir do manifesto, sem acessar os arquivos de modelo.
+
+    :limit: int - Tamanho da página.
+    :offset: int - Quantidade de registros a pular.
+    :type: str - (Opcional) Filtra por preditor.
+    """
+    page = manifest_for(MODEL_DIR).page(limit, offset, type)
+    return {'success': True, 'message': 'Dados obtidos com sucesso', 'data': {**page, 'limit': limit, 'offset': offset}}
+
+
+@app.get('/jobs/{job_id}')
+async def get_job(job_id: str, payload: dict = Depends(verify_token)):
+    """
+    Obtém o estado, o progresso, a duração e o resultado de um treinamento enfileirado.
+
+    :job_id: str - Identificador retornado pelos endpoints de treinamento.
+    """
+    job = job_manager.get(job_id)
+    if job is None or job['user_id'] != payload['user_id']:
+        raise HTTPException(status_code=404, detail='Job não encontrado')
+    return {'success': True, 'message': 'Dados obtidos com sucesso', 'data': job}
+
+
+@app.get('/model_cache/stats')
+async def get_model_cache_stats(payload: dict = Depends(verify_admin_token)):
+    """
+    Obtém os contadores do cache de modelos do processo (hits, misses, evictions e invalidações). Restrito a
+    administradores, pois as chaves do cache identificam os usuários atendidos pelo processo.
+    """
+    return {'success': True, 'message': 'Dados obtidos com sucesso', 'data': model_cache.stats()}
+
+
+@app.get('/prediction_cache/stats')
+async def get_prediction_cache_stats(payload: dict = Depends(verify_admin_token)):
+    """
+    Obtém os contadores do cache de previsões do processo (hits, misses, evictions, expirações e invalidações).
+    Restrito a administradores, pois os contadores refletem a atividade de todos os usuários do processo.
+    """
+    return {'success': True, 'message': 'Dados obtidos com sucesso', 'data': prediction_cache.stats()}
+
+
+@app.get('/feedback_buffer/stats')
+async def get_feedback_buffer_stats(payload: dict = Depends(verify_admin_token)):
+    """
+    Obtém os contadores do buffer de feedbacks (pendentes, consolidados, aplicações, falhas, novas tentativas e
+    descartes). Restrito a administradores, pois os contadores refletem a atividade de todos os usuários do processo.
+    """
+    return {'success': True, 'message': 'Dados obtidos com sucesso', 'data': feedback_buffer.stats()}
+
+
 @app.post('/subcategories_predictor/train')
-async def train_subcategory_model(payload: dict = Depends(verify_token), token: str = Depends(get_token_from_header)):
+async def train_subcategory_model(
+    incremental: bool = False, payload: dict = Depends(verify_token), token: str = Depends(get_token_from_header)
+):
     """
-    Processa os dados e treina um modelo para o usuário
+    Enfileira o treinamento do modelo de subcategorias do usuário e retorna o job criado.
 
+    :incremental: bool - Aprende apenas os lançamentos novos, se as categorias e subcategorias não mudaram.
     :payload: dict - Usado para autenticação.
     :token: str - Um token JWT criado pela aplicação Django que será usado na autentificação.
     """
     try:
-        classifier = SubcategoryPredictor(payload['user_id'])
-        return classifier.train(token)
+        job = job_manager.submit('subcategory', payload['user_id'], token, incremental=incremental)
+        return {'success': True, 'message': 'Treinamento enfileirado.', 'data': job}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e)) from e
 
@@ -35,64 +191,110 @@ async def train_subcategory_model(payload: dict = Depends(verify_token), token:
 @app.post('/subcategories_predictor/feedback')
 async def subcategory_feedback(feedbacks: list = Body(...), payload: dict = Depends(verify_token), token: str = Depends(get_token_from_header)):
     """
-    Processa os dados para dar feedback para o modelo
+    Recebe feedbacks para o modelo e devolve o resultado do re-treino. Com o buffer de feedbacks ativo, eles são
+    acumulados e aplicados em lote (ver training.feedback_buffer).
 
     :categorization_feedbacks - Lista de feedbacks
     :token: str - Um token JWT criado pela aplicação Django que será usado na autentificação.
     """
     try:
-        classifier = SubcategoryPredictor(payload['user_id'])
-        return classifier.retrain_from_feedback(feedbacks, token)
+        return feedback_buffer.add('subcategory', payload['user_id'], feedbacks, token)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e)) from e
 
 
 @app.post('/subcategories_predictor/predict')
-async def subcategory_predict(transaction: Transaction, payload: dict = Depends(verify_token)):
+async def subcategory_predict(
+    transaction: Transaction,
+    top_k: int = Query(1, ge=1, le=MAX_TOP_K),
+    details: bool = False,
+    payload: dict = Depends(verify_token),
+    token: str = Depends(get_token_from_header),
+):
     """
     Prediz a categoria e a subcategoria com base na descrição do lançamento
 
     :transaction: Transaction - Um objeto do tipo Transaction que contenha a descrição
+    :top_k: int - Quantidade de subcategorias candidatas retornadas em 'candidates', com suas probabilidades.
+    :details: bool - Inclui a confiança, os candidatos e a origem da previsão na resposta.
+    :token: str - Usado para treinar o modelo de novo, se ele tiver sido removido por falta de uso.
     """
     try:
-        classifier = SubcategoryPredictor(payload['user_id'])
-        result = classifier.predict(transaction.description, transaction.category or '')
-        return {'category_id': result['category_id'], 'subcategory_id': result['subcategory_id']}
+        classifier = get_predictor_class('subcategory')(payload['user_id'])
+        result = classifier.predict(transaction.description, transaction.category or '', top_k)
+        retrain_if_evicted(classifier, token)
+        return subcategory_response(transaction, result, details)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e)) from e
 
 
 @app.post('/subcategories_predictor/predict-batch')
-async def subcategory_predict_batch(transactions: list = Body(...), payload: dict = Depends(verify_token)):
+async def subcategory_predict_batch(
+    transactions: list[Transaction] = Body(...),
+    top_k: int = Query(1, ge=1, le=MAX_TOP_K),
+    details: bool = False,
+    payload: dict = Depends(verify_token),
+    token: str = Depends(get_token_from_header),
+):
     """
     Prediz as categorias e subcategorias com base nas descrições do lançamento.
 
     :transactions (list): Uma lista de objetos do tipo Transaction
+    :top_k: int - Quantidade de subcategorias candidatas por lançamento.
+    :details: bool - Inclui a confiança, os candidatos e a origem de cada previsão na resposta.
+    :token: str - Usado para treinar o modelo de novo, se ele tiver sido removido por falta de uso.
+    """
+    try:
+        classifier = get_predictor_class('subcategory')(payload['user_id'])
+        results = classifier.predict_many(transactions, top_k)
+        retrain_if_evicted(classifier, token)
+        return [
+            subcategory_response(transaction, result, details) for transaction, result in zip(transactions, results)
+        ]
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e)) from e
+
+
+@app.post('/subcategories_predictor/predict-stream')
+async def subcategory_predict_stream(
+    request: Request,
+    top_k: int = Query(1, ge=1, le=MAX_TOP_K),
+    details: bool = False,
+    payload: dict = Depends(verify_token),
+    token: str = Depends(get_token_from_header),
+):
+    """
+    Prediz as categorias e subcategorias de uma importação grande, em streaming: o corpo traz um lançamento JSON por
+    linha (NDJSON) e as previsões voltam em NDJSON, na mesma ordem, à medida que ficam prontas (ver api.streaming).
+
+    :request: Request - Corpo em NDJSON, com objetos no formato de Transaction.
+    :top_k: int - Quantidade de subcategorias candidatas por lançamento.
+    :details: bool - Inclui a confiança, os candidatos e a origem de cada previsão na resposta.
+    :token: str - Usado para treinar o modelo de novo, se ele tiver sido removido por falta de uso.
     """
     try:
-        classifier = SubcategoryPredictor(payload['user_id'])
-        results = []
-
-        for transaction_data in transactions:
-            transaction = Transaction(**transaction_data)
-            prediction = classifier.predict(transaction.description, transaction.category or '')
-            results.append(prediction)
-        return results
+        classifier = get_predictor_class('subcategory')(payload['user_id'])
+        classifier.load_model()
+        retrain_if_evicted(classifier, token)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e)) from e
+    predictions = stream_predictions(
+        request, classifier, top_k, lambda transaction, result: subcategory_response(transaction, result, details)
+    )
+    return NDJSONStreamingResponse(predictions)
 
 
 @app.post('/description_predictor/train')
 async def train_description_model(payload: dict = Depends(verify_token), token: str = Depends(get_token_from_header)):
     """
-    Processa os dados e treina um modelo para o usuário
+    Enfileira o treinamento do modelo de descrições do usuário e retorna o job criado.
 
     :payload: dict - Usado para autenticação.
     :token: str - Um token JWT criado pela aplicação Django que será usado na autentificação.
     """
     try:
-        classifier = DescriptionPredictor(payload['user_id'])
-        return classifier.train(token)
+        job = job_manager.submit('description', payload['user_id'], token)
+        return {'success': True, 'message': 'Treinamento enfileirado.', 'data': job}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e)) from e
 
@@ -102,29 +304,94 @@ async def description_feedback(
     feedbacks: list = Body(...), payload: dict = Depends(verify_token), token: str = Depends(get_token_from_header)
 ):
     """
-    Processa os dados para dar feedback para o modelo
+    Recebe feedbacks para o modelo e devolve o resultado do re-treino. Com o buffer de feedbacks ativo, eles são
+    acumulados e aplicados em lote (ver training.feedback_buffer).
 
     :categorization_feedbacks - Lista de feedbacks
     :token: str - Um token JWT criado pela aplicação Django que será usado na autentificação.
     """
     try:
-        classifier = DescriptionPredictor(payload['user_id'])
-        return classifier.retrain_from_feedback(feedbacks, token)
+        return feedback_buffer.add('description', payload['user_id'], feedbacks, token)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e)) from e
 
 
 @app.post('/description_predictor/predict')
-async def description_predict(transaction: Transaction, payload: dict = Depends(verify_token)):
+async def description_predict(
+    transaction: Transaction,
+    top_k: int = Query(1, ge=1, le=MAX_TOP_K),
+    details: bool = False,
+    payload: dict = Depends(verify_token),
+    token: str = Depends(get_token_from_header),
+):
     """
     Prediz a categoria e a subcategoria com base na descrição do lançamento
 
     :transaction: Transaction - Um objeto do tipo Transaction que contenha a descrição
+    :top_k: int - Quantidade de descrições candidatas retornadas em 'candidates', com suas probabilidades.
+    :details: bool - Inclui a confiança e os candidatos na resposta.
+    :token: str - Usado para treinar o modelo de novo, se ele tiver sido removido por falta de uso.
+    """
+    try:
+        classifier = get_predictor_class('description')(payload['user_id'])
+        result = classifier.predict(transaction.description, transaction.category or '', top_k)
+        retrain_if_evicted(classifier, token)
+        return description_response(transaction, result, details)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e)) from e
+
+
+@app.post('/description_predictor/predict-batch')
+async def description_predict_batch(
+    transactions: list[Transaction] = Body(...),
+    top_k: int = Query(1, ge=1, le=MAX_TOP_K),
+    details: bool = False,
+    payload: dict = Depends(verify_token),
+    token: str = Depends(get_token_from_header),
+):
+    """
+    Prediz as descrições corrigidas para vários lançamentos, carregando o modelo uma única vez.
+
+    :transactions (list): Uma lista de objetos do tipo Transaction
+    :top_k: int - Quantidade de descrições candidatas por lançamento.
+    :details: bool - Inclui a confiança e os candidatos de cada previsão na resposta.
+    :token: str - Usado para treinar o modelo de novo, se ele tiver sido removido por falta de uso.
+    """
+    try:
+        classifier = get_predictor_class('description')(payload['user_id'])
+        results = classifier.predict_many(transactions, top_k)
+        retrain_if_evicted(classifier, token)
+        return [
+            description_response(transaction, result, details) for transaction, result in zip(transactions, results)
+        ]
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e)) from e
+
+
+@app.post('/description_predictor/predict-stream')
+async def description_predict_stream(
+    request: Request,
+    top_k: int = Query(1, ge=1, le=MAX_TOP_K),
+    details: bool = False,
+    payload: dict = Depends(verify_token),
+    token: str = Depends(get_token_from_header),
+):
+    """
+    Prediz as descrições corrigidas de uma importação grande, em streaming (NDJSON na entrada e na saída, ver
+    api.streaming).
+
+    :request: Request - Corpo em NDJSON, com objetos no formato de Transaction.
+    :top_k: int - Quantidade de descrições candidatas por lançamento.
+    :details: bool - Inclui a confiança e os candidatos de cada previsão na resposta.
+    :token: str - Usado para treinar o modelo de novo, se ele tiver sido removido por falta de uso.
     """
     try:
-        classifier = DescriptionPredictor(payload['user_id'])
-        result = classifier.predict(transaction.description, transaction.category or '')
-        print(result)
-        return {'description': result['prediction'] or transaction.description}
+        classifier = get_predictor_class('description')(payload['user_id'])
+        classifier.load_model()
+        retrain_if_evicted(classifier, token)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e)) from e
+    predictions = stream_predictions(
+        request, classifier, top_k, lambda transaction, result: description_response(transaction, result, details)
+    )
+    return NDJSONStreamingResponse(predictions)
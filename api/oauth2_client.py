@@ -1,3 +1,4 @@
+import logging
 import os
 
 import redis
@@ -15,6 +16,8 @@ OAUTH2_TOKEN_URL = os.getenv('OAUTH2_TOKEN_URL')
 CLIENT_ID = os.getenv('CLIENT_ID')
 CLIENT_SECRET = os.getenv('CLIENT_SECRET')
 
+logger = logging.getLogger(__name__)
+
 
 class OAuth2Client:
     """Classe que gerencia a autenticação da aplicação."""
@@ -25,7 +28,7 @@ class OAuth2Client:
             self.redis.ping()
             self.cache_available = True
         except redis.exceptions.ConnectionError:
-            print('[OAuth2] Redis não disponível. Cache será ignorado.')
+            logger.warning('Redis não disponível. Cache será ignorado.')
             self.redis = None
             self.cache_available = False
 
@@ -37,7 +40,7 @@ class OAuth2Client:
                 if cached_token:
                     return cached_token.decode('utf-8')
             except redis.exceptions.RedisError as e:
-                print(f'[OAuth2] Erro ao acessar o Redis: {e}')
+                logger.warning('Erro ao acessar o Redis: %s', e)
         return self._request_token()
 
     def _request_token(self):
@@ -52,7 +55,7 @@ class OAuth2Client:
             response = requests.post(OAUTH2_TOKEN_URL, data=data, timeout=5)
             response.raise_for_status()
         except requests.RequestException as e:
-            print(f'[OAuth2] Erro ao requisitar token: {e}')
+            logger.error('Erro ao requisitar token: %s', e)
             raise
 
         token_info = response.json()
@@ -62,8 +65,8 @@ class OAuth2Client:
         if self.cache_available:
             try:
                 self.redis.setex(REDIS_KEY, expires_in - 60, access_token)
-                print('[OAuth2] Novo token armazenado no Redis.')
+                logger.info('Novo token armazenado no Redis.')
             except redis.exceptions.RedisError as e:
-                print(f'[OAuth2] Erro ao salvar token no Redis: {e}')
+                logger.warning('Erro ao salvar token no Redis: %s', e)
 
         return access_token
@@ -0,0 +1,155 @@
+"""
+Previsões em streaming (NDJSON) para importações de extratos grandes.
+
+O corpo da requisição é lido aos poucos, um lançamento JSON por linha, e os lançamentos são previstos em lotes de
+PREDICT_STREAM_CHUNK_SIZE com o modelo carregado uma única vez. Cada resultado é devolvido como uma linha NDJSON,
+na ordem da entrada, assim que o seu lote termina. Como o corpo só é lido quando o lote anterior foi enviado, um
+cliente lento limita a leitura (contrapressão) e a memória fica limitada a um lote e a uma linha de entrada.
+
+Linhas inválidas não interrompem a importação: o resultado correspondente traz ``success: false`` e o erro. Um
+erro que impeça a leitura (ex: linha maior que PREDICT_STREAM_MAX_LINE_BYTES) encerra o streaming com uma última
+linha de erro.
+"""
+
+import json
+import logging
+import os
+
+from pydantic import ValidationError
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import ClientDisconnect
+from starlette.responses import StreamingResponse
+
+from schemas.transaction import Transaction
+
+PREDICT_STREAM_CHUNK_SIZE = int(os.getenv('PREDICT_STREAM_CHUNK_SIZE', 256))
+PREDICT_STREAM_MAX_LINE_BYTES = int(os.getenv('PREDICT_STREAM_MAX_LINE_BYTES', 64 * 1024))
+
+NDJSON_MEDIA_TYPE = 'application/x-ndjson'
+
+logger = logging.getLogger(__name__)
+
+
+class StreamLineError(ValueError):
+    """Linha do corpo maior que PREDICT_STREAM_MAX_LINE_BYTES."""
+
+
+class NDJSONStreamingResponse(StreamingResponse):
+    """
+    Resposta em streaming que lê o corpo da requisição enquanto envia as previsões.
+
+    A StreamingResponse do Starlette escuta a desconexão do cliente em paralelo, chamando ``receive``, e com isso
+    consumiria as mensagens do corpo que o gerador ainda vai ler. Aqui só o gerador chama ``receive``: a
+    desconexão durante a leitura do corpo aparece como ClientDisconnect.
+    """
+
+    media_type = NDJSON_MEDIA_TYPE
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await self.stream_response(send)
+        except OSError:
+            raise ClientDisconnect()
+        if self.background is not None:
+            await self.background()
+
+
+async def read_lines(request, max_line_bytes: int = PREDICT_STREAM_MAX_LINE_BYTES):
+    """
+    Lê o corpo da requisição linha a linha, sem carregá-lo inteiro na memória.
+
+    :param request: Request - Requisição do FastAPI.
+    :param max_line_bytes: int - Tamanho máximo de uma linha.
+    :return: Gerador assíncrono de linhas (bytes), sem o separador.
+    :raises StreamLineError: Se uma linha passar do tamanho máximo.
+    """
+    buffer = b''
+    async for data in request.stream():
+        buffer += data
+        *lines, buffer = buffer.split(b'\n')
+        for line in lines:
+            if len(line) > max_line_bytes:
+                raise StreamLineError(f'Linha com mais de {max_line_bytes} bytes.')
+            yield line
+        if len(buffer) > max_line_bytes:
+            raise StreamLineError(f'Linha com mais de {max_line_bytes} bytes.')
+    if buffer:
+        yield buffer
+
+
+def parse_line(line: bytes):
+    """
+    Valida uma linha NDJSON como um lançamento.
+
+    :param line: bytes
+    :return: Transaction ou str - O lançamento ou a mensagem de erro.
+    """
+    try:
+        return Transaction.model_validate_json(line)
+    except ValidationError as e:
+        return f'Lançamento inválido: {e.errors(include_url=False)[0]["msg"]}'
+
+
+def predict_chunk(classifier, chunk: list, top_k: int, respond):
+    """
+    Prevê um lote do streaming com o modelo já carregado.
+
+    :param classifier: TransactionClassifier - Preditor com o modelo carregado.
+    :param chunk: list[tuple] - (número da linha, Transaction ou mensagem de erro).
+    :param top_k: int - Quantidade de candidatos por lançamento.
+    :param respond: Função que monta a resposta de um lançamento a partir de (Transaction, previsão).
+    :return: bytes - As linhas NDJSON do lote, na ordem da entrada.
+    """
+    transactions = [item for _, item in chunk if isinstance(item, Transaction)]
+    results = iter(classifier.predict_many(transactions, top_k, reload=False) if transactions else ())
+    lines = []
+    for line_number, item in chunk:
+        if isinstance(item, Transaction):
+            response = {'line': line_number, **respond(item, next(results))}
+        else:
+            response = {'line': line_number, 'success': False, 'message': item}
+        lines.append(json.dumps(response, ensure_ascii=False))
+    return ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+async def stream_predictions(request, classifier, top_k: int, respond, chunk_size: int = PREDICT_STREAM_CHUNK_SIZE):
+    """
+    Lê os lançamentos da requisição e devolve as previsões em NDJSON, lote a lote.
+
+    O modelo já deve estar carregado (``load_model``): todos os lotes usam a mesma versão. A previsão de cada lote
+    roda em uma thread, para não bloquear o event loop durante uma importação longa.
+
+    :param request: Request - Requisição com o corpo em NDJSON.
+    :param classifier: TransactionClassifier - Preditor com o modelo carregado.
+    :param top_k: int - Quantidade de candidatos por lançamento.
+    :param respond: Função que monta a resposta de um lançamento a partir de (Transaction, previsão).
+    :param chunk_size: int - Lançamentos por lote.
+    :return: Gerador assíncrono de blocos (bytes) com as linhas NDJSON.
+    """
+    chunk = []
+    line_number = 0
+    try:
+        async for line in read_lines(request):
+            line_number += 1
+            if not line.strip():
+                continue
+            chunk.append((line_number, parse_line(line)))
+            if len(chunk) >= chunk_size:
+                yield await run_in_threadpool(predict_chunk, classifier, chunk, top_k, respond)
+                chunk = []
+        if chunk:
+            yield await run_in_threadpool(predict_chunk, classifier, chunk, top_k, respond)
+    except ClientDisconnect:
+        logger.info(
+            'Cliente desconectou durante o streaming',
+            extra={'user_id': classifier.user_id, 'type': classifier.type, 'line': line_number},
+        )
+    except Exception as e:
+        # O status da resposta já foi enviado: o erro vira a última linha do streaming
+        logger.exception(
+            'Erro nas previsões em streaming', extra={'user_id': classifier.user_id, 'type': classifier.type}
+        )
+        # Uma linha longa demais é a seguinte à última lida
+        error_line = line_number + 1 if isinstance(e, StreamLineError) else line_number
+        error = {'line': error_line, 'success': False, 'message': f'Erro ao processar o streaming: {str(e)}'}
+        yield (json.dumps(error, ensure_ascii=False) + '\n').encode('utf-8')
@@ -0,0 +1,87 @@
+"""
+Cache limitado dos tokens JWT já validados.
+
+As entradas são indexadas pelo hash SHA-256 do token (o token em si não fica em memória) e expiram no que
+ocorrer primeiro: o TTL configurado ou o ``exp`` do próprio token.
+"""
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+TOKEN_CACHE_TTL = int(os.getenv('TOKEN_CACHE_TTL', 300))
+TOKEN_CACHE_MAX_ENTRIES = int(os.getenv('TOKEN_CACHE_MAX_ENTRIES', 10000))
+
+
+class TokenCache:
+    """Cache LRU com TTL dos payloads de tokens válidos."""
+
+    def __init__(self, ttl: int, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def token_hash(token: str):
+        return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+    def get(self, token: str):
+        """
+        Obtém o payload de um token validado anteriormente.
+
+        :param token: str - Token JWT.
+        :return: dict|None - Payload do token ou None se não estiver no cache ou tiver expirado.
+        """
+        key = self.token_hash(token)
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry['expires_at'] <= now:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry['payload']
+
+    def put(self, token: str, payload: dict):
+        """
+        Armazena o payload de um token válido.
+
+        :param token: str - Token JWT.
+        :param payload: dict - Payload decodificado do token.
+        """
+        if self.ttl <= 0 or self.max_entries <= 0:
+            return
+
+        expires_at = time.time() + self.ttl
+        if isinstance(payload.get('exp'), (int, float)):
+            expires_at = min(expires_at, payload['exp'])
+
+        key = self.token_hash(token)
+        with self._lock:
+            self._entries[key] = {'payload': payload, 'expires_at': expires_at}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """Esvazia o cache."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Retorna os contadores de uso do cache."""
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+
+token_cache = TokenCache(TOKEN_CACHE_TTL, TOKEN_CACHE_MAX_ENTRIES)
@@ -0,0 +1,5 @@
+"""
+Benchmarks de treinamento, previsão e re-treino por feedback com usuários sintéticos.
+
+Uso: ``python -m benchmarks.run --preset small`` e ``python -m benchmarks.compare antes.json depois.json``.
+"""
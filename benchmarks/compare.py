@@ -0,0 +1,85 @@
+"""
+Compara dois resultados de ``benchmarks.run``.
+
+Mostra, para cada métrica em comum, o valor de referência, o atual e a variação percentual. Tempos e
+tamanhos maiores que a referência acima do limite são regressões; com ``--fail`` o comando termina com
+código 1 quando houver alguma, para uso em CI.
+
+Exemplo::
+
+    python -m benchmarks.compare antes.json depois.json --threshold 10
+"""
+
+import argparse
+import json
+import sys
+
+COMPARED_STATS = ('mean_ms', 'p50_ms', 'p95_ms', 'p99_ms', 'per_item_ms')
+
+
+def flatten(results: dict, prefix: str = ''):
+    """
+    Extrai as métricas comparáveis do resultado.
+
+    :param results: dict - Seção 'results' do JSON.
+    :param prefix: str - Prefixo do caminho atual.
+    :return: dict - Caminho da métrica (ex: 'subcategory.predict.p95_ms') e valor.
+    """
+    metrics = {}
+    for key, value in results.items():
+        path = f'{prefix}.{key}' if prefix else key
+        if isinstance(value, dict):
+            metrics.update(flatten(value, path))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            if key in COMPARED_STATS or key.endswith('bytes'):
+                metrics[path] = value
+    return metrics
+
+
+def compare(baseline: dict, current: dict, threshold: float):
+    """
+    Imprime a comparação e retorna as regressões encontradas.
+
+    :param baseline: dict - Resultado de referência.
+    :param current: dict - Resultado atual.
+    :param threshold: float - Variação percentual a partir da qual um aumento é considerado regressão.
+    :return: list[str] - Métricas com regressão.
+    """
+    if baseline.get('config') != current.get('config'):
+        print('[Benchmark] Aviso: as configurações dos dois resultados são diferentes.')
+
+    before, after = flatten(baseline['results']), flatten(current['results'])
+    regressions = []
+
+    print(f'{"métrica":<52} {"referência":>12} {"atual":>12} {"variação":>9}')
+    for path in sorted(before.keys() & after.keys()):
+        old, new = before[path], after[path]
+        change = (new - old) / old * 100 if old else 0.0
+        flag = ''
+        if change > threshold:
+            flag = ' <-- regressão'
+            regressions.append(path)
+        print(f'{path:<52} {old:>12.2f} {new:>12.2f} {change:>+8.1f}%{flag}')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compara dois resultados de benchmark.')
+    parser.add_argument('baseline')
+    parser.add_argument('current')
+    parser.add_argument('--threshold', type=float, default=10.0, help='Variação (%%) considerada regressão.')
+    parser.add_argument('--fail', action='store_true', help='Termina com código 1 se houver regressão.')
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+
+    regressions = compare(baseline, current, args.threshold)
+    print(f'{len(regressions)} regressão(ões) acima de {args.threshold:.0f}%.')
+    return 1 if regressions and args.fail else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
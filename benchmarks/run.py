@@ -0,0 +1,385 @@
+"""
+Executa os benchmarks dos preditores com um usuário sintético e grava o resultado em JSON.
+
+Os dados vêm de ``benchmarks.synthetic`` e são servidos por um backend local que substitui ``get_data``,
+``get_many_data`` e ``iter_pages`` nos módulos dos preditores, de modo que nenhuma requisição HTTP é feita e
+o tempo medido é só o do classificador. Os modelos são gravados em um diretório temporário.
+
+Exemplos::
+
+    python -m benchmarks.run --preset small
+    python -m benchmarks.run --transactions 50000 --subcategories 200 --output /tmp/bench.json
+    python -m benchmarks.compare benchmarks/results/antes.json benchmarks/results/depois.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from importlib import metadata
+
+from benchmarks.synthetic import PRESETS, SyntheticDataset
+from training.data_fetcher import DATA_FETCHER_PAGE_SIZE
+from training.log import configure_logging
+from training.model_cache import model_cache
+from training.prediction_cache import prediction_cache
+from training.predictors import description as description_module
+from training.predictors import subcategory as subcategory_module
+from training.predictors.description import DescriptionPredictor
+from training.predictors.subcategory import SubcategoryPredictor
+
+BENCHMARK_USER_ID = 'benchmark'
+RESULTS_DIR = os.path.join('benchmarks', 'results')
+
+
+class LocalBackend:
+    """Substitui o acesso à API Django pelos dados de um SyntheticDataset enquanto estiver ativo."""
+
+    patched_modules = (subcategory_module, description_module)
+
+    def __init__(self, dataset: SyntheticDataset, page_size: int = DATA_FETCHER_PAGE_SIZE):
+        self.resources = dataset.resources()
+        self.page_size = page_size
+        self._originals = []
+
+    def get_data(self, resource: str, token=None):
+        return self.resources.get(resource.split('?')[0].strip('/'))
+
+    def get_many_data(self, resources: list[str], token=None):
+        return [self.get_data(resource, token) for resource in resources]
+
+    def iter_pages(self, resource: str, token=None, page_size: int = None, params: dict = None):
+        page_size = page_size or self.page_size
+        watermark = (params or {}).get('id__gt')
+        items = self.get_data(resource) or []
+        if watermark is not None:
+            items = [item for item in items if item['id'] > watermark]
+        for start in range(0, len(items), page_size):
+            yield items[start : start + page_size], len(items)
+
+    def __enter__(self):
+        for module in self.patched_modules:
+            for name in ('get_data', 'get_many_data', 'iter_pages'):
+                if hasattr(module, name):
+                    self._originals.append((module, name, getattr(module, name)))
+                    setattr(module, name, getattr(self, name))
+        return self
+
+    def __exit__(self, *exc_info):
+        for module, name, original in reversed(self._originals):
+            setattr(module, name, original)
+        self._originals.clear()
+
+
+def summarize(samples: list[float]):
+    """
+    Resume uma lista de durações.
+
+    :param samples: list[float] - Durações em segundos.
+    :return: dict - Quantidade, total e percentis em milissegundos.
+    """
+    if not samples:
+        return {'n': 0}
+
+    ordered = sorted(samples)
+
+    def percentile(p):
+        return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))] * 1000
+
+    return {
+        'n': len(samples),
+        'total_s': sum(samples),
+        'mean_ms': statistics.fmean(samples) * 1000,
+        'min_ms': ordered[0] * 1000,
+        'p50_ms': percentile(50),
+        'p95_ms': percentile(95),
+        'p99_ms': percentile(99),
+        'max_ms': ordered[-1] * 1000,
+    }
+
+
+def measure(function, repeat: int = 1):
+    """
+    Executa uma função várias vezes, medindo cada execução.
+
+    :param function: Callable - Função sem argumentos.
+    :param repeat: int - Número de execuções.
+    :return: tuple - (durações em segundos, resultado da última execução).
+    """
+    samples, result = [], None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        samples.append(time.perf_counter() - start)
+    return samples, result
+
+
+def chunks(items: list, size: int):
+    return [items[start : start + size] for start in range(0, len(items), size)]
+
+
+class PredictorBenchmark:
+    """Mede as operações de um preditor com os dados de um SyntheticDataset."""
+
+    def __init__(self, predictor_class, dataset: SyntheticDataset, model_dir: str, options: argparse.Namespace):
+        self.predictor_class = predictor_class
+        self.dataset = dataset
+        self.model_dir = model_dir
+        self.options = options
+
+    def predictor(self):
+        # Cada requisição da API cria uma nova instância do preditor, então o benchmark faz o mesmo
+        predictor = self.predictor_class(BENCHMARK_USER_ID)
+        predictor.model_dir = self.model_dir
+        return predictor
+
+    def queries(self):
+        """Descrições inéditas no formato do extrato, de estabelecimentos conhecidos."""
+        rng = self.dataset.random
+        queries = []
+        for _ in range(self.options.predictions):
+            subcategory = rng.choice(self.dataset.subcategories)
+            merchant = rng.choice(self.dataset.merchants[subcategory['id']])
+            queries.append({'description': self.dataset.noisy_description(merchant), 'category': ''})
+        return queries
+
+    def feedbacks(self):
+        raise NotImplementedError
+
+    def run(self):
+        results = {}
+
+        train_samples, train_result = measure(lambda: self.predictor().train('benchmark'), self.options.train_repeat)
+        results['train'] = summarize(train_samples)
+        results['train']['result'] = train_result
+
+        filepath = self.predictor().get_model_path()
+        results['model_file_bytes'] = os.path.getsize(filepath)
+
+        loaded = self.predictor()
+        results['load_model'] = summarize(measure(lambda: loaded.load_model(use_cache=False), self.options.repeat)[0])
+        results['save_model'] = summarize(measure(loaded.save_model, self.options.repeat)[0])
+
+        # O cache de previsões é esvaziado antes de cada etapa para medir o modelo; predict_cached mede as repetições
+        queries = self.queries()
+        model_cache.clear()
+        prediction_cache.clear()
+        results['predict_cold'] = summarize(
+            measure(lambda: self.predictor().predict(queries[0]['description'], queries[0]['category']))[0]
+        )
+        samples = []
+        for query in queries:
+            predictor = self.predictor()
+            start = time.perf_counter()
+            predictor.predict(query['description'], query['category'])
+            samples.append(time.perf_counter() - start)
+        results['predict'] = summarize(samples)
+
+        samples = []
+        for query in queries:
+            predictor = self.predictor()
+            start = time.perf_counter()
+            predictor.predict(query['description'], query['category'])
+            samples.append(time.perf_counter() - start)
+        results['predict_cached'] = summarize(samples)
+
+        prediction_cache.clear()
+        samples = []
+        for batch in chunks(queries, self.options.batch_size):
+            predictor = self.predictor()
+            start = time.perf_counter()
+            predictor.predict_many(batch)
+            samples.append(time.perf_counter() - start)
+        results['predict_batch'] = summarize(samples)
+        results['predict_batch']['batch_size'] = self.options.batch_size
+        total_s = results['predict_batch'].get('total_s', 0)
+        results['predict_batch']['per_item_ms'] = total_s * 1000 / len(queries) if queries else 0.0
+
+        samples = []
+        for batch in chunks(self.feedbacks(), self.options.feedback_batch):
+            predictor = self.predictor()
+            start = time.perf_counter()
+            predictor.retrain_from_feedback(batch, 'benchmark')
+            samples.append(time.perf_counter() - start)
+        results['retrain_from_feedback'] = summarize(samples)
+        results['retrain_from_feedback']['feedback_batch'] = self.options.feedback_batch
+        results['model_file_bytes_after_feedback'] = os.path.getsize(filepath)
+        return results
+
+
+class SubcategoryBenchmark(PredictorBenchmark):
+    def __init__(self, dataset, model_dir, options):
+        super().__init__(SubcategoryPredictor, dataset, model_dir, options)
+
+    def feedbacks(self):
+        return self.dataset.subcategory_feedbacks
+
+    def run(self):
+        results = super().run()
+
+        # Atualização incremental com 1% de lançamentos novos
+        transactions = self.dataset.transactions
+        new_count = max(1, len(transactions) // 100)
+        last_id = transactions[-1]['id'] if transactions else 0
+        new_transactions = [
+            {**transaction, 'id': last_id + i} for i, transaction in enumerate(transactions[:new_count], 1)
+        ]
+        transactions.extend(new_transactions)
+        try:
+            samples, _ = measure(lambda: self.predictor().train('benchmark', incremental=True))
+        finally:
+            del transactions[-new_count:]
+        results['train_incremental'] = summarize(samples)
+        results['train_incremental']['new_transactions'] = new_count
+        return results
+
+
+class DescriptionBenchmark(PredictorBenchmark):
+    def __init__(self, dataset, model_dir, options):
+        super().__init__(DescriptionPredictor, dataset, model_dir, options)
+
+    def feedbacks(self):
+        return self.dataset.description_feedbacks
+
+
+BENCHMARKS = {'subcategory': SubcategoryBenchmark, 'description': DescriptionBenchmark}
+
+
+def environment():
+    """Informações do ambiente, para que resultados de máquinas diferentes não sejam comparados por engano."""
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    versions = {}
+    for package in ('river', 'numpy', 'scipy', 'fastapi'):
+        try:
+            versions[package] = metadata.version(package)
+        except metadata.PackageNotFoundError:
+            versions[package] = None
+
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'processor': platform.processor() or platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'commit': commit,
+        'packages': versions,
+    }
+
+
+def run(options: argparse.Namespace):
+    """
+    Executa os benchmarks selecionados.
+
+    :param options: argparse.Namespace - Opções da linha de comando.
+    :return: dict - Resultado completo, serializável em JSON.
+    """
+    preset = PRESETS[options.preset]
+    config = {
+        'preset': options.preset,
+        'transactions': options.transactions or preset['transactions'],
+        'subcategories': options.subcategories or preset['subcategories'],
+        'feedbacks': options.feedbacks or preset['feedbacks'],
+        'seed': options.seed,
+        'predictions': options.predictions,
+        'batch_size': options.batch_size,
+        'feedback_batch': options.feedback_batch,
+        'repeat': options.repeat,
+        'page_size': options.page_size,
+    }
+
+    start = time.perf_counter()
+    dataset = SyntheticDataset(
+        transactions=config['transactions'],
+        subcategories=config['subcategories'],
+        feedbacks=config['feedbacks'],
+        seed=options.seed,
+    )
+    generation_s = time.perf_counter() - start
+
+    results = {}
+    try:
+        with tempfile.TemporaryDirectory(prefix='benchmark-models-') as model_dir, LocalBackend(
+            dataset, options.page_size
+        ):
+            for name in options.predictors:
+                print(
+                    f'[Benchmark] {name}: {config["transactions"]} lançamentos, '
+                    f'{config["subcategories"]} subcategorias'
+                )
+                model_cache.clear()
+                results[name] = BENCHMARKS[name](dataset, model_dir, options).run()
+    finally:
+        model_cache.clear()
+        prediction_cache.clear()
+
+    return {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'environment': environment(),
+        'config': config,
+        'dataset_generation_s': generation_s,
+        'results': results,
+    }
+
+
+def print_summary(report: dict):
+    print(
+        f'{"preditor":<12} {"operação":<24} {"n":>6} {"média ms":>10} '
+        f'{"p50 ms":>10} {"p95 ms":>10} {"p99 ms":>10}'
+    )
+    for name, results in report['results'].items():
+        for operation, value in results.items():
+            if isinstance(value, dict) and value.get('n'):
+                print(
+                    f'{name:<12} {operation:<24} {value["n"]:>6} {value["mean_ms"]:>10.2f} {value["p50_ms"]:>10.2f} '
+                    f'{value["p95_ms"]:>10.2f} {value["p99_ms"]:>10.2f}'
+                )
+        print(f'{name:<12} {"arquivo do modelo":<24} {results["model_file_bytes"]:>6} bytes')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks dos preditores com dados sintéticos.')
+    parser.add_argument('--preset', default='small', choices=list(PRESETS))
+    parser.add_argument('--transactions', type=int, help='Sobrescreve a quantidade de lançamentos do preset.')
+    parser.add_argument('--subcategories', type=int, help='Sobrescreve a quantidade de subcategorias do preset.')
+    parser.add_argument('--feedbacks', type=int, help='Sobrescreve a quantidade de feedbacks do preset.')
+    parser.add_argument('--predictors', nargs='+', default=list(BENCHMARKS), choices=list(BENCHMARKS))
+    parser.add_argument('--predictions', type=int, default=1000, help='Previsões individuais medidas.')
+    parser.add_argument('--batch-size', type=int, default=100, help='Tamanho dos lotes de predict_many.')
+    parser.add_argument('--feedback-batch', type=int, default=10, help='Feedbacks por chamada de re-treino.')
+    parser.add_argument('--repeat', type=int, default=5, help='Repetições de save_model/load_model.')
+    parser.add_argument('--train-repeat', type=int, default=1, help='Repetições do treinamento completo.')
+    parser.add_argument('--page-size', type=int, default=DATA_FETCHER_PAGE_SIZE)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='Arquivo JSON de saída. Padrão: benchmarks/results/<preset>-<data>.json')
+    parser.add_argument('--verbose', action='store_true', help='Mostra os logs dos preditores (nível DEBUG).')
+    options = parser.parse_args()
+
+    if options.verbose:
+        configure_logging('DEBUG')
+
+    report = run(options)
+
+    output = options.output or os.path.join(
+        RESULTS_DIR, f'{options.preset}-{datetime.now().strftime("%Y%m%d-%H%M%S")}.json'
+    )
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False, default=str)
+
+    print_summary(report)
+    print(f'Resultado gravado em {output}')
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,183 @@
+"""
+Gerador de dados sintéticos no formato da API Django.
+
+Produz categorias, subcategorias, lançamentos e feedbacks com as características dos dados reais: poucas
+subcategorias concentram a maior parte dos lançamentos (distribuição de Zipf), cada subcategoria tem um
+conjunto próprio de estabelecimentos e as descrições trazem ruído de extrato bancário (prefixos de
+adquirente, datas, parcelas, cidades e códigos numéricos).
+"""
+
+import random
+
+CATEGORY_NAMES = [
+    'Alimentação',
+    'Transporte',
+    'Moradia',
+    'Saúde',
+    'Educação',
+    'Lazer',
+    'Vestuário',
+    'Serviços',
+    'Impostos',
+    'Investimentos',
+    'Pets',
+    'Viagem',
+]
+
+SUBCATEGORY_NAMES = [
+    'Supermercado',
+    'Restaurante',
+    'Padaria',
+    'Delivery',
+    'Combustível',
+    'Aplicativo de transporte',
+    'Estacionamento',
+    'Pedágio',
+    'Aluguel',
+    'Condomínio',
+    'Energia',
+    'Água',
+    'Internet',
+    'Farmácia',
+    'Consulta',
+    'Plano de saúde',
+    'Mensalidade',
+    'Livros',
+    'Cinema',
+    'Streaming',
+    'Academia',
+    'Roupas',
+    'Calçados',
+    'Telefonia',
+    'Seguro',
+    'IPVA',
+    'IPTU',
+    'Corretora',
+    'Pet shop',
+    'Hotel',
+    'Passagem aérea',
+]
+
+PREFIXES = ['', '', '', 'PAG*', 'PIX ', 'COMPRA CARTAO ', 'DEB AUT ', 'MP*', 'PAYPAL *', 'IFD*']
+CITIES = ['', '', 'CURITIBA', 'SAO PAULO', 'BELO HORIZONT', 'PORTO ALEGRE', 'RIO DE JANEIR', 'RECIFE']
+SYLLABLES = ['ma', 'ra', 'to', 'be', 'lu', 'ca', 'sol', 'mer', 'vi', 'no', 'pe', 'dro', 'an', 'tar', 'gus', 'li']
+SUFFIXES = ['', '', 'LTDA', 'SA', 'ME', 'EIRELI', 'COM', 'BR']
+
+PRESETS = {
+    'tiny': {'transactions': 100, 'subcategories': 10, 'feedbacks': 20},
+    'small': {'transactions': 1_000, 'subcategories': 30, 'feedbacks': 100},
+    'medium': {'transactions': 10_000, 'subcategories': 100, 'feedbacks': 500},
+    'large': {'transactions': 100_000, 'subcategories': 250, 'feedbacks': 2_000},
+    'xlarge': {'transactions': 1_000_000, 'subcategories': 500, 'feedbacks': 10_000},
+}
+
+
+class SyntheticDataset:
+    """Conjunto de dados sintético e reprodutível de um usuário."""
+
+    def __init__(
+        self,
+        transactions: int = 1_000,
+        subcategories: int = 30,
+        feedbacks: int = 100,
+        merchants_per_subcategory: int = 8,
+        seed: int = 42,
+    ):
+        self.random = random.Random(seed)
+        self.categories = self.build_categories(min(len(CATEGORY_NAMES), max(1, subcategories // 3)))
+        self.subcategories = self.build_subcategories(subcategories)
+        self.merchants = {
+            subcategory['id']: [self.merchant_name() for _ in range(merchants_per_subcategory)]
+            for subcategory in self.subcategories
+        }
+        self.transactions = self.build_transactions(transactions)
+        self.subcategory_feedbacks = self.build_subcategory_feedbacks(feedbacks)
+        self.description_feedbacks = self.build_description_feedbacks(feedbacks)
+
+    def build_categories(self, count: int):
+        return [{'id': i, 'description': name} for i, name in enumerate(CATEGORY_NAMES[:count], 1)]
+
+    def build_subcategories(self, count: int):
+        subcategories = []
+        for i in range(1, count + 1):
+            name = SUBCATEGORY_NAMES[(i - 1) % len(SUBCATEGORY_NAMES)]
+            if i > len(SUBCATEGORY_NAMES):
+                name = f'{name} {(i - 1) // len(SUBCATEGORY_NAMES) + 1}'
+            category = self.categories[(i - 1) % len(self.categories)]['id']
+            subcategories.append({'id': i, 'description': name, 'category': category})
+        return subcategories
+
+    def merchant_name(self):
+        name = ''.join(self.random.choice(SYLLABLES) for _ in range(self.random.randint(2, 4))).upper()
+        if self.random.random() < 0.4:
+            name += ' ' + ''.join(self.random.choice(SYLLABLES) for _ in range(2)).upper()
+        return f'{name} {self.random.choice(SUFFIXES)}'.strip()
+
+    def noisy_description(self, merchant: str):
+        """
+        Monta uma descrição como aparece no extrato, a partir do nome do estabelecimento.
+
+        :param merchant: str - Nome do estabelecimento.
+        :return: str
+        """
+        parts = [self.random.choice(PREFIXES) + merchant]
+        roll = self.random.random()
+        if roll < 0.25:
+            parts.append(f'{self.random.randint(1, 28):02d}/{self.random.randint(1, 12):02d}')
+        elif roll < 0.35:
+            parts.append(f'PARC {self.random.randint(1, 6):02d}/{self.random.randint(6, 12):02d}')
+        elif roll < 0.5:
+            parts.append(str(self.random.randint(100, 99999)))
+        city = self.random.choice(CITIES)
+        if city:
+            parts.append(city)
+        return ' '.join(parts)
+
+    def build_transactions(self, count: int):
+        # Popularidade das subcategorias segue uma lei de Zipf, como nos extratos reais
+        weights = [1 / rank for rank in range(1, len(self.subcategories) + 1)]
+        chosen = self.random.choices(self.subcategories, weights=weights, k=count)
+        return [
+            {
+                'id': i,
+                'description': self.noisy_description(self.random.choice(self.merchants[subcategory['id']])),
+                'category': subcategory['category'],
+                'subcategory': subcategory['id'],
+            }
+            for i, subcategory in enumerate(chosen, 1)
+        ]
+
+    def build_subcategory_feedbacks(self, count: int):
+        feedbacks = []
+        for i, transaction in enumerate(self.random.sample(self.transactions, min(count, len(self.transactions))), 1):
+            corrected = self.random.choice(self.subcategories)
+            feedbacks.append(
+                {
+                    'id': i,
+                    'description': transaction['description'],
+                    'predicted_subcategory_id': transaction['subcategory'],
+                    'corrected_category_id': corrected['category'],
+                    'corrected_subcategory_id': corrected['id'],
+                }
+            )
+        return feedbacks
+
+    def build_description_feedbacks(self, count: int):
+        # As correções de descrição removem o ruído do extrato, deixando o nome do estabelecimento
+        feedbacks = []
+        for i in range(1, count + 1):
+            subcategory = self.random.choice(self.subcategories)
+            merchant = self.random.choice(self.merchants[subcategory['id']])
+            feedbacks.append(
+                {'id': i, 'description': self.noisy_description(merchant), 'corrected_description': merchant.title()}
+            )
+        return feedbacks
+
+    def resources(self):
+        """Recursos da API Django servidos por este conjunto de dados."""
+        return {
+            'categories': self.categories,
+            'subcategories': self.subcategories,
+            'transactions': self.transactions,
+            'categorization-feedback': self.description_feedbacks,
+        }
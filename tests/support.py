@@ -0,0 +1,48 @@
+"""Apoio aos testes dos preditores: dados sintéticos servidos localmente e um diretório de modelos temporário."""
+
+import shutil
+import tempfile
+import unittest
+
+from benchmarks.run import LocalBackend
+from benchmarks.synthetic import PRESETS, SyntheticDataset
+from training.model_cache import model_cache
+from training.prediction_cache import prediction_cache
+
+USER_ID = 1
+
+
+class PredictorTestCase(unittest.TestCase):
+    """Cada teste usa um diretório de modelos próprio, os dados do preset 'tiny' e os caches vazios."""
+
+    preset = 'tiny'
+
+    def setUp(self):
+        self.model_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.model_dir, ignore_errors=True)
+        self.dataset = SyntheticDataset(**PRESETS[self.preset])
+        backend = LocalBackend(self.dataset)
+        backend.__enter__()
+        self.addCleanup(backend.__exit__)
+        self.clear_caches()
+        self.addCleanup(self.clear_caches)
+
+    @staticmethod
+    def clear_caches():
+        model_cache.clear()
+        prediction_cache.clear()
+
+    def predictor(self, predictor_class, user_id=USER_ID):
+        predictor = predictor_class(user_id)
+        predictor.model_dir = self.model_dir
+        return predictor
+
+    def queries(self, count: int = 30):
+        """Descrições inéditas, no formato do extrato, de estabelecimentos conhecidos."""
+        rng = self.dataset.random
+        queries = []
+        for _ in range(count):
+            subcategory = rng.choice(self.dataset.subcategories)
+            merchant = rng.choice(self.dataset.merchants[subcategory['id']])
+            queries.append({'description': self.dataset.noisy_description(merchant), 'category': ''})
+        return queries
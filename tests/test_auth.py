@@ -0,0 +1,104 @@
+import base64
+import time
+import unittest
+from unittest import mock
+
+import requests
+from fastapi import HTTPException
+from jose import jwt
+
+from api import auth
+from api.token_cache import token_cache
+
+SECRET = 'segredo-de-teste'
+
+
+def make_token(token_type='access', kid=None, secret=SECRET):
+    payload = {'user_id': 1, 'token_type': token_type, 'exp': int(time.time()) + 300}
+    return jwt.encode(payload, secret, algorithm='HS256', headers={'kid': kid} if kid else None)
+
+
+def jwk(kid, secret=SECRET):
+    return {'kty': 'oct', 'kid': kid, 'k': base64.urlsafe_b64encode(secret.encode()).rstrip(b'=').decode()}
+
+
+class JwksResponse:
+    def __init__(self, keys):
+        self.keys = keys
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return {'keys': self.keys}
+
+
+class LocalValidationTest(unittest.TestCase):
+    def setUp(self):
+        token_cache.clear()
+        patches = [
+            mock.patch.object(auth, 'TOKEN_VALIDATION_MODE', 'local'),
+            mock.patch.object(auth, 'JWT_SECRET_KEY', SECRET),
+            mock.patch.object(auth, 'JWT_JWKS_URL', None),
+            mock.patch.object(auth, 'verify_token_remotely', side_effect=AssertionError('validação remota')),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_access_token_aceito(self):
+        self.assertEqual(auth.verify_token(make_token())['user_id'], 1)
+
+    def test_refresh_token_recusado(self):
+        with self.assertRaises(HTTPException) as context:
+            auth.verify_token(make_token('refresh'))
+        self.assertEqual(context.exception.status_code, 401)
+
+    def test_tipo_exigido_configuravel(self):
+        with mock.patch.object(auth, 'JWT_REQUIRED_TOKEN_TYPE', ''):
+            self.assertEqual(auth.verify_token(make_token('refresh'))['user_id'], 1)
+
+
+class JwksTest(unittest.TestCase):
+    def setUp(self):
+        token_cache.clear()
+        patches = [
+            mock.patch.object(auth, 'TOKEN_VALIDATION_MODE', 'local'),
+            mock.patch.object(auth, 'JWT_JWKS_URL', 'http://jwks.test/keys'),
+            mock.patch.dict(auth._jwks, {'keys': None, 'expires_at': 0.0, 'fetched_at': 0.0, 'failed_until': 0.0}),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_kid_novo_busca_o_jwks_de_novo(self):
+        responses = [JwksResponse([jwk('k1', 'antiga')]), JwksResponse([jwk('k1', 'antiga'), jwk('k2')])]
+        with mock.patch.object(auth.requests, 'get', side_effect=responses) as get:
+            auth.get_signing_key('k1')
+            with mock.patch.object(auth, 'JWT_JWKS_REFRESH_INTERVAL', 0):
+                self.assertEqual(auth.verify_token(make_token(kid='k2'))['user_id'], 1)
+        self.assertEqual(get.call_count, 2)
+
+    def test_kid_desconhecido_busca_no_maximo_uma_vez_por_intervalo(self):
+        with mock.patch.object(auth.requests, 'get', return_value=JwksResponse([jwk('k1')])) as get:
+            auth.get_signing_key('k1')
+            with mock.patch.object(auth, 'verify_token_remotely', return_value={'user_id': 1}) as remote:
+                for _ in range(3):
+                    token_cache.clear()
+                    self.assertEqual(auth.verify_token(make_token(kid='k9'))['user_id'], 1)
+        self.assertEqual(get.call_count, 1)
+        self.assertEqual(remote.call_count, 3)
+
+    def test_falha_no_jwks_fica_em_cache_e_recorre_ao_backend(self):
+        error = requests.ConnectionError('fora do ar')
+        with mock.patch.object(auth.requests, 'get', side_effect=error) as get:
+            with mock.patch.object(auth, 'verify_token_remotely', return_value={'user_id': 1}) as remote:
+                for _ in range(3):
+                    token_cache.clear()
+                    self.assertEqual(auth.verify_token(make_token(kid='k1'))['user_id'], 1)
+        self.assertEqual(get.call_count, 1)
+        self.assertEqual(remote.call_count, 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+import unittest
+
+from training.correction_index import CorrectionIndex, is_searchable
+from training.text import normalize
+
+
+def key(description: str):
+    return normalize(description).key
+
+
+class CorrectionIndexTest(unittest.TestCase):
+    def test_lookup_desativado_por_padrao(self):
+        index = CorrectionIndex([key('NETFLIX.COM PARC 03/12')])
+        self.assertIsNone(index.lookup(key('NETFLIX.COM PARC 04/12')))
+
+    def test_parcelas_diferentes_sao_reconhecidas(self):
+        index = CorrectionIndex([key('NETFLIX.COM PARC 03/12')])
+        match = index.lookup(key('NETFLIX.COM PARC 04/12'), threshold=0.8)
+        self.assertIsNotNone(match)
+        self.assertEqual(match[0], key('NETFLIX.COM PARC 03/12'))
+        self.assertLess(match[1], 1.0)
+
+    def test_codigos_sem_texto_nao_entram_na_busca(self):
+        index = CorrectionIndex([key('TED 12345')])
+        self.assertFalse(is_searchable(key('TED 12345')))
+        self.assertEqual(len(index), 0)
+        self.assertIsNone(index.lookup(key('TED 99999'), threshold=0.1))
+
+    def test_pix_para_a_mesma_pessoa_com_numeros_diferentes(self):
+        index = CorrectionIndex([key('PIX TRANSF 123 JOAO')])
+        self.assertIsNone(index.lookup(key('PIX TRANSF 98765 JOAO'), threshold=0.8))
+        self.assertIsNone(index.lookup(key('PIX TRANSF 123 MARIA'), threshold=0.8))
+        self.assertEqual(index.lookup(key('PIX TRANSF 123 JOAO'), threshold=0.8)[1], 1.0)
+
+    def test_digitos_contam_na_similaridade(self):
+        index = CorrectionIndex([key('PIX TRANSF 123 JOAO')])
+        match = index.lookup(key('PIX TRANSF 456 JOAO'), threshold=0.5)
+        self.assertIsNotNone(match)
+        self.assertLess(match[1], 0.8)
+
+    def test_estado_gravado_e_restaurado(self):
+        keys = [key(description) for description in ('NETFLIX.COM PARC 03/12', 'SPOTIFY BRASIL', 'TED 12345')]
+        index = CorrectionIndex.from_state(CorrectionIndex(keys).to_state())
+        self.assertEqual(index.keys, keys[:2])
+        self.assertEqual(index.lookup(key('SPOTIFY BRASIL 05/06'), threshold=0.7)[0], keys[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
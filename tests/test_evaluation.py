@@ -0,0 +1,33 @@
+import unittest
+
+from training.evaluation import ProgressiveMetrics
+
+
+class ProgressiveMetricsTest(unittest.TestCase):
+    def test_classes_limitadas_as_mais_frequentes(self):
+        metrics = ProgressiveMetrics(max_classes=3)
+        for _ in range(10):
+            metrics.update('mercado', 'mercado')
+        for index in range(50):
+            metrics.update(f'correção {index}', None)
+
+        state = metrics.get_state()
+        self.assertLessEqual(len(state['classes']), 3)
+        self.assertIn('mercado', state['classes'])
+
+        summary = ProgressiveMetrics(state, max_classes=3).summary()
+        self.assertEqual(summary['evaluated'], 60)
+        self.assertAlmostEqual(summary['accuracy'], 10 / 60)
+        self.assertAlmostEqual(summary['macro_f1'], 1 / 51)
+        self.assertLessEqual(len(summary['per_class']), 3)
+
+    def test_sem_limite(self):
+        metrics = ProgressiveMetrics(max_classes=0)
+        for index in range(50):
+            metrics.update(index, index)
+        self.assertEqual(len(metrics.summary()['per_class']), 50)
+        self.assertEqual(metrics.summary()['macro_f1'], 1.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+import unittest
+from unittest import mock
+
+from training import feedback_buffer as feedback_buffer_module
+from training.feedback_buffer import FeedbackBuffer
+
+KEY = (1, 'subcategory')
+
+
+class StubPredictor:
+    """Preditor que falha nas primeiras ``failures`` chamadas e registra os lotes aplicados."""
+
+    failures = 0
+    calls = []
+    applied = []
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+
+    def apply_feedback(self, feedbacks, token):
+        StubPredictor.calls.append(list(feedbacks))
+        if len(StubPredictor.calls) <= StubPredictor.failures:
+            raise RuntimeError('Django fora do ar')
+        StubPredictor.applied.append((list(feedbacks), token))
+        return {'success': True, 'message': 'ok'}
+
+    def retrain_from_feedback(self, feedbacks, token):
+        return {'success': True, 'message': 'ok', 'data': {'applied': len(feedbacks)}}
+
+
+class FeedbackBufferTest(unittest.TestCase):
+    def setUp(self):
+        StubPredictor.failures = 0
+        StubPredictor.calls = []
+        StubPredictor.applied = []
+        for patch in (
+            mock.patch.object(feedback_buffer_module, 'get_predictor_class', return_value=StubPredictor),
+            mock.patch.object(feedback_buffer_module, 'logger'),
+        ):
+            patch.start()
+            self.addCleanup(patch.stop)
+        # Intervalo longo: a thread de fundo não aplica nada durante o teste, os lotes são aplicados por flush
+        self.buffer = FeedbackBuffer(interval=3600, max_items=1000, max_retries=5)
+        self.addCleanup(self.buffer.close)
+
+    def test_desativado_aplica_na_hora(self):
+        buffer = FeedbackBuffer(interval=0)
+        result = buffer.add('subcategory', 1, [{'id': 1}], 'token')
+        self.assertEqual(result['data'], {'applied': 1})
+        self.assertIsNone(buffer._thread)
+
+    def test_feedbacks_do_mesmo_id_sao_consolidados(self):
+        self.buffer.add('subcategory', 1, [{'id': 1, 'value': 'a'}, {'value': 'sem id'}], 'token-1')
+        result = self.buffer.add('subcategory', 1, [{'id': 1, 'value': 'b'}, {'value': 'sem id'}], 'token-2')
+        self.assertEqual(result['data'], {'pending': 3})
+
+        self.assertEqual(self.buffer.flush(KEY), 1)
+        [(feedbacks, token)] = StubPredictor.applied
+        self.assertEqual(token, 'token-2')
+        self.assertEqual(feedbacks, [{'id': 1, 'value': 'b'}, {'value': 'sem id'}, {'value': 'sem id'}])
+        self.assertEqual(self.buffer.stats()['coalesced'], 1)
+
+    def test_lote_que_falha_e_tentado_de_novo_com_espera_crescente(self):
+        StubPredictor.failures = 2
+        self.buffer.add('subcategory', 1, [{'id': 1}], 'token')
+
+        delays = []
+        for _ in range(2):
+            with mock.patch.object(feedback_buffer_module.time, 'monotonic', return_value=1000.0):
+                self.buffer.flush(KEY)
+            delays.append(self.buffer._pending[KEY]['due'] - 1000.0)
+        self.assertEqual(delays, [3600, 7200])
+
+        self.buffer.flush(KEY)
+        self.assertEqual(len(StubPredictor.calls), 3)
+        self.assertEqual(len(StubPredictor.applied), 1)
+        stats = self.buffer.stats()
+        self.assertEqual((stats['failures'], stats['retries'], stats['flushes'], stats['pending']), (2, 2, 1, 0))
+
+    def test_feedbacks_recebidos_durante_a_falha_entram_no_novo_lote(self):
+        StubPredictor.failures = 1
+        self.buffer.add('subcategory', 1, [{'id': 1, 'value': 'a'}], 'token-1')
+        entry = self.buffer._pending.pop(KEY)
+        self.buffer.add('subcategory', 1, [{'id': 1, 'value': 'b'}, {'id': 2}], 'token-2')
+        self.buffer._apply(KEY, entry)
+
+        self.buffer.flush(KEY)
+        [(feedbacks, token)] = StubPredictor.applied
+        self.assertEqual(feedbacks, [{'id': 1, 'value': 'b'}, {'id': 2}])
+        self.assertEqual(token, 'token-2')
+
+    def test_descartado_apos_o_limite_de_tentativas(self):
+        StubPredictor.failures = 100
+        self.buffer.add('subcategory', 1, [{'id': 1}, {'id': 2}], 'token')
+        for _ in range(6):
+            self.buffer.flush(KEY)
+        self.assertEqual(len(StubPredictor.calls), 6)
+        self.assertEqual(self.buffer.flush(KEY), 0)
+        stats = self.buffer.stats()
+        self.assertEqual((stats['retries'], stats['dropped'], stats['pending']), (5, 2, 0))
+
+    def test_close_aplica_os_pendentes(self):
+        self.buffer.add('subcategory', 1, [{'id': 1}], 'token')
+        self.buffer.add('description', 2, [{'id': 2}], 'token')
+        self.buffer.close()
+        self.assertEqual(sorted(feedbacks[0]['id'] for feedbacks, _ in StubPredictor.applied), [1, 2])
+        self.assertIsNone(self.buffer._thread)
+        self.assertEqual(self.buffer.stats()['pending'], 0)
+
+    def test_close_descarta_o_lote_que_falha(self):
+        StubPredictor.failures = 1
+        self.buffer.add('subcategory', 1, [{'id': 1}], 'token')
+        self.buffer.close()
+        self.assertEqual(len(StubPredictor.calls), 1)
+        self.assertEqual(self.buffer.stats()['dropped'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,149 @@
+import shutil
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from jose import jwt
+
+from training import model_store
+from training.jobs import JobManager, run_training_job
+from training.manifest import ModelManifest, manifest_for
+
+
+class ManifestTestCase(unittest.TestCase):
+    def setUp(self):
+        self.model_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.model_dir, ignore_errors=True)
+        self.manifest = manifest_for(self.model_dir)
+
+
+class RetrainClaimTest(ManifestTestCase):
+    def setUp(self):
+        super().setUp()
+        self.manifest.record(1, 'subcategory', version=3, size=100)
+        self.manifest.set_storage(1, 'subcategory', 'evicted', 0)
+
+    def test_um_pedido_por_intervalo(self):
+        self.assertTrue(self.manifest.claim_retrain(1, 'subcategory', now=1000.0, backoff=900))
+        self.assertFalse(self.manifest.claim_retrain(1, 'subcategory', now=1500.0, backoff=900))
+        self.assertTrue(self.manifest.claim_retrain(1, 'subcategory', now=1900.0, backoff=900))
+
+    def test_modelo_nao_removido_nao_e_treinado(self):
+        self.manifest.record(2, 'subcategory', version=1, size=100)
+        self.assertFalse(self.manifest.claim_retrain(2, 'subcategory', now=1000.0, backoff=900))
+        self.assertFalse(self.manifest.claim_retrain(3, 'subcategory', now=1000.0, backoff=900))
+
+    def test_reserva_compartilhada_entre_conexoes(self):
+        other = ModelManifest(self.manifest.path)
+        self.assertTrue(self.manifest.claim_retrain(1, 'subcategory', now=1000.0, backoff=900))
+        self.assertFalse(other.claim_retrain(1, 'subcategory', now=1001.0, backoff=900))
+
+    def test_consulta_de_remocao_em_cache(self):
+        self.assertTrue(model_store.is_evicted(self.model_dir, 1, 'subcategory'))
+        self.manifest.record(1, 'subcategory', version=4, size=100)
+        self.assertTrue(model_store.is_evicted(self.model_dir, 1, 'subcategory'))
+        with mock.patch.object(model_store, 'MODEL_EVICTED_CHECK_TTL', 0):
+            model_store._evicted.clear()
+            self.assertFalse(model_store.is_evicted(self.model_dir, 1, 'subcategory'))
+
+
+def make_job(job_id, user_id=1, predictor_type='subcategory', created_at=None):
+    return {
+        'id': job_id,
+        'user_id': user_id,
+        'type': predictor_type,
+        'options': {},
+        'state': 'queued',
+        'created_at': created_at or time.time(),
+        'started_at': None,
+        'finished_at': None,
+        'duration': None,
+        'progress': {},
+        'result': None,
+    }
+
+
+class CreateJobTest(ManifestTestCase):
+    def test_job_ativo_e_reaproveitado(self):
+        first = self.manifest.create_job(make_job('a'), stale_after=3600)
+        second = self.manifest.create_job(make_job('b'), stale_after=3600)
+        self.assertEqual(second['id'], first['id'])
+        self.assertIsNone(self.manifest.get_job('b'))
+
+    def test_outro_usuario_ou_preditor_cria_outro_job(self):
+        self.manifest.create_job(make_job('a'), stale_after=3600)
+        self.assertEqual(self.manifest.create_job(make_job('b', user_id=2), stale_after=3600)['id'], 'b')
+        self.assertEqual(self.manifest.create_job(make_job('c', predictor_type='description'), 3600)['id'], 'c')
+
+    def test_job_concluido_nao_bloqueia(self):
+        self.manifest.create_job(make_job('a'), stale_after=3600)
+        self.manifest.update_job('a', state='succeeded')
+        self.assertEqual(self.manifest.create_job(make_job('b'), stale_after=3600)['id'], 'b')
+
+    def test_job_sem_atualizacao_e_marcado_como_abandonado(self):
+        self.manifest.create_job(make_job('a'), stale_after=3600)
+        with mock.patch('training.manifest.time.time', return_value=time.time() + 7200):
+            self.assertEqual(self.manifest.create_job(make_job('b'), stale_after=3600)['id'], 'b')
+        abandoned = self.manifest.get_job('a')
+        self.assertEqual(abandoned['state'], 'failed')
+        self.assertEqual(abandoned['result']['message'], 'Treinamento abandonado.')
+
+
+class JobEndpointTest(ManifestTestCase):
+    def setUp(self):
+        super().setUp()
+        from fastapi.testclient import TestClient
+
+        from api import main
+        from api.auth import verify_token
+
+        self.manifest.create_job(make_job('a', user_id=1), stale_after=3600)
+        patch = mock.patch.object(main, 'job_manager', JobManager(model_dir=self.model_dir))
+        patch.start()
+        self.addCleanup(patch.stop)
+        main.app.dependency_overrides[verify_token] = lambda: {'user_id': self.user_id}
+        self.addCleanup(main.app.dependency_overrides.clear)
+        self.client = TestClient(main.app)
+
+    def test_dono_ve_o_job(self):
+        self.user_id = 1
+        response = self.client.get('/jobs/a')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['data']['id'], 'a')
+
+    def test_outro_usuario_recebe_404(self):
+        self.user_id = 2
+        self.assertEqual(self.client.get('/jobs/a').status_code, 404)
+        self.assertEqual(self.client.get('/jobs/inexistente').status_code, 404)
+
+
+class QueuedTokenTest(unittest.TestCase):
+    def test_token_expirado_na_fila_falha_sem_buscar_dados(self):
+        token = jwt.encode({'user_id': 1, 'exp': int(time.time()) - 10}, 'chave', algorithm='HS256')
+        with mock.patch('training.data_fetcher.has_service_token', return_value=False), mock.patch(
+            'training.jobs.get_predictor_class', side_effect=AssertionError('treinamento iniciado')
+        ):
+            result = run_training_job('a', 'subcategory', 1, token, {}, track=False)
+        self.assertFalse(result['success'])
+        self.assertIn('expirou', result['message'])
+
+    def test_token_de_servico_substitui_o_do_usuario(self):
+        from training import data_fetcher
+
+        classifier = mock.Mock()
+        classifier.train.side_effect = lambda token: {
+            'success': False,
+            'token': token,
+            'service_user': getattr(data_fetcher._service_user, 'user_id', None),
+        }
+        with mock.patch('training.data_fetcher.has_service_token', return_value=True), mock.patch(
+            'training.jobs.get_predictor_class', return_value=lambda user_id: classifier
+        ):
+            result = run_training_job('a', 'subcategory', 7, 'token-do-usuario', {}, track=False)
+        self.assertIsNone(result['token'])
+        self.assertEqual(result['service_user'], 7)
+
+
+if __name__ == '__main__':
+    unittest.main()
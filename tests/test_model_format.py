@@ -0,0 +1,87 @@
+import io
+import os
+import pickle
+from contextlib import redirect_stdout
+
+from tests.support import PredictorTestCase
+from training.model_format import load_state, migrate, read_model_version, save_state
+from training.predictors.description import DescriptionPredictor
+from training.predictors.subcategory import SubcategoryPredictor
+
+PREDICTORS = (SubcategoryPredictor, DescriptionPredictor)
+
+
+class ModelFormatTest(PredictorTestCase):
+    def trained(self, predictor_class):
+        predictor = self.predictor(predictor_class)
+        self.assertTrue(predictor.train('teste')['success'])
+        return predictor
+
+    def predictions(self, predictor, queries, reload=True):
+        return predictor.predict_many(queries, top_k=3, reload=reload)
+
+    def test_previsoes_iguais_apos_recarregar_do_disco(self):
+        queries = self.queries()
+        for predictor_class in PREDICTORS:
+            with self.subTest(predictor=predictor_class.type):
+                trained = self.trained(predictor_class)
+                expected = self.predictions(trained, queries, reload=False)
+                self.assertTrue(all(prediction['candidates'] for prediction in expected))
+
+                self.clear_caches()
+                loaded = self.predictor(predictor_class)
+                self.assertEqual(self.predictions(loaded, queries), expected)
+                self.assertEqual(loaded.model_version, trained.model_version)
+
+    def test_zlib_e_sem_compressao_carregam_o_mesmo_modelo(self):
+        queries = self.queries()
+        for predictor_class in PREDICTORS:
+            with self.subTest(predictor=predictor_class.type):
+                trained = self.trained(predictor_class)
+                expected = self.predictions(trained, queries, reload=False)
+                sizes = {}
+                for compression in ('none', 'zlib'):
+                    path = os.path.join(self.model_dir, f'{predictor_class.type}.{compression}')
+                    sizes[compression] = save_state(
+                        path, predictor_class.type, trained.get_state(), compression=compression, model_version=7
+                    )
+                    self.assertEqual(read_model_version(path), 7)
+
+                    self.clear_caches()
+                    loaded = self.predictor(predictor_class, user_id=f'copia-{compression}')
+                    loaded.set_state(load_state(path, predictor_class.type))
+                    self.assertEqual(self.predictions(loaded, queries, reload=False), expected)
+                self.assertLess(sizes['zlib'], sizes['none'])
+
+    def write_pickle(self, predictor_class):
+        trained = self.trained(predictor_class)
+        state = trained.get_state()
+        trained.delete_model()
+        pickle_path = trained.stored_paths()[2]
+        with open(pickle_path, 'wb') as f:
+            pickle.dump(state, f)
+        return trained, pickle_path
+
+    def test_pickle_antigo_convertido_no_primeiro_uso(self):
+        queries = self.queries()
+        for predictor_class in PREDICTORS:
+            with self.subTest(predictor=predictor_class.type):
+                trained, pickle_path = self.write_pickle(predictor_class)
+                expected = self.predictions(trained, queries, reload=False)
+
+                self.clear_caches()
+                loaded = self.predictor(predictor_class)
+                self.assertEqual(self.predictions(loaded, queries), expected)
+                self.assertFalse(os.path.exists(pickle_path))
+                self.assertTrue(os.path.exists(loaded.get_model_path()))
+                self.assertEqual(loaded.manifest.for_user(loaded.user_id)[loaded.type]['version'], 1)
+
+    def test_migrate_converte_o_diretorio(self):
+        for predictor_class in PREDICTORS:
+            with self.subTest(predictor=predictor_class.type):
+                trained, pickle_path = self.write_pickle(predictor_class)
+                with redirect_stdout(io.StringIO()):
+                    migrate(self.model_dir, keep_legacy=True)
+                self.assertTrue(os.path.exists(pickle_path))
+                self.assertEqual(read_model_version(trained.get_model_path()), 1)
+                os.remove(pickle_path)
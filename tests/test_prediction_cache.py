@@ -0,0 +1,89 @@
+from tests.support import PredictorTestCase
+from training.model_format import save_state
+from training.prediction_cache import prediction_cache
+from training.predictors.description import DescriptionPredictor
+from training.predictors.subcategory import SubcategoryPredictor
+
+PREDICTORS = (SubcategoryPredictor, DescriptionPredictor)
+STALE = {'success': True, 'stale': True}
+
+
+class PredictionCacheTest(PredictorTestCase):
+    def setUp(self):
+        super().setUp()
+        self.assertTrue(prediction_cache.enabled)
+        self.query = self.queries(1)[0]['description']
+
+    def poison(self, predictor_class):
+        """Grava uma previsão falsa na chave da versão carregada, para detectar quando o cache é usado."""
+        predictor = self.predictor(predictor_class)
+        predictor.load_model()
+        prediction_cache.put(predictor.prediction_key(self.query, ''), STALE)
+        prediction_cache.put(predictor.prediction_key(self.query, '', top_k=3), STALE)
+        return predictor
+
+    def is_stale(self, result):
+        return result.get('stale', False)
+
+    def test_previsao_repetida_vem_do_cache(self):
+        for predictor_class in PREDICTORS:
+            with self.subTest(predictor=predictor_class.type):
+                self.predictor(predictor_class).train('teste')
+                self.poison(predictor_class)
+                self.assertTrue(self.is_stale(self.predictor(predictor_class).predict(self.query, '')))
+                [result] = self.predictor(predictor_class).predict_many([{'description': self.query}], top_k=3)
+                self.assertTrue(self.is_stale(result))
+
+    def test_save_model_invalida_as_previsoes(self):
+        for predictor_class in PREDICTORS:
+            with self.subTest(predictor=predictor_class.type):
+                self.predictor(predictor_class).train('teste')
+                self.poison(predictor_class).save_model()
+                self.assertFalse(self.is_stale(self.predictor(predictor_class).predict(self.query, '')))
+                [result] = self.predictor(predictor_class).predict_many([{'description': self.query}], top_k=3)
+                self.assertFalse(self.is_stale(result))
+
+    def test_delete_model_invalida_as_previsoes(self):
+        for predictor_class in PREDICTORS:
+            with self.subTest(predictor=predictor_class.type):
+                self.predictor(predictor_class).train('teste')
+                predictor = self.poison(predictor_class)
+                generation_key = predictor.prediction_key(self.query, '')
+                predictor.delete_model()
+                self.assertNotEqual(self.predictor(predictor_class).prediction_key(self.query, ''), generation_key)
+                self.assertFalse(self.is_stale(self.predictor(predictor_class).predict(self.query, '')))
+
+    def test_modelo_treinado_de_novo_com_a_mesma_versao(self):
+        # Depois de apagado, o modelo volta à versão 1: só a geração distingue as previsões do modelo anterior
+        for predictor_class in PREDICTORS:
+            with self.subTest(predictor=predictor_class.type):
+                self.predictor(predictor_class).train('teste')
+                predictor = self.poison(predictor_class)
+                predictor.delete_model()
+                retrained = self.predictor(predictor_class)
+                retrained.train('teste')
+                self.assertEqual(retrained.model_version, 1)
+                self.assertFalse(self.is_stale(self.predictor(predictor_class).predict(self.query, '')))
+                [result] = self.predictor(predictor_class).predict_many([{'description': self.query}], top_k=3)
+                self.assertFalse(self.is_stale(result))
+
+    def test_versao_publicada_por_outro_processo_nao_usa_o_cache(self):
+        for predictor_class in PREDICTORS:
+            with self.subTest(predictor=predictor_class.type):
+                trained = self.predictor(predictor_class)
+                trained.train('teste')
+                predictor = self.poison(predictor_class)
+
+                # Outro processo publica a versão seguinte: a geração deste processo não muda, só a versão
+                save_state(
+                    predictor.get_model_path(),
+                    predictor_class.type,
+                    trained.get_state(),
+                    model_version=predictor.model_version + 1,
+                )
+
+                fresh = self.predictor(predictor_class)
+                self.assertFalse(self.is_stale(fresh.predict(self.query, '')))
+                self.assertEqual(fresh.model_version, predictor.model_version + 1)
+                [result] = self.predictor(predictor_class).predict_many([{'description': self.query}], top_k=3)
+                self.assertFalse(self.is_stale(result))
@@ -0,0 +1,111 @@
+import os
+import threading
+from unittest import mock
+
+from tests.support import PredictorTestCase
+from training import model_format
+from training.model_format import load_state, read_model_version
+from training.predictors.description import DescriptionPredictor
+from training.predictors.subcategory import SubcategoryPredictor
+
+
+class WriterLockTest(PredictorTestCase):
+    def trained(self, predictor_class=SubcategoryPredictor, user_id=1):
+        predictor = self.predictor(predictor_class, user_id)
+        self.assertTrue(predictor.train('teste')['success'])
+        return predictor
+
+    def corrections(self):
+        return [
+            feedback
+            for feedback in self.dataset.subcategory_feedbacks
+            if feedback['predicted_subcategory_id'] != feedback['corrected_subcategory_id']
+        ]
+
+    def test_versoes_crescem_a_cada_publicacao(self):
+        predictor = self.trained()
+        path = predictor.get_model_path()
+        self.assertEqual(read_model_version(path), 1)
+        for expected in (2, 3, 4):
+            self.predictor(SubcategoryPredictor).save_model()
+            self.assertEqual(read_model_version(path), expected)
+        self.assertEqual(predictor.manifest.for_user(predictor.user_id)['subcategory']['version'], 4)
+
+    def test_publicacao_por_renomeacao_atomica(self):
+        predictor = self.trained()
+        path = predictor.get_model_path()
+        replaced = []
+        original = os.replace
+
+        def replace(source, target):
+            # Na hora da troca, o destino ainda é a versão anterior completa
+            replaced.append((source, target, read_model_version(target)))
+            original(source, target)
+
+        with mock.patch.object(model_format.os, 'replace', side_effect=replace):
+            predictor.save_model()
+
+        [(source, target, previous)] = replaced
+        self.assertEqual(target, path)
+        self.assertEqual(os.path.dirname(source), os.path.dirname(path))
+        self.assertEqual(previous, 1)
+        self.assertEqual(read_model_version(path), 2)
+        self.assertEqual([name for name in os.listdir(os.path.dirname(path)) if name.endswith('.tmp')], [])
+
+    def test_leitores_nunca_veem_arquivo_incompleto(self):
+        path = self.trained(DescriptionPredictor).get_model_path()
+        errors, done = [], threading.Event()
+
+        def read():
+            while not done.is_set():
+                try:
+                    load_state(path, 'description')
+                except Exception as e:
+                    errors.append(e)
+
+        reader = threading.Thread(target=read)
+        reader.start()
+        try:
+            for _ in range(20):
+                self.predictor(DescriptionPredictor).save_model()
+        finally:
+            done.set()
+            reader.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(read_model_version(path), 21)
+
+    def test_feedbacks_simultaneos_nao_perdem_atualizacoes(self):
+        feedbacks = self.corrections()[:10]
+        self.assertGreaterEqual(len(feedbacks), 4)
+
+        # Referência: os mesmos feedbacks aplicados em sequência a outro usuário
+        self.trained(user_id=2)
+        for feedback in feedbacks:
+            self.predictor(SubcategoryPredictor, user_id=2).retrain_from_feedback([feedback], 'teste')
+        expected = self.predictor(SubcategoryPredictor, user_id=2)
+        expected.load_model(use_cache=False)
+
+        self.trained()
+        barrier = threading.Barrier(2)
+        errors = []
+
+        def apply(batch):
+            barrier.wait()
+            try:
+                for feedback in batch:
+                    self.predictor(SubcategoryPredictor).retrain_from_feedback([feedback], 'teste')
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=apply, args=(feedbacks[index::2],)) for index in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+        self.clear_caches()
+        result = self.predictor(SubcategoryPredictor)
+        result.load_model(use_cache=False)
+        self.assertEqual(result.model_version, 1 + len(feedbacks))
+        self.assertEqual(result.model_summary(), expected.model_summary())
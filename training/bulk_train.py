@@ -0,0 +1,213 @@
+"""
+Re-treinamento em lote dos modelos, fora da API.
+
+Treina os dois preditores de uma lista de usuários (ou de todos os usuários do manifesto) em um pool de processos,
+usando o token de serviço (OAuth2) em nome de cada usuário (ver ``data_fetcher.on_behalf_of``). Por padrão, o
+preditor de subcategorias é treinado no modo incremental e o de descrições só é treinado se os feedbacks mudaram,
+de modo que usuários sem dados novos são pulados com poucas requisições. Cada processo abre no máximo
+``--connections`` conexões com o Django, o que limita a carga total a ``--workers`` x ``--connections``.
+
+Cada resultado é gravado no arquivo de estado (JSON Lines) assim que termina. Se o comando for interrompido, a
+próxima execução pula os modelos já treinados e refaz apenas os que faltaram ou falharam; o arquivo é apagado
+quando todos terminam sem falhas.
+
+    python -m training.bulk_train --all
+    python -m training.bulk_train --users 1,2,3 --types subcategory --workers 4 --connections 2
+    python -m training.bulk_train --all --full --restart
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from training.jobs import PREDICTOR_CLASSES, TRAINING_WORKERS, get_predictor_class, run_training_job
+from training.log import configure_logging
+from training.manifest import MODEL_DIR, manifest_for, parse_user_id
+
+BULK_TRAIN_WORKERS = int(os.getenv('BULK_TRAIN_WORKERS', TRAINING_WORKERS))
+BULK_TRAIN_CONNECTIONS = int(os.getenv('BULK_TRAIN_CONNECTIONS', 2))
+BULK_TRAIN_STATE_FILE = os.getenv('BULK_TRAIN_STATE_FILE', os.path.join(MODEL_DIR, 'bulk_train.jsonl'))
+
+DONE_STATES = ('succeeded', 'skipped')
+
+
+def init_worker(types: list):
+    """Importa os preditores ao criar cada processo, para que o tempo de importação não entre no do usuário."""
+    configure_logging()
+    for predictor_type in types:
+        get_predictor_class(predictor_type)
+
+
+def train_user(predictor_type: str, user_id, full: bool = False):
+    """
+    Treina um modelo dentro de um processo do pool, com o token de serviço em nome do usuário.
+
+    :param predictor_type: str - Tipo do preditor.
+    :param user_id: Id do usuário.
+    :param full: bool - Treina do zero, mesmo sem dados novos.
+    :return: dict - Usuário, preditor, estado ('succeeded', 'skipped' ou 'failed'), duração e mensagem.
+    """
+    # Importado aqui para que o limite de conexões definido pelo processo principal valha no pool
+    from training.data_fetcher import on_behalf_of
+
+    options = {}
+    if not full:
+        options = {'incremental': True} if predictor_type == 'subcategory' else {'skip_unchanged': True}
+
+    start = time.perf_counter()
+    try:
+        with on_behalf_of(user_id):
+            result = run_training_job(
+                f'bulk-{predictor_type}-{user_id}', predictor_type, user_id, None, options, track=False
+            )
+        state = 'failed'
+        if result.get('success'):
+            state = 'skipped' if result.get('skipped') else 'succeeded'
+        message = result.get('message', '')
+    except Exception as e:
+        state, message = 'failed', str(e)
+
+    return {
+        'user_id': user_id,
+        'type': predictor_type,
+        'state': state,
+        'seconds': round(time.perf_counter() - start, 3),
+        'message': message,
+        'finished_at': time.time(),
+    }
+
+
+def read_state(path: str):
+    """
+    Lê o arquivo de estado de uma execução anterior.
+
+    :param path: str - Caminho do arquivo.
+    :return: dict - Último resultado de cada (user_id, tipo do preditor).
+    """
+    results = {}
+    if not os.path.exists(path):
+        return results
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except ValueError:
+                # Linha incompleta de uma execução interrompida no meio da escrita
+                continue
+            results[(result['user_id'], result['type'])] = result
+    return results
+
+
+def print_result(result: dict):
+    print(
+        f'{str(result["user_id"]):>12} {result["type"]:<12} {result["state"]:<10} '
+        f'{result["seconds"]:>9.2f}s  {result["message"]}',
+        flush=True,
+    )
+
+
+def bulk_train(
+    users: list,
+    types: list = tuple(PREDICTOR_CLASSES),
+    workers: int = BULK_TRAIN_WORKERS,
+    connections: int = BULK_TRAIN_CONNECTIONS,
+    state_file: str = BULK_TRAIN_STATE_FILE,
+    full: bool = False,
+    restart: bool = False,
+):
+    """
+    Treina os modelos de vários usuários em paralelo, retomando uma execução interrompida.
+
+    :param users: list - Ids dos usuários.
+    :param types: list - Tipos de preditor a treinar.
+    :param workers: int - Quantidade de processos.
+    :param connections: int - Conexões simultâneas com o Django por processo.
+    :param state_file: str - Arquivo de estado da execução.
+    :param full: bool - Treina do zero, sem pular usuários sem dados novos.
+    :param restart: bool - Ignora o arquivo de estado e treina todos os modelos.
+    :return: dict - Resumo da execução.
+    """
+    if restart and os.path.exists(state_file):
+        os.remove(state_file)
+    previous = read_state(state_file)
+    tasks = [
+        (user_id, predictor_type)
+        for user_id in users
+        for predictor_type in types
+        if previous.get((user_id, predictor_type), {}).get('state') not in DONE_STATES
+    ]
+    resumed = len(users) * len(types) - len(tasks)
+    if resumed:
+        print(f'Retomando {state_file}: {resumed} modelo(s) já treinado(s) serão pulados.')
+
+    # Os processos do pool são criados por spawn e herdam o ambiente, inclusive o limite de conexões
+    os.environ['DATA_FETCHER_MAX_CONNECTIONS'] = str(connections)
+    os.environ['DATA_FETCHER_MAX_KEEPALIVE'] = str(connections)
+    os.makedirs(os.path.dirname(state_file) or '.', exist_ok=True)
+
+    counts = {'succeeded': 0, 'skipped': 0, 'failed': 0}
+    training_seconds = 0.0
+    start = time.perf_counter()
+    context = multiprocessing.get_context('spawn')
+    pool = ProcessPoolExecutor(workers, mp_context=context, initializer=init_worker, initargs=(list(types),))
+    with open(state_file, 'a', encoding='utf-8') as state, pool:
+        futures = [pool.submit(train_user, predictor_type, user_id, full) for user_id, predictor_type in tasks]
+        try:
+            for future in as_completed(futures):
+                result = future.result()
+                state.write(json.dumps(result, ensure_ascii=False) + '\n')
+                state.flush()
+                os.fsync(state.fileno())
+                counts[result['state']] += 1
+                training_seconds += result['seconds']
+                print_result(result)
+        except KeyboardInterrupt:
+            pool.shutdown(wait=True, cancel_futures=True)
+            raise
+
+    seconds = time.perf_counter() - start
+    if not counts['failed'] and os.path.exists(state_file):
+        os.remove(state_file)
+    return {
+        'models': len(tasks),
+        'resumed': resumed,
+        **counts,
+        'seconds': round(seconds, 3),
+        'training_seconds': round(training_seconds, 3),
+        'models_per_minute': round(len(tasks) / seconds * 60, 2) if seconds else None,
+        'parallelism': round(training_seconds / seconds, 2) if seconds else None,
+        'state_file': state_file if counts['failed'] else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Re-treinamento em lote dos modelos com o token de serviço.')
+    selection = parser.add_mutually_exclusive_group(required=True)
+    selection.add_argument('--users', help='Ids dos usuários, separados por vírgula.')
+    selection.add_argument('--all', action='store_true', help='Todos os usuários registrados no manifesto.')
+    parser.add_argument('--types', nargs='+', choices=list(PREDICTOR_CLASSES), default=list(PREDICTOR_CLASSES))
+    parser.add_argument('--workers', type=int, default=BULK_TRAIN_WORKERS)
+    parser.add_argument('--connections', type=int, default=BULK_TRAIN_CONNECTIONS, help='Conexões por processo.')
+    parser.add_argument('--state-file', default=BULK_TRAIN_STATE_FILE)
+    parser.add_argument('--full', action='store_true', help='Treina do zero, mesmo sem dados novos.')
+    parser.add_argument('--restart', action='store_true', help='Ignora o estado de uma execução interrompida.')
+    args = parser.parse_args()
+
+    configure_logging()
+    if args.all:
+        users = manifest_for(MODEL_DIR).users()
+    else:
+        users = [parse_user_id(user.strip()) for user in args.users.split(',') if user.strip()]
+
+    print(f'{len(users)} usuário(s), preditores: {", ".join(args.types)}, {args.workers} processo(s)')
+    summary = bulk_train(
+        users, args.types, args.workers, args.connections, args.state_file, full=args.full, restart=args.restart
+    )
+    print(' '.join(f'{name}={value}' for name, value in summary.items()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+"""
+Índice para a busca aproximada no mapa de correções do preditor de descrições.
+
+As descrições dos bancos repetem o mesmo estabelecimento com partes que mudam a cada lançamento: o número da
+parcela ("PARC 03/12"), a data ("14/05") ou um código. A busca aproximada compara os trigramas de caracteres da
+chave inteira (coeficiente de Dice), de modo que os dígitos diferentes reduzem a similaridade sem zerá-la. Um
+índice invertido (trigrama -> chaves) limita a comparação às chaves que compartilham os trigramas mais raros da
+consulta (filtro de prefixo), de modo que o custo depende do tamanho das listas desses trigramas, e não do tamanho
+do mapa.
+
+Descrições em que quase tudo são dígitos ("TED 12345", "PIX 987") não entram na busca: a parte sem dígitos precisa
+ter pelo menos DESCRIPTION_FUZZY_MIN_CHARS letras. A busca vem desativada (DESCRIPTION_FUZZY_THRESHOLD=0).
+"""
+
+import math
+import os
+from collections import Counter
+
+DESCRIPTION_FUZZY_THRESHOLD = float(os.getenv('DESCRIPTION_FUZZY_THRESHOLD', 0))
+DESCRIPTION_FUZZY_MIN_CHARS = int(os.getenv('DESCRIPTION_FUZZY_MIN_CHARS', 6))
+
+GRAM_SIZE = 3
+
+# Versão do cálculo dos trigramas gravado nos arquivos: um índice de outra versão é montado de novo a partir do mapa
+INDEX_VERSION = 2
+
+
+def signature(key: str):
+    """
+    Remove da chave de correção as palavras com dígitos (parcelas, datas, códigos).
+
+    :param key: str - Chave de correção (palavras normalizadas unidas por espaço).
+    :return: str
+    """
+    return ' '.join(word for word in key.split() if not any(char.isdigit() for char in word))
+
+
+def is_searchable(key: str, min_chars: int = DESCRIPTION_FUZZY_MIN_CHARS):
+    """
+    Verifica se a chave tem texto suficiente, fora das palavras com dígitos, para a busca aproximada.
+
+    :param key: str - Chave de correção.
+    :param min_chars: int - Quantidade mínima de caracteres da assinatura, sem contar os espaços.
+    :return: bool
+    """
+    return len(signature(key).replace(' ', '')) >= min_chars
+
+
+def grams(text: str):
+    """
+    Obtém os trigramas de caracteres de um texto, com as bordas marcadas para que palavras curtas também tenham
+    trigramas.
+
+    :param text: str
+    :return: set[str]
+    """
+    if not text:
+        return set()
+    padded = f' {text} '
+    return {padded[index:index + GRAM_SIZE] for index in range(max(len(padded) - GRAM_SIZE + 1, 1))}
+
+
+class CorrectionIndex:
+    """Índice invertido de trigramas das chaves do mapa de correções."""
+
+    def __init__(self, keys=(), min_chars: int = DESCRIPTION_FUZZY_MIN_CHARS):
+        self.min_chars = min_chars
+        self.keys = []  # Chaves indexadas, na ordem de inclusão (o id de cada chave é a posição)
+        self.sizes = []  # Quantidade de trigramas de cada chave
+        self.postings = {}  # Trigrama -> ids das chaves que o contêm
+        self._ids = {}
+        for key in keys:
+            self.add(key)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def add(self, key: str):
+        """
+        Inclui uma chave no índice (chamado a cada correção registrada).
+
+        :param key: str - Chave de correção.
+        """
+        if key in self._ids or not is_searchable(key, self.min_chars):
+            return
+        key_grams = grams(key)
+        key_id = self._ids[key] = len(self.keys)
+        self.keys.append(key)
+        self.sizes.append(len(key_grams))
+        for gram in key_grams:
+            self.postings.setdefault(gram, []).append(key_id)
+
+    def lookup(self, key: str, threshold: float = DESCRIPTION_FUZZY_THRESHOLD):
+        """
+        Busca a chave indexada mais parecida.
+
+        :param key: str - Chave de correção da descrição consultada.
+        :param threshold: float - Similaridade mínima (Dice entre os trigramas, de 0 a 1).
+        :return: tuple ou None - (chave, similaridade) da melhor chave acima do limite.
+        """
+        if threshold <= 0 or not self.keys or not is_searchable(key, self.min_chars):
+            return None
+        query = grams(key)
+
+        # Dice >= t exige pelo menos t * |q| / (2 - t) trigramas em comum, então toda chave aceita contém algum dos
+        # |q| - mínimo + 1 trigramas mais raros da consulta (o prefixo)
+        min_shared = math.ceil(threshold * len(query) / (2 - threshold))
+        rarest = sorted(query, key=lambda gram: len(self.postings.get(gram, ())))
+        prefix = len(query) - min_shared + 1
+        candidates = Counter()
+        for gram in rarest[:prefix]:
+            candidates.update(self.postings.get(gram, ()))
+
+        best = None
+        for key_id, prefix_shared in candidates.items():
+            # Filtros baratos antes de recalcular os trigramas da chave: o tamanho e os trigramas em comum que ainda
+            # são possíveis fora do prefixo
+            size = self.sizes[key_id]
+            required = math.ceil(threshold * (size + len(query)) / 2 - 1e-9)
+            if min(size, len(query)) < required or prefix_shared + len(query) - prefix < required:
+                continue
+            score = 2 * len(query & grams(self.keys[key_id])) / (size + len(query))
+            if score >= threshold and (best is None or score > best[1]):
+                best = (self.keys[key_id], score)
+        return best
+
+    def to_state(self):
+        """
+        Obtém as listas que representam o índice, para a gravação no arquivo do modelo.
+
+        :return: dict - Chaves, tamanhos, trigramas e, para cada trigrama, o início dos seus ids em ``ids``.
+        """
+        offsets, ids = [], []
+        for key_ids in self.postings.values():
+            offsets.append(len(ids))
+            ids.extend(key_ids)
+        return {'keys': self.keys, 'sizes': self.sizes, 'grams': list(self.postings), 'offsets': offsets, 'ids': ids}
+
+    @classmethod
+    def from_state(cls, state: dict):
+        """Restaura um índice gravado com ``to_state``."""
+        index = cls()
+        index.keys = list(state['keys'])
+        index.sizes = list(state['sizes'])
+        index._ids = {key: key_id for key_id, key in enumerate(index.keys)}
+        ids, offsets = state['ids'], list(state['offsets']) + [len(state['ids'])]
+        index.postings = {gram: ids[offsets[i]:offsets[i + 1]] for i, gram in enumerate(state['grams'])}
+        return index
@@ -1,11 +1,241 @@
+"""
+Acesso aos dados da aplicação Django.
+
+As requisições são feitas por um único ``httpx.AsyncClient`` por processo, que mantém um pool de conexões
+keep-alive. O cliente roda em um event loop próprio, em uma thread de fundo, para que o mesmo pool sirva
+tanto o código síncrono (treinamento, feedback) quanto o código assíncrono da API.
+"""
+
+import asyncio
+import logging
 import os
+import threading
+import time
+from contextlib import contextmanager
 from typing import Optional
 
-import requests
+import httpx
 
-from api.oauth2_client import OAuth2Client
+from api.oauth2_client import CLIENT_ID, CLIENT_SECRET, OAUTH2_TOKEN_URL, OAuth2Client
+from training.metrics import DATA_FETCH_SECONDS
 
 SERVER_URL = os.getenv('SERVER_URL')
+DATA_FETCHER_TIMEOUT = float(os.getenv('DATA_FETCHER_TIMEOUT', 30))
+DATA_FETCHER_CONNECT_TIMEOUT = float(os.getenv('DATA_FETCHER_CONNECT_TIMEOUT', 5))
+DATA_FETCHER_RETRIES = int(os.getenv('DATA_FETCHER_RETRIES', 2))
+DATA_FETCHER_BACKOFF = float(os.getenv('DATA_FETCHER_BACKOFF', 0.5))
+DATA_FETCHER_MAX_CONNECTIONS = int(os.getenv('DATA_FETCHER_MAX_CONNECTIONS', 20))
+DATA_FETCHER_MAX_KEEPALIVE = int(os.getenv('DATA_FETCHER_MAX_KEEPALIVE', 10))
+DATA_FETCHER_PAGE_SIZE = int(os.getenv('DATA_FETCHER_PAGE_SIZE', 1000))
+SERVICE_USER_PARAM = os.getenv('SERVICE_USER_PARAM', 'user')
+
+RETRY_STATUS_CODES = {429, 502, 503, 504}
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncDataFetcher:
+    """Cliente HTTP assíncrono com pool de conexões, timeouts e novas tentativas."""
+
+    def __init__(
+        self,
+        timeout: float = DATA_FETCHER_TIMEOUT,
+        connect_timeout: float = DATA_FETCHER_CONNECT_TIMEOUT,
+        retries: int = DATA_FETCHER_RETRIES,
+        backoff: float = DATA_FETCHER_BACKOFF,
+        max_connections: int = DATA_FETCHER_MAX_CONNECTIONS,
+        max_keepalive: int = DATA_FETCHER_MAX_KEEPALIVE,
+    ):
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive)
+        self.retries = retries
+        self.backoff = backoff
+        self._client = None
+
+    @property
+    def client(self):
+        # Criado sob demanda para ficar vinculado ao event loop em que será usado
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=self.timeout, limits=self.limits)
+        return self._client
+
+    async def fetch(self, resource: str, token: str, params: Optional[dict] = None):
+        """
+        Obtém um recurso da API, repetindo a requisição em falhas transitórias.
+
+        :param resource: str - resource do recurso (ex: 'transactions/')
+        :param token: str - token JWT.
+        :param params: dict (opcional) - parâmetros de query string.
+        :return: dict|list|None
+        """
+        return await self.fetch_url(f'{SERVER_URL}/api/{resource}', token, params, resource=resource)
+
+    async def fetch_url(self, url: str, token: str, params: Optional[dict] = None, resource: Optional[str] = None):
+        """
+        Obtém uma URL absoluta da API (ex: o link 'next' de uma página), repetindo em falhas transitórias.
+
+        :param url: str - URL completa.
+        :param token: str - token JWT.
+        :param params: dict (opcional) - parâmetros de query string.
+        :param resource: str (opcional) - resource de origem, usado como label nas métricas.
+        :return: dict|list|None
+        """
+        resource = (resource or 'url').split('?')[0].strip('/')
+        start = time.perf_counter()
+        data = await self._fetch_url(url, token, params)
+        DATA_FETCH_SECONDS.observe(
+            time.perf_counter() - start, resource=resource, status='ok' if data is not None else 'error'
+        )
+        return data
+
+    async def _fetch_url(self, url: str, token: str, params: Optional[dict] = None):
+        headers = {'Authorization': f'Bearer {token}'}
+
+        for attempt in range(self.retries + 1):
+            try:
+                response = await self.client.get(url, headers=headers, params=params)
+                if response.status_code in RETRY_STATUS_CODES and attempt < self.retries:
+                    await asyncio.sleep(self.backoff * 2**attempt)
+                    continue
+                response.raise_for_status()
+                return response.json()
+            except httpx.TransportError as e:
+                if attempt < self.retries:
+                    await asyncio.sleep(self.backoff * 2**attempt)
+                    continue
+                logger.warning('Erro ao acessar %s: %s', url, e)
+                return None
+            except (httpx.HTTPStatusError, ValueError) as e:
+                logger.warning('Erro ao acessar %s: %s', url, e)
+                return None
+        return None
+
+    async def fetch_many(self, resources: list[str], token: str, params: Optional[dict] = None):
+        """
+        Obtém vários recursos concorrentemente.
+
+        :param resources: list[str] - Lista de resources.
+        :param token: str - token JWT.
+        :param params: dict (opcional) - parâmetros de query string, iguais para todos os resources.
+        :return: list - Dados de cada resource, na mesma ordem (None para os que falharem).
+        """
+        return await asyncio.gather(*(self.fetch(resource, token, params) for resource in resources))
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+_state = {'pid': None, 'loop': None, 'fetcher': None, 'oauth_client': None}
+_state_lock = threading.Lock()
+
+
+def _get_runtime():
+    """
+    Obtém (criando se necessário) o event loop de fundo e o fetcher do processo atual.
+
+    O pid é verificado para que processos filhos criados por fork não reutilizem a thread do processo pai.
+    """
+    with _state_lock:
+        if _state['pid'] != os.getpid():
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name='data-fetcher', daemon=True).start()
+            _state.update(pid=os.getpid(), loop=loop, fetcher=AsyncDataFetcher(), oauth_client=None)
+        return _state['loop'], _state['fetcher']
+
+
+def submit(coroutine_factory):
+    """
+    Agenda uma corrotina do fetcher no event loop de fundo sem aguardar o resultado.
+
+    :param coroutine_factory: Callable[[AsyncDataFetcher], Coroutine] - Função que recebe o fetcher e
+        retorna a corrotina a executar.
+    :return: concurrent.futures.Future
+    """
+    loop, fetcher = _get_runtime()
+    return asyncio.run_coroutine_threadsafe(coroutine_factory(fetcher), loop)
+
+
+def run_sync(coroutine_factory):
+    """
+    Executa uma corrotina do fetcher no event loop de fundo e aguarda o resultado.
+
+    :param coroutine_factory: Callable[[AsyncDataFetcher], Coroutine] - Função que recebe o fetcher e
+        retorna a corrotina a executar.
+    """
+    return submit(coroutine_factory).result()
+
+
+async def run_async(coroutine_factory):
+    """
+    Executa uma corrotina do fetcher no event loop de fundo sem bloquear o event loop atual.
+
+    :param coroutine_factory: Callable[[AsyncDataFetcher], Coroutine] - Função que recebe o fetcher e
+        retorna a corrotina a executar.
+    """
+    return await asyncio.wrap_future(submit(coroutine_factory))
+
+
+_service_user = threading.local()
+
+
+@contextmanager
+def on_behalf_of(user_id):
+    """
+    Faz as requisições com o token de serviço desta thread buscarem apenas os dados de um usuário.
+
+    Usado pelos treinamentos em lote (ver training.bulk_train), que não têm o token do usuário: o id vai no
+    parâmetro SERVICE_USER_PARAM de cada requisição. Requisições com o token do próprio usuário não mudam.
+
+    :param user_id: Id do usuário.
+    """
+    previous = getattr(_service_user, 'user_id', None)
+    _service_user.user_id = user_id
+    try:
+        yield
+    finally:
+        _service_user.user_id = previous
+
+
+def has_service_token():
+    """Verifica se o token de serviço (OAuth2 client credentials) está configurado."""
+    return bool(OAUTH2_TOKEN_URL and CLIENT_ID and CLIENT_SECRET)
+
+
+def service_params(token: Optional[str] = None, params: Optional[dict] = None):
+    """
+    Acrescenta o filtro pelo usuário aos parâmetros quando o token de serviço é usado dentro de ``on_behalf_of``.
+
+    :param token: str (opcional) - token JWT manual; se informado, os parâmetros não mudam.
+    :param params: dict (opcional) - parâmetros de query string.
+    :return: dict|None
+    """
+    user_id = getattr(_service_user, 'user_id', None)
+    if token or user_id is None:
+        return params
+    return {**(params or {}), SERVICE_USER_PARAM: user_id}
+
+
+def resolve_token(token: Optional[str] = None):
+    """
+    Retorna o token informado ou, se não houver, o token de serviço obtido via OAuth2.
+
+    O cliente OAuth2 (e sua conexão com o Redis) é criado uma única vez por processo.
+
+    :param token: str (opcional) - token JWT manual (ex: vindo do Insomnia).
+    :return: str
+    """
+    if token:
+        return token
+
+    _get_runtime()
+    with _state_lock:
+        if _state['oauth_client'] is None:
+            logger.info('Nenhum token fornecido. Gerando token via OAuth2...')
+            _state['oauth_client'] = OAuth2Client()
+        oauth_client = _state['oauth_client']
+    return oauth_client.get_token()
 
 
 def get_data(resource: str, token: Optional[str] = None):
@@ -16,18 +246,80 @@ def get_data(resource: str, token: Optional[str] = None):
     :param token: str (opcional) - token JWT manual (ex: vindo do Insomnia).
     :return: dict|None
     """
-    if not token:
-        print('[Data Fetcher] Nenhum token fornecido. Gerando token via OAuth2...')
-        oauth_client = OAuth2Client()
-        token = oauth_client.get_token()
+    params = service_params(token)
+    token = resolve_token(token)
+    return run_sync(lambda fetcher: fetcher.fetch(resource, token, params))
 
-    url = f'{SERVER_URL}/api/{resource}'
-    headers = {'Authorization': f'Bearer {token}'}
 
-    try:
-        response = requests.get(url, headers=headers, timeout=5)
-        response.raise_for_status()
-        return response.json()
-    except requests.RequestException as e:
-        print(f'[Data Fetcher] Erro ao acessar {url}: {e}')
-        return None
+def get_many_data(resources: list[str], token: Optional[str] = None):
+    """
+    Obtém vários recursos concorrentemente, usando o pool de conexões compartilhado.
+
+    :param resources: list[str] - Lista de resources (ex: ['categories', 'subcategories']).
+    :param token: str (opcional) - token JWT manual (ex: vindo do Insomnia).
+    :return: list - Dados de cada resource, na mesma ordem (None para os que falharem).
+    """
+    params = service_params(token)
+    token = resolve_token(token)
+    return run_sync(lambda fetcher: fetcher.fetch_many(resources, token, params))
+
+
+async def get_data_async(resource: str, token: Optional[str] = None):
+    """
+    Versão assíncrona de get_data, para uso dentro de endpoints ``async``.
+
+    :param resource: str - resource do recurso (ex: 'transactions/')
+    :param token: str (opcional) - token JWT manual.
+    :return: dict|None
+    """
+    params = service_params(token)
+    token = resolve_token(token)
+    return await run_async(lambda fetcher: fetcher.fetch(resource, token, params))
+
+
+def iter_pages(
+    resource: str, token: Optional[str] = None, page_size: int = DATA_FETCHER_PAGE_SIZE, params: Optional[dict] = None
+):
+    """
+    Percorre um recurso paginado, página por página.
+
+    Usa a paginação por limit/offset do Django REST Framework e segue o link 'next' quando presente (o que
+    também cobre a paginação por cursor). Se o backend não paginar o recurso e devolver uma lista, ela é
+    entregue como página única. A página seguinte é requisitada enquanto a atual é processada, de modo que no
+    máximo duas páginas ficam em memória.
+
+    :param resource: str - resource do recurso (ex: 'transactions/')
+    :param token: str (opcional) - token JWT manual.
+    :param page_size: int - Quantidade de itens por página.
+    :param params: dict (opcional) - Parâmetros de query string adicionais (ex: filtros).
+    :return: Iterator[tuple[list, int|None]] - Itens de cada página e o total informado pelo backend.
+    :raises ValueError: Se uma página intermediária não puder ser obtida.
+    """
+    query = {**(service_params(token, params) or {}), 'limit': page_size, 'offset': 0}
+    token = resolve_token(token)
+    future = submit(lambda fetcher: fetcher.fetch(resource, token, query))
+    pages = 0
+
+    while future is not None:
+        data = future.result()
+        future = None
+
+        if data is None:
+            if pages:
+                raise ValueError(f'Não foi possível obter a página {pages + 1} de {resource}.')
+            return
+
+        if isinstance(data, list):
+            yield data, len(data)
+            return
+
+        results = data.get('results') or []
+        next_url = data.get('next')
+        if next_url:
+            future = submit(lambda fetcher, url=next_url: fetcher.fetch_url(url, token, resource=resource))
+        elif 'next' not in data and len(results) == page_size:
+            query = {**query, 'offset': query['offset'] + page_size}
+            future = submit(lambda fetcher, page_query=query: fetcher.fetch(resource, token, page_query))
+
+        pages += 1
+        yield results, data.get('count')
@@ -0,0 +1,115 @@
+"""
+Validação progressiva (test-then-train) dos modelos.
+
+No laço de treinamento, cada exemplo é previsto pelo modelo antes de ser aprendido. Como o modelo ainda não viu o
+exemplo, o acerto acumulado estima a qualidade em dados novos sem separar um conjunto de teste e sem uma segunda
+passada pelos dados. Para não pagar um ``predict_one`` do River por exemplo, os exemplos são previstos em blocos
+de PROGRESSIVE_VALIDATION_CHUNK com ``predict_proba_batch`` e só então aprendidos: cada exemplo é previsto por
+um modelo que ainda não o viu (nem os demais do bloco).
+
+As contagens ficam no estado extra do modelo (e continuam no treino incremental) e o resumo (acurácia, macro-F1
+e contagens por classe) vai para o manifesto, exposto em ``GET /status``.
+
+No preditor de descrições, cada descrição corrigida é uma classe. Para que o estado e o manifesto não cresçam sem
+limite, só as PROGRESSIVE_METRICS_MAX_CLASSES classes com mais ocorrências e previsões mantêm as contagens; as
+demais entram no macro-F1 apenas pelo F1 que tinham quando saíram (uma aproximação).
+"""
+
+import os
+
+import numpy as np
+
+PROGRESSIVE_VALIDATION_CHUNK = int(os.getenv('PROGRESSIVE_VALIDATION_CHUNK', 32))
+PROGRESSIVE_METRICS_MAX_CLASSES = int(os.getenv('PROGRESSIVE_METRICS_MAX_CLASSES', 200))
+
+
+def f1_score(support, predicted, correct):
+    """F1 de uma classe a partir das suas contagens."""
+    return 2 * correct / (support + predicted) if support + predicted else 0.0
+
+
+class ProgressiveMetrics:
+    """Contagens da validação progressiva: total, acertos e, por classe, ocorrências, previsões e acertos."""
+
+    def __init__(self, state: dict = None, max_classes: int = PROGRESSIVE_METRICS_MAX_CLASSES):
+        state = state or {}
+        self.max_classes = max_classes
+        self.samples = state.get('samples', 0)
+        self.correct = state.get('correct', 0)
+        # Classe -> [ocorrências, previsões, acertos]
+        self.classes = {label: list(counts) for label, counts in state.get('classes', {}).items()}
+        # Classes que saíram das contagens: [quantidade, soma dos F1]
+        self.dropped = list(state.get('dropped', [0, 0.0]))
+
+    def update(self, y_true, y_pred):
+        """
+        Registra a previsão de um exemplo, feita antes de aprendê-lo.
+
+        :param y_true: Classe do exemplo.
+        :param y_pred: Classe prevista (None se o modelo ainda não conhecia nenhuma classe).
+        """
+        self.samples += 1
+        self.classes.setdefault(y_true, [0, 0, 0])[0] += 1
+        if y_pred is not None:
+            self.classes.setdefault(y_pred, [0, 0, 0])[1] += 1
+        if y_pred == y_true:
+            self.correct += 1
+            self.classes[y_true][2] += 1
+        # Com folga, para não ordenar as classes a cada exemplo
+        if self.max_classes and len(self.classes) > 2 * self.max_classes:
+            self.compact()
+
+    def compact(self):
+        """Mantém as contagens só das MAX_CLASSES classes com mais ocorrências e previsões."""
+        if not self.max_classes or len(self.classes) <= self.max_classes:
+            return
+        ranked = sorted(self.classes, key=lambda label: self.classes[label][0] + self.classes[label][1], reverse=True)
+        for label in ranked[self.max_classes:]:
+            self.dropped[0] += 1
+            self.dropped[1] += f1_score(*self.classes.pop(label))
+
+    def update_many(self, y_true: list, classes: list, proba):
+        """
+        Registra as previsões de um bloco de exemplos, a partir das probabilidades de ``predict_proba_batch``.
+
+        :param y_true: list - Classes dos exemplos.
+        :param classes: list - Classes, na ordem das colunas de ``proba``.
+        :param proba: Matriz de probabilidades, com uma linha por exemplo.
+        """
+        if not classes:
+            predictions = [None] * len(y_true)
+        else:
+            # argmax fica com a primeira classe nos empates, como o predict_one do River
+            predictions = [classes[index] for index in np.asarray(proba).argmax(axis=1).tolist()]
+        for target, prediction in zip(y_true, predictions):
+            self.update(target, prediction)
+
+    def get_state(self):
+        """Contagens que vão para o estado extra do modelo."""
+        self.compact()
+        return {'samples': self.samples, 'correct': self.correct, 'classes': self.classes, 'dropped': self.dropped}
+
+    def summary(self, per_class: bool = True):
+        """
+        Resume as contagens.
+
+        O macro-F1 é a média do F1 das classes que apareceram nos exemplos ou nas previsões, como no
+        ``metrics.MacroF1`` do River, incluindo as classes que saíram das contagens.
+
+        :param per_class: bool - Inclui as contagens por classe (no máximo MAX_CLASSES classes).
+        :return: dict - Exemplos avaliados, acurácia, macro-F1 e, opcionalmente, as contagens por classe.
+        """
+        self.compact()
+        f1_sum = sum(f1_score(*counts) for counts in self.classes.values()) + self.dropped[1]
+        f1_count = len(self.classes) + self.dropped[0]
+        summary = {
+            'evaluated': self.samples,
+            'accuracy': self.correct / self.samples if self.samples else None,
+            'macro_f1': f1_sum / f1_count if f1_count else None,
+        }
+        if per_class:
+            summary['per_class'] = {
+                label: {'support': support, 'predicted': predicted, 'correct': correct}
+                for label, (support, predicted, correct) in self.classes.items()
+            }
+        return summary
@@ -0,0 +1,244 @@
+"""
+Acúmulo dos feedbacks enviados à API antes de aplicá-los ao modelo.
+
+Cada feedback aplicado individualmente carrega o modelo, re-treina e regrava o arquivo inteiro. Como os
+feedbacks costumam chegar em rajadas (o usuário corrige vários lançamentos em sequência), eles podem ser
+acumulados por (usuário, preditor) e aplicados de uma vez, em uma única chamada a ``apply_feedback``, quando o
+buffer atinge FEEDBACK_BUFFER_MAX_ITEMS itens ou quando o lote completa FEEDBACK_BUFFER_INTERVAL segundos.
+Feedbacks repetidos para o mesmo id são consolidados no mais recente. Um lote que falha volta para o buffer e é
+tentado de novo, com espera crescente, até FEEDBACK_BUFFER_MAX_RETRIES vezes.
+
+O buffer é opcional (FEEDBACK_BUFFER_INTERVAL > 0). Os feedbacks acumulados ficam apenas na memória do processo:
+a API responde que eles foram recebidos antes de aplicá-los, e os pendentes se perdem se o processo cair. Com
+FEEDBACK_BUFFER_INTERVAL=0 (padrão), cada requisição aplica os seus feedbacks e devolve o resultado do re-treino.
+"""
+
+import logging
+import os
+import threading
+import time
+
+from training.jobs import get_predictor_class
+from training.metrics import FEEDBACK_APPLY_SECONDS, FEEDBACK_BATCH_SIZE, user_labels
+
+FEEDBACK_BUFFER_INTERVAL = float(os.getenv('FEEDBACK_BUFFER_INTERVAL', 0))
+FEEDBACK_BUFFER_MAX_ITEMS = int(os.getenv('FEEDBACK_BUFFER_MAX_ITEMS', 200))
+FEEDBACK_BUFFER_MAX_RETRIES = int(os.getenv('FEEDBACK_BUFFER_MAX_RETRIES', 5))
+
+logger = logging.getLogger(__name__)
+
+
+class FeedbackBuffer:
+    """Acumula os feedbacks por (usuário, preditor) e os aplica em lote por uma thread de fundo."""
+
+    def __init__(
+        self,
+        interval: float = FEEDBACK_BUFFER_INTERVAL,
+        max_items: int = FEEDBACK_BUFFER_MAX_ITEMS,
+        max_retries: int = FEEDBACK_BUFFER_MAX_RETRIES,
+    ):
+        self.interval = interval
+        self.max_items = max_items
+        self.max_retries = max_retries
+        self._pending = {}
+        self._condition = threading.Condition()
+        self._thread = None
+        self._closed = False
+        self.received = 0
+        self.coalesced = 0
+        self.flushes = 0
+        self.failures = 0
+        self.retries = 0
+        self.dropped = 0
+
+    @property
+    def enabled(self):
+        return self.interval > 0
+
+    def add(self, predictor_type: str, user_id, feedbacks: list, token: str):
+        """
+        Adiciona feedbacks ao buffer do usuário, ou os aplica imediatamente se o buffer estiver desativado.
+
+        :param predictor_type: str - Tipo do preditor ('subcategory' ou 'description').
+        :param user_id: Id do usuário.
+        :param feedbacks: list - Feedbacks recebidos.
+        :param token: str - Token JWT usado no re-treino (o mais recente é mantido).
+        :return: dict - Resultado do re-treino (buffer desativado) ou a quantidade de feedbacks pendentes.
+        """
+        FEEDBACK_BATCH_SIZE.observe(len(feedbacks), type=predictor_type, stage='received', **user_labels(user_id))
+        if not self.enabled:
+            return self._retrain(predictor_type, user_id, feedbacks, token)
+
+        key = (user_id, predictor_type)
+        with self._condition:
+            self._ensure_thread()
+            entry = self._pending.get(key)
+            is_new = entry is None
+            if is_new:
+                entry = self._pending[key] = {
+                    'items': {},
+                    'token': token,
+                    'due': time.monotonic() + self.interval,
+                    'attempts': 0,
+                }
+            entry['token'] = token
+            for index, feedback in enumerate(feedbacks):
+                # Sem id, o feedback não pode ser consolidado e é mantido como um item próprio
+                feedback_id = feedback.get('id') if isinstance(feedback, dict) else None
+                item_key = ('id', feedback_id) if feedback_id is not None else ('item', self.received + index)
+                if item_key in entry['items']:
+                    self.coalesced += 1
+                entry['items'][item_key] = feedback
+            self.received += len(feedbacks)
+            pending = len(entry['items'])
+
+            # Um novo lote traz um novo prazo: a thread pode estar aguardando sem prazo, com o buffer vazio
+            if is_new or pending >= self.max_items:
+                self._condition.notify()
+
+        return {
+            'success': True,
+            'message': f'{len(feedbacks)} feedback(s) recebido(s); serão aplicados ao modelo em instantes.',
+            'data': {'pending': pending},
+        }
+
+    def flush(self, key: tuple = None):
+        """
+        Aplica imediatamente os feedbacks pendentes.
+
+        :param key: tuple (opcional) - (user_id, tipo do preditor). Se omitido, todos os buffers são aplicados.
+        :return: int - Quantidade de buffers aplicados.
+        """
+        with self._condition:
+            keys = [key] if key is not None else list(self._pending)
+            entries = [(k, self._pending.pop(k)) for k in keys if k in self._pending]
+
+        for entry_key, entry in entries:
+            self._apply(entry_key, entry)
+        return len(entries)
+
+    def close(self):
+        """Para a thread de fundo e aplica o que estiver pendente (chamado no desligamento da aplicação)."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        # Sem a thread, um lote que falhar aqui é descartado (ver _requeue)
+        self.flush()
+
+    def stats(self):
+        """Retorna os contadores do buffer."""
+        with self._condition:
+            return {
+                'enabled': self.enabled,
+                'interval': self.interval,
+                'max_items': self.max_items,
+                'buffers': len(self._pending),
+                'pending': sum(len(entry['items']) for entry in self._pending.values()),
+                'received': self.received,
+                'coalesced': self.coalesced,
+                'flushes': self.flushes,
+                'failures': self.failures,
+                'retries': self.retries,
+                'dropped': self.dropped,
+            }
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._closed = False
+            self._thread = threading.Thread(target=self._run, name='feedback-buffer', daemon=True)
+            self._thread.start()
+
+    def _due(self, now: float):
+        return [
+            key
+            for key, entry in self._pending.items()
+            if len(entry['items']) >= self.max_items or now >= entry['due']
+        ]
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._closed:
+                    now = time.monotonic()
+                    due = self._due(now)
+                    if due:
+                        break
+                    deadlines = [entry['due'] for entry in self._pending.values()]
+                    self._condition.wait(timeout=max(0.0, min(deadlines) - now) if deadlines else None)
+                if self._closed:
+                    return
+                entries = [(key, self._pending.pop(key)) for key in due]
+
+            for key, entry in entries:
+                self._apply(key, entry)
+
+    def _apply(self, key: tuple, entry: dict):
+        user_id, predictor_type = key
+        feedbacks = list(entry['items'].values())
+        try:
+            result = self._retrain(predictor_type, user_id, feedbacks, entry['token'], buffered=True)
+        except Exception:
+            logger.exception(
+                'Erro ao aplicar feedbacks',
+                extra={
+                    'user_id': user_id,
+                    'type': predictor_type,
+                    'feedbacks': len(feedbacks),
+                    'attempts': entry['attempts'] + 1,
+                },
+            )
+            with self._condition:
+                self.failures += 1
+            self._requeue(key, entry)
+            return
+
+        # Um resultado sem sucesso (ex: nenhum feedback válido) não muda numa nova tentativa
+        if not result.get('success'):
+            logger.warning(
+                'Feedbacks não aplicados: %s',
+                result.get('message'),
+                extra={'user_id': user_id, 'type': predictor_type, 'feedbacks': len(feedbacks)},
+            )
+        with self._condition:
+            self.flushes += 1
+
+    def _requeue(self, key: tuple, entry: dict):
+        """Devolve ao buffer um lote que falhou, para uma nova tentativa com espera crescente."""
+        user_id, predictor_type = key
+        entry['attempts'] += 1
+        with self._condition:
+            if entry['attempts'] > self.max_retries or self._closed:
+                self.dropped += len(entry['items'])
+                logger.error(
+                    'Feedbacks descartados após %d tentativa(s)',
+                    entry['attempts'],
+                    extra={'user_id': user_id, 'type': predictor_type, 'feedbacks': len(entry['items'])},
+                )
+                return
+
+            pending = self._pending.get(key)
+            if pending is not None:
+                # Os feedbacks recebidos durante a tentativa são mais recentes e prevalecem
+                entry['items'].update(pending['items'])
+                entry['token'] = pending['token']
+            entry['due'] = time.monotonic() + max(self.interval, 1.0) * 2 ** (entry['attempts'] - 1)
+            self._pending[key] = entry
+            self.retries += 1
+            self._condition.notify()
+
+    @staticmethod
+    def _retrain(predictor_type: str, user_id, feedbacks: list, token: str, buffered: bool = False):
+        labels = {'type': predictor_type, **user_labels(user_id)}
+        FEEDBACK_BATCH_SIZE.observe(len(feedbacks), stage='applied', **labels)
+        with FEEDBACK_APPLY_SECONDS.time(**labels):
+            predictor = get_predictor_class(predictor_type)(user_id)
+            # O buffer precisa ver os erros para tentar de novo; a requisição recebe o resultado do re-treino
+            if buffered:
+                return predictor.apply_feedback(feedbacks, token)
+            return predictor.retrain_from_feedback(feedbacks, token)
+
+
+feedback_buffer = FeedbackBuffer()
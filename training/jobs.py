@@ -0,0 +1,271 @@
+"""
+Execução dos treinamentos em segundo plano.
+
+Os treinamentos rodam em um pool de processos limitado, fora do event loop da API, e são identificados por um
+job id. O estado dos jobs fica na tabela ``jobs`` do manifesto (ver training.manifest), compartilhada por todos
+os workers da API: qualquer worker responde ``/jobs/{id}`` e cada (usuário, preditor) tem no máximo um job ativo
+entre todos eles. Um novo pedido enquanto o anterior ainda está na fila ou em execução devolve o job existente.
+O processo do pool grava o progresso reportado pelo preditor diretamente no manifesto.
+
+Um job pode esperar na fila mais do que dura o token de acesso do usuário que o pediu. Com o token de serviço
+configurado, os dados são obtidos com ele, em nome do usuário (ver ``data_fetcher.on_behalf_of``); sem ele, um job
+cujo token expirou na fila falha logo, com uma mensagem pedindo um novo treinamento.
+"""
+
+import importlib
+import logging
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import nullcontext
+
+from jose import JWTError, jwt
+
+from training.log import configure_logging
+from training.manifest import MODEL_DIR, manifest_for
+from training.metrics import TRAIN_SECONDS, user_labels
+
+TRAINING_WORKERS = int(os.getenv('TRAINING_WORKERS', 2))
+TRAINING_JOB_HISTORY = int(os.getenv('TRAINING_JOB_HISTORY', 1000))
+TRAINING_JOB_TIMEOUT = float(os.getenv('TRAINING_JOB_TIMEOUT', 3600))
+
+PREDICTOR_CLASSES = {
+    'subcategory': 'training.predictors.subcategory.SubcategoryPredictor',
+    'description': 'training.predictors.description.DescriptionPredictor',
+}
+
+logger = logging.getLogger(__name__)
+
+
+def get_predictor_class(predictor_type: str):
+    """
+    Importa a classe do preditor sob demanda.
+
+    :param predictor_type: str - Tipo do preditor ('subcategory' ou 'description').
+    :return: type - Subclasse de TransactionClassifier.
+    """
+    module_name, class_name = PREDICTOR_CLASSES[predictor_type].rsplit('.', 1)
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+def token_expired(token: str, now: float = None):
+    """
+    Verifica, sem validar a assinatura, se o ``exp`` do token já passou.
+
+    :param token: str - Token JWT.
+    :param now: float (opcional) - Timestamp de referência. Padrão: agora.
+    :return: bool - False se o token não tiver ``exp`` ou não puder ser lido (a API do Django decide).
+    """
+    try:
+        expires_at = jwt.get_unverified_claims(token).get('exp')
+    except JWTError:
+        return False
+    return expires_at is not None and expires_at <= (now or time.time())
+
+
+def run_training_job(job_id: str, predictor_type: str, user_id, token: str, options: dict, track: bool = True):
+    """
+    Executa um treinamento dentro de um processo do pool.
+
+    :param job_id: str - Identificador do job.
+    :param predictor_type: str - Tipo do preditor.
+    :param user_id: Id do usuário.
+    :param token: str - Token JWT do usuário; substituído pelo token de serviço, se configurado.
+    :param options: dict - Argumentos adicionais repassados para ``train``.
+    :param track: bool - Publica o início e o progresso no job registrado no manifesto.
+    :return: dict - Resultado retornado por ``train``.
+    """
+    # Importado aqui para que o limite de conexões definido pelo processo principal valha no pool
+    from training.data_fetcher import has_service_token, on_behalf_of
+
+    # Os processos do pool são criados por spawn e não herdam a configuração de logs do processo da API
+    configure_logging()
+    started_at = time.time()
+
+    credentials = nullcontext()
+    if token and has_service_token():
+        token, credentials = None, on_behalf_of(user_id)
+    elif token and token_expired(token, started_at):
+        logger.warning('Token expirado antes do treinamento', extra={'job_id': job_id, 'user_id': user_id})
+        return {
+            'success': False,
+            'message': 'O token do usuário expirou enquanto o treinamento aguardava na fila. Solicite o treinamento '
+            'novamente.',
+        }
+
+    classifier = get_predictor_class(predictor_type)(user_id)
+    if track:
+        manifest = manifest_for(MODEL_DIR)
+        manifest.update_job(job_id, state='running', started_at=started_at, progress={'stage': 'started'})
+        classifier.progress_callback = lambda counters: publish_progress(manifest, job_id, counters)
+    with credentials:
+        result = classifier.train(token, **options)
+
+    # Um treinamento pulado por falta de dados novos não altera o modelo publicado
+    if result.get('success') and not result.get('skipped'):
+        try:
+            classifier.manifest.record_training(user_id, predictor_type, time.time() - started_at)
+        except Exception:
+            logger.exception('Erro ao atualizar o manifesto', extra={'user_id': user_id, 'type': predictor_type})
+    return result
+
+
+def publish_progress(manifest, job_id: str, counters: dict):
+    """Grava o progresso de um job no manifesto; uma falha não interrompe o treinamento."""
+    try:
+        manifest.update_job(job_id, progress=counters)
+    except Exception:
+        logger.exception('Erro ao publicar o progresso do treinamento', extra={'job_id': job_id})
+
+
+class JobManager:
+    """Gerencia a fila de treinamentos do processo; o estado de cada job fica no manifesto."""
+
+    def __init__(
+        self,
+        max_workers: int = TRAINING_WORKERS,
+        history: int = TRAINING_JOB_HISTORY,
+        model_dir: str = MODEL_DIR,
+        timeout: float = TRAINING_JOB_TIMEOUT,
+    ):
+        self.max_workers = max_workers
+        self.history = history
+        self.model_dir = model_dir
+        self.timeout = timeout
+        self._context = None
+        self._executor = None
+        # Reentrante: o callback de conclusão pode rodar na própria thread que chamou submit
+        self._lock = threading.RLock()
+
+    @property
+    def manifest(self):
+        return manifest_for(self.model_dir)
+
+    def _ensure_executor(self):
+        if self._executor is None:
+            # spawn evita herdar as threads (event loop do data fetcher, servidor) do processo da API
+            self._context = multiprocessing.get_context('spawn')
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=self._context)
+
+    def submit(self, predictor_type: str, user_id, token: str, **options):
+        """
+        Enfileira um treinamento, reaproveitando o job ativo do mesmo usuário e preditor, se houver (inclusive um
+        job criado por outro worker da API).
+
+        :param predictor_type: str - Tipo do preditor ('subcategory' ou 'description').
+        :param user_id: Id do usuário.
+        :param token: str - Token JWT usado para obter os dados.
+        :param options: Argumentos adicionais repassados para ``train``.
+        :return: dict - Estado do job.
+        """
+        job_id = uuid.uuid4().hex
+        job = self.manifest.create_job(
+            {
+                'id': job_id,
+                'user_id': user_id,
+                'type': predictor_type,
+                'options': options,
+                'state': 'queued',
+                'created_at': time.time(),
+                'started_at': None,
+                'finished_at': None,
+                'duration': None,
+                'progress': {},
+                'result': None,
+            },
+            self.timeout,
+        )
+        if job['id'] != job_id:
+            return self._serialize(job)
+
+        args = (run_training_job, job_id, predictor_type, user_id, token, options)
+        try:
+            with self._lock:
+                self._ensure_executor()
+                try:
+                    future = self._executor.submit(*args)
+                except BrokenProcessPool:
+                    # Um processo do pool morreu (ex: falta de memória); o pool é recriado
+                    self._executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=self._context)
+                    future = self._executor.submit(*args)
+        except Exception as e:
+            # O job já está no manifesto: sem ser marcado como falho, ele bloquearia novos pedidos até o timeout
+            self._finish(job, 'failed', {'success': False, 'message': str(e)})
+            raise
+        future.add_done_callback(lambda f: self._on_done(job, f))
+        self._trim_history()
+        return self._serialize(job)
+
+    def get(self, job_id: str):
+        """
+        Obtém o estado atual de um job, criado por qualquer worker da API.
+
+        :param job_id: str - Identificador do job.
+        :return: dict|None - Estado do job ou None se não existir.
+        """
+        job = self.manifest.get_job(job_id)
+        return self._serialize(job) if job else None
+
+    def shutdown(self):
+        """Encerra o pool de processos, aguardando os treinamentos em andamento."""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True, cancel_futures=True)
+                self._executor = None
+
+    def _on_done(self, job, future):
+        if future.cancelled():
+            self._finish(job, 'cancelled', {'success': False, 'message': 'Treinamento cancelado.'})
+        elif future.exception() is not None:
+            self._finish(job, 'failed', {'success': False, 'message': str(future.exception())})
+        else:
+            result = future.result()
+            self._finish(job, 'succeeded' if result.get('success') else 'failed', result)
+
+    def _finish(self, job, state: str, result: dict):
+        finished_at = time.time()
+        try:
+            stored = self.manifest.get_job(job['id']) or job
+        except Exception:
+            stored = job
+        started_at = stored['started_at'] or finished_at
+        duration = finished_at - started_at
+        try:
+            self.manifest.update_job(
+                job['id'], state=state, result=result, started_at=started_at, finished_at=finished_at, duration=duration
+            )
+        except Exception:
+            logger.exception('Erro ao registrar o fim do treinamento', extra={'job_id': job['id']})
+
+        mode = 'incremental' if job['options'].get('incremental') else 'full'
+        TRAIN_SECONDS.observe(duration, type=job['type'], mode=mode, state=state, **user_labels(job['user_id']))
+        logger.info(
+            'Treinamento concluído',
+            extra={
+                'job_id': job['id'],
+                'user_id': job['user_id'],
+                'type': job['type'],
+                'mode': mode,
+                'state': state,
+                'seconds': round(duration, 3),
+            },
+        )
+
+    def _serialize(self, job):
+        serialized = dict(job)
+        if job['state'] == 'running' and job['started_at']:
+            serialized['duration'] = time.time() - job['started_at']
+        return serialized
+
+    def _trim_history(self):
+        try:
+            self.manifest.trim_jobs(self.history)
+        except Exception:
+            logger.exception('Erro ao remover jobs antigos do manifesto')
+
+
+job_manager = JobManager()
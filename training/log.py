@@ -0,0 +1,75 @@
+"""
+Configuração dos logs do serviço.
+
+Os módulos usam ``logging.getLogger(__name__)`` e passam os dados do evento em ``extra`` (ex: user_id, type,
+seconds), que são emitidos como campos: em JSON com LOG_FORMAT=json (para agregadores de logs) ou como pares
+chave=valor no formato de texto. O nível é definido por LOG_LEVEL.
+"""
+
+import json
+import logging
+import os
+
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'text').lower()
+
+# Atributos padrão do LogRecord; todo o resto veio de ``extra`` e é emitido como campo do evento
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'taskName'}
+
+
+def event_fields(record: logging.LogRecord):
+    """
+    Extrai os campos estruturados de um registro de log.
+
+    :param record: logging.LogRecord
+    :return: dict - Campos passados em ``extra``.
+    """
+    return {key: value for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES}
+
+
+class JsonFormatter(logging.Formatter):
+    """Emite cada registro como um objeto JSON por linha."""
+
+    def format(self, record):
+        event = {
+            'time': self.formatTime(record, '%Y-%m-%dT%H:%M:%S'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            **event_fields(record),
+        }
+        if record.exc_info:
+            event['exception'] = self.formatException(record.exc_info)
+        return json.dumps(event, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Formato legível, com os campos do evento como pares chave=valor ao final da mensagem."""
+
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s [%(name)s] %(message)s')
+
+    def format(self, record):
+        message = super().format(record)
+        fields = event_fields(record)
+        if fields:
+            message += ' ' + ' '.join(f'{key}={value}' for key, value in fields.items())
+        return message
+
+
+def configure_logging(level: str = LOG_LEVEL, log_format: str = LOG_FORMAT):
+    """
+    Configura o logger raiz da aplicação. Pode ser chamado mais de uma vez (ex: nos processos de treinamento).
+
+    :param level: str - Nível mínimo (DEBUG, INFO, WARNING...).
+    :param log_format: str - 'text' ou 'json'.
+    """
+    handler = logging.StreamHandler()
+    handler.setFormatter(JsonFormatter() if log_format == 'json' else TextFormatter())
+
+    root = logging.getLogger()
+    for existing in [h for h in root.handlers if getattr(h, '_transaction_classifier', False)]:
+        root.removeHandler(existing)
+    handler._transaction_classifier = True
+    root.addHandler(handler)
+    root.setLevel(level)
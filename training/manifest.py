@@ -0,0 +1,581 @@
+"""
+Manifesto dos modelos treinados.
+
+Um banco SQLite no diretório dos modelos guarda, por usuário e preditor, a versão publicada, o tamanho do
+arquivo, a data da última gravação e do último treinamento, a duração do treinamento, as contagens de exemplos
+e classes aprendidos e as métricas da validação progressiva (ver training.evaluation). Ele é atualizado a cada
+``save_model``/``delete_model`` e pelos jobs de treinamento, de modo que o status dos modelos e a listagem de
+todos os usuários são consultas ao manifesto, sem acessar os arquivos de modelo. O modo WAL permite que os
+processos da API e do pool de treinamento o atualizem ao mesmo tempo.
+
+O mesmo banco guarda os jobs de treinamento (ver training.jobs), compartilhados por todos os workers da API.
+
+O manifesto é derivado dos arquivos e pode ser reconstruído a partir dos cabeçalhos com:
+
+    python -m training.manifest rebuild
+"""
+
+import argparse
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+MODEL_DIR = os.path.join('training', 'model')
+MODEL_MANIFEST_FILENAME = 'manifest.sqlite3'
+MODEL_MANIFEST_TIMEOUT = float(os.getenv('MODEL_MANIFEST_TIMEOUT', 10))
+
+# Colunas dos jobs de treinamento gravadas em JSON
+JOB_JSON_COLUMNS = ('options', 'progress', 'result')
+JOB_ACTIVE_STATES = ('queued', 'running')
+
+MODEL_FILE_PATTERN = re.compile(r'^(?P<type>\w+?)_model_user_(?P<user_id>.+)\.model$')
+LEGACY_FILE_PATTERN = re.compile(r'^(?P<type>\w+?)_model_user_(?P<user_id>.+)\.pkl$')
+
+COLUMNS = (
+    'user_id',
+    'type',
+    'version',
+    'size',
+    'saved_at',
+    'trained_at',
+    'training_seconds',
+    'samples',
+    'classes',
+    'state',
+    'last_used_at',
+    'evaluated',
+    'accuracy',
+    'macro_f1',
+    'class_metrics',
+    'retrain_requested_at',
+)
+
+# Colunas acrescentadas depois da criação da tabela, adicionadas aos manifestos existentes ao abrir
+ADDED_COLUMNS = {
+    'state': "TEXT NOT NULL DEFAULT 'hot'",
+    'last_used_at': 'REAL',
+    'evaluated': 'INTEGER',
+    'accuracy': 'REAL',
+    'macro_f1': 'REAL',
+    'class_metrics': 'TEXT',
+    'retrain_requested_at': 'REAL',
+}
+
+logger = logging.getLogger(__name__)
+
+
+def parse_user_id(value: str):
+    """Converte o id lido do nome do arquivo ou da configuração para o tipo usado pela API (int, se numérico)."""
+    return int(value) if value.isdigit() else value
+
+
+class ModelManifest:
+    """Registro dos modelos publicados, em SQLite."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._initialized = False
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @contextmanager
+    def _connection(self, transaction: bool = True):
+        """
+        Fornece a conexão da thread atual, aberta uma única vez e reaproveitada nas operações seguintes.
+
+        :param transaction: bool - Se as alterações devem ser confirmadas ao final do bloco (ou desfeitas em erro).
+        """
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = self._local.connection = self._connect()
+            self._local.pid = os.getpid()
+        if not transaction:
+            yield connection
+            return
+        with connection:
+            yield connection
+
+    def _connect(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=MODEL_MANIFEST_TIMEOUT)
+        connection.row_factory = sqlite3.Row
+        # Com WAL, NORMAL só perde as últimas transações em uma queda do sistema; o manifesto pode ser reconstruído
+        connection.execute('PRAGMA synchronous=NORMAL')
+        if not self._initialized:
+            with self._lock:
+                connection.execute('PRAGMA journal_mode=WAL')
+                connection.execute(
+                    '''
+                    CREATE TABLE IF NOT EXISTS models (
+                        user_id NOT NULL,
+                        type TEXT NOT NULL,
+                        version INTEGER NOT NULL,
+                        size INTEGER NOT NULL,
+                        saved_at REAL NOT NULL,
+                        trained_at REAL,
+                        training_seconds REAL,
+                        samples REAL,
+                        classes INTEGER,
+                        PRIMARY KEY (user_id, type)
+                    )
+                    '''
+                )
+                existing = {row['name'] for row in connection.execute('PRAGMA table_info(models)')}
+                for column, definition in ADDED_COLUMNS.items():
+                    if column not in existing:
+                        connection.execute(f'ALTER TABLE models ADD COLUMN {column} {definition}')
+                connection.execute(
+                    '''
+                    CREATE TABLE IF NOT EXISTS jobs (
+                        id TEXT PRIMARY KEY,
+                        user_id NOT NULL,
+                        type TEXT NOT NULL,
+                        options TEXT NOT NULL,
+                        state TEXT NOT NULL,
+                        created_at REAL NOT NULL,
+                        started_at REAL,
+                        finished_at REAL,
+                        duration REAL,
+                        progress TEXT NOT NULL,
+                        result TEXT,
+                        updated_at REAL NOT NULL
+                    )
+                    '''
+                )
+                connection.execute('CREATE INDEX IF NOT EXISTS jobs_active ON jobs (user_id, type, state)')
+                connection.commit()
+                self._initialized = True
+        return connection
+
+    def record(
+        self,
+        user_id,
+        predictor_type: str,
+        version: int,
+        size: int,
+        samples=None,
+        classes=None,
+        saved_at=None,
+        evaluated=None,
+        accuracy=None,
+        macro_f1=None,
+        class_metrics=None,
+    ):
+        """
+        Registra a publicação de uma versão do modelo no diretório principal, mantendo os dados do último
+        treinamento. A gravação conta como uso do modelo.
+
+        :param user_id: Id do usuário.
+        :param predictor_type: str - Tipo do preditor.
+        :param version: int - Versão publicada.
+        :param size: int - Tamanho do arquivo em bytes.
+        :param samples: float (opcional) - Exemplos aprendidos (soma dos pesos).
+        :param classes: int (opcional) - Quantidade de classes conhecidas pelo modelo.
+        :param saved_at: float (opcional) - Timestamp da gravação. Padrão: agora.
+        :param evaluated: int (opcional) - Exemplos avaliados na validação progressiva (ver training.evaluation).
+        :param accuracy: float (opcional) - Acurácia da validação progressiva.
+        :param macro_f1: float (opcional) - Macro-F1 da validação progressiva.
+        :param class_metrics: dict (opcional) - Contagens da validação progressiva por classe.
+        """
+        saved_at = saved_at or time.time()
+        if class_metrics is not None:
+            class_metrics = json.dumps(class_metrics, default=str)
+        with self._connection() as connection:
+            connection.execute(
+                '''
+                INSERT INTO models (
+                    user_id, type, version, size, saved_at, samples, classes, state, last_used_at,
+                    evaluated, accuracy, macro_f1, class_metrics
+                )
+                VALUES (?, ?, ?, ?, ?, ?, ?, 'hot', ?, ?, ?, ?, ?)
+                ON CONFLICT (user_id, type) DO UPDATE SET
+                    version = excluded.version,
+                    size = excluded.size,
+                    saved_at = excluded.saved_at,
+                    samples = excluded.samples,
+                    classes = excluded.classes,
+                    state = excluded.state,
+                    last_used_at = MAX(COALESCE(last_used_at, 0), excluded.last_used_at),
+                    evaluated = excluded.evaluated,
+                    accuracy = excluded.accuracy,
+                    macro_f1 = excluded.macro_f1,
+                    class_metrics = excluded.class_metrics
+                ''',
+                (
+                    user_id,
+                    predictor_type,
+                    version,
+                    size,
+                    saved_at,
+                    samples,
+                    classes,
+                    saved_at,
+                    evaluated,
+                    accuracy,
+                    macro_f1,
+                    class_metrics,
+                ),
+            )
+
+    def record_training(self, user_id, predictor_type: str, seconds: float, trained_at: float = None):
+        """
+        Registra a duração do último treinamento de um modelo já publicado.
+
+        :param user_id: Id do usuário.
+        :param predictor_type: str - Tipo do preditor.
+        :param seconds: float - Duração do treinamento.
+        :param trained_at: float (opcional) - Timestamp do fim do treinamento. Padrão: agora.
+        """
+        with self._connection() as connection:
+            connection.execute(
+                'UPDATE models SET trained_at = ?, training_seconds = ? WHERE user_id = ? AND type = ?',
+                (trained_at or time.time(), seconds, user_id, predictor_type),
+            )
+
+    def record_usage(self, user_id, predictor_type: str, used_at: float = None):
+        """
+        Registra o uso (carregamento para previsão) de um modelo.
+
+        :param user_id: Id do usuário.
+        :param predictor_type: str - Tipo do preditor.
+        :param used_at: float (opcional) - Timestamp do uso. Padrão: agora.
+        """
+        with self._connection() as connection:
+            connection.execute(
+                'UPDATE models SET last_used_at = ? WHERE user_id = ? AND type = ?',
+                (used_at or time.time(), user_id, predictor_type),
+            )
+
+    def set_storage(self, user_id, predictor_type: str, state: str, size: int):
+        """
+        Registra a mudança de lugar de um modelo: 'hot' (diretório principal), 'cold' (armazenamento frio) ou
+        'evicted' (removido pela política de armazenamento).
+
+        :param user_id: Id do usuário.
+        :param predictor_type: str - Tipo do preditor.
+        :param state: str - Novo estado.
+        :param size: int - Tamanho do arquivo no novo lugar (0 para 'evicted').
+        """
+        with self._connection() as connection:
+            connection.execute(
+                'UPDATE models SET state = ?, size = ? WHERE user_id = ? AND type = ?',
+                (state, size, user_id, predictor_type),
+            )
+
+    def claim_retrain(self, user_id, predictor_type: str, now: float, backoff: float):
+        """
+        Reserva o novo treinamento de um modelo removido, se nenhum foi pedido nos últimos ``backoff`` segundos.
+
+        A reserva é atômica entre processos: de várias previsões simultâneas, apenas uma recebe True. Um
+        treinamento que falhar (ex: Django fora do ar) só é pedido de novo depois do intervalo.
+
+        :param user_id: Id do usuário.
+        :param predictor_type: str - Tipo do preditor.
+        :param now: float - Timestamp do pedido.
+        :param backoff: float - Intervalo mínimo (s) entre os pedidos.
+        :return: bool - True se o treinamento deve ser enfileirado.
+        """
+        with self._connection() as connection:
+            cursor = connection.execute(
+                '''
+                UPDATE models SET retrain_requested_at = ?
+                WHERE user_id = ? AND type = ? AND state = 'evicted'
+                    AND (retrain_requested_at IS NULL OR retrain_requested_at <= ?)
+                ''',
+                (now, user_id, predictor_type, now - backoff),
+            )
+        return cursor.rowcount > 0
+
+    def stored(self):
+        """
+        Lista os modelos que ocupam disco (em uso ou no armazenamento frio), do uso mais antigo para o mais recente.
+
+        :return: list[dict]
+        """
+        with self._connection(transaction=False) as connection:
+            rows = connection.execute(
+                '''
+                SELECT user_id, type, size, saved_at, last_used_at, state FROM models
+                WHERE state != 'evicted' ORDER BY COALESCE(last_used_at, saved_at), user_id, type
+                '''
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def storage_totals(self):
+        """
+        Soma os modelos e os bytes por estado.
+
+        :return: list[tuple] - (estado, quantidade de modelos, bytes).
+        """
+        with self._connection(transaction=False) as connection:
+            rows = connection.execute('SELECT state, COUNT(*), SUM(size) FROM models GROUP BY state').fetchall()
+        return [tuple(row) for row in rows]
+
+    def remove(self, user_id, predictor_type: str):
+        """Remove o registro de um modelo apagado."""
+        with self._connection() as connection:
+            connection.execute('DELETE FROM models WHERE user_id = ? AND type = ?', (user_id, predictor_type))
+
+    def for_user(self, user_id):
+        """
+        Obtém os modelos de um usuário.
+
+        :param user_id: Id do usuário.
+        :return: dict - Registro de cada modelo, por tipo do preditor.
+        """
+        with self._connection(transaction=False) as connection:
+            rows = connection.execute('SELECT * FROM models WHERE user_id = ?', (user_id,)).fetchall()
+        models = {row['type']: dict(row) for row in rows}
+        for model in models.values():
+            model['class_metrics'] = json.loads(model['class_metrics']) if model['class_metrics'] else None
+        return models
+
+    def users(self):
+        """
+        Lista os usuários com algum modelo registrado, inclusive os removidos pela política de armazenamento.
+
+        :return: list - Ids dos usuários, em ordem.
+        """
+        with self._connection(transaction=False) as connection:
+            rows = connection.execute('SELECT DISTINCT user_id FROM models ORDER BY user_id').fetchall()
+        return [row['user_id'] for row in rows]
+
+    def page(self, limit: int = 100, offset: int = 0, predictor_type: str = None):
+        """
+        Lista os modelos registrados, ordenados por usuário e preditor.
+
+        :param limit: int - Tamanho da página.
+        :param offset: int - Quantidade de registros a pular.
+        :param predictor_type: str (opcional) - Filtra por tipo do preditor.
+        :return: dict - 'total' de registros e os 'items' da página.
+        """
+        where, params = ('WHERE type = ?', (predictor_type,)) if predictor_type else ('', ())
+        with self._connection(transaction=False) as connection:
+            total = connection.execute(f'SELECT COUNT(*) FROM models {where}', params).fetchone()[0]
+            rows = connection.execute(
+                f'SELECT * FROM models {where} ORDER BY user_id, type LIMIT ? OFFSET ?', (*params, limit, offset)
+            ).fetchall()
+        # As contagens por classe ficam de fora da listagem (ver ``for_user``)
+        items = [{column: row[column] for column in row.keys() if column != 'class_metrics'} for row in rows]
+        return {'total': total, 'items': items}
+
+    def recent(self, users: int):
+        """
+        Lista os modelos em uso (fora do armazenamento frio) dos usuários com as gravações mais recentes.
+
+        :param users: int - Quantidade de usuários.
+        :return: list[tuple] - (user_id, tipo do preditor).
+        """
+        with self._connection(transaction=False) as connection:
+            rows = connection.execute(
+                '''
+                SELECT models.user_id, models.type FROM models
+                JOIN (
+                    SELECT user_id, MAX(saved_at) AS last_saved FROM models WHERE state = 'hot'
+                    GROUP BY user_id ORDER BY last_saved DESC LIMIT ?
+                ) AS recent ON recent.user_id = models.user_id
+                WHERE models.state = 'hot'
+                ORDER BY recent.last_saved DESC
+                ''',
+                (users,),
+            ).fetchall()
+        return [(row['user_id'], row['type']) for row in rows]
+
+    def create_job(self, job: dict, stale_after: float):
+        """
+        Registra um job de treinamento, a menos que já exista um job ativo (na fila ou em execução) para o mesmo
+        usuário e preditor, em qualquer processo da API.
+
+        A verificação e a inclusão acontecem na mesma transação de escrita (BEGIN IMMEDIATE), de modo que dois
+        workers não criam jobs simultâneos para o mesmo modelo. Um job ativo sem atualização há mais de
+        ``stale_after`` segundos foi abandonado (ex: o processo que o criou morreu) e é marcado como 'failed'.
+
+        :param job: dict - Job a registrar.
+        :param stale_after: float - Segundos sem atualização após os quais um job ativo é considerado abandonado.
+        :return: dict - O job registrado ou o job ativo já existente.
+        """
+        now = time.time()
+        with self._connection() as connection:
+            connection.execute('BEGIN IMMEDIATE')
+            connection.execute(
+                f'''
+                UPDATE jobs SET state = 'failed', finished_at = ?, result = ?
+                WHERE user_id = ? AND type = ? AND state IN {JOB_ACTIVE_STATES} AND updated_at < ?
+                ''',
+                (
+                    now,
+                    json.dumps({'success': False, 'message': 'Treinamento abandonado.'}),
+                    job['user_id'],
+                    job['type'],
+                    now - stale_after,
+                ),
+            )
+            row = connection.execute(
+                f'SELECT * FROM jobs WHERE user_id = ? AND type = ? AND state IN {JOB_ACTIVE_STATES}',
+                (job['user_id'], job['type']),
+            ).fetchone()
+            if row is not None:
+                return self._decode_job(row)
+            values = {**job, 'updated_at': now}
+            for column in JOB_JSON_COLUMNS:
+                values[column] = json.dumps(values[column], default=str)
+            connection.execute(
+                f'INSERT INTO jobs ({", ".join(values)}) VALUES ({", ".join("?" for _ in values)})',
+                tuple(values.values()),
+            )
+        return job
+
+    def update_job(self, job_id: str, **fields):
+        """
+        Atualiza um job de treinamento.
+
+        :param job_id: str - Identificador do job.
+        :param fields: Colunas a atualizar (options, progress e result são gravados em JSON).
+        """
+        fields['updated_at'] = time.time()
+        for column in JOB_JSON_COLUMNS:
+            if column in fields:
+                fields[column] = json.dumps(fields[column], default=str)
+        with self._connection() as connection:
+            connection.execute(
+                f'UPDATE jobs SET {", ".join(f"{column} = ?" for column in fields)} WHERE id = ?',
+                (*fields.values(), job_id),
+            )
+
+    def get_job(self, job_id: str):
+        """
+        Obtém um job de treinamento.
+
+        :param job_id: str - Identificador do job.
+        :return: dict|None - O job ou None se não existir.
+        """
+        with self._connection(transaction=False) as connection:
+            row = connection.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return self._decode_job(row) if row is not None else None
+
+    def trim_jobs(self, history: int):
+        """
+        Remove os jobs concluídos mais antigos, mantendo os ``history`` mais recentes e todos os ativos.
+
+        :param history: int - Quantidade de jobs concluídos mantidos.
+        """
+        with self._connection() as connection:
+            connection.execute(
+                f'''
+                DELETE FROM jobs WHERE id IN (
+                    SELECT id FROM jobs WHERE state NOT IN {JOB_ACTIVE_STATES}
+                    ORDER BY created_at DESC LIMIT -1 OFFSET ?
+                )
+                ''',
+                (history,),
+            )
+
+    @staticmethod
+    def _decode_job(row):
+        job = {column: row[column] for column in row.keys() if column != 'updated_at'}
+        for column in JOB_JSON_COLUMNS:
+            job[column] = json.loads(job[column]) if job[column] is not None else None
+        return job
+
+    def rebuild(self, model_dir: str):
+        """
+        Recria o manifesto a partir dos cabeçalhos dos arquivos de modelo de um diretório (e do seu armazenamento
+        frio).
+
+        As contagens de exemplos e classes são lidas diretamente das tabelas do arquivo, sem reconstruir os
+        modelos. Os dados de treinamento, o último uso e os modelos removidos pela política de armazenamento não
+        ficam nos arquivos e são perdidos. Os pickles antigos ainda não convertidos também são registrados, com a
+        versão 0 e sem as contagens (não são abertos); o primeiro uso os converte e atualiza o registro.
+
+        :param model_dir: str - Diretório dos modelos.
+        :return: int - Quantidade de modelos registrados.
+        """
+        from training.evaluation import ProgressiveMetrics
+        from training.model_format import ModelReader
+        from training.model_store import iter_legacy_files, iter_model_files
+
+        count = 0
+        seen = set()
+        with self._connection() as connection:
+            connection.execute('DELETE FROM models')
+        for entry, user_id, predictor_type, state in iter_model_files(model_dir):
+            if (user_id, predictor_type) in seen:
+                continue
+            seen.add((user_id, predictor_type))
+            try:
+                reader = ModelReader(entry.path)
+                class_counts = reader.numbers('model/class_counts') if reader.has('model/class_counts') else []
+                evaluation = reader.value('extra_state', {}).get('progressive_metrics')
+                evaluation = ProgressiveMetrics(evaluation).summary() if evaluation else {}
+                self.record(
+                    user_id,
+                    predictor_type,
+                    version=reader.value('model_version', 0),
+                    size=entry.stat().st_size,
+                    samples=float(sum(class_counts)),
+                    classes=sum(1 for value in class_counts if value),
+                    saved_at=entry.stat().st_mtime,
+                    evaluated=evaluation.get('evaluated'),
+                    accuracy=evaluation.get('accuracy'),
+                    macro_f1=evaluation.get('macro_f1'),
+                    class_metrics=evaluation.get('per_class'),
+                )
+                if state != 'hot':
+                    self.set_storage(user_id, predictor_type, state, entry.stat().st_size)
+                count += 1
+            except Exception:
+                logger.exception('Erro ao registrar modelo no manifesto', extra={'path': entry.path})
+        for entry, user_id, predictor_type in iter_legacy_files(model_dir):
+            if (user_id, predictor_type) in seen:
+                continue
+            seen.add((user_id, predictor_type))
+            self.record(user_id, predictor_type, version=0, size=entry.stat().st_size, saved_at=entry.stat().st_mtime)
+            count += 1
+        return count
+
+
+_manifests = {}
+_manifests_lock = threading.Lock()
+
+
+def manifest_for(model_dir: str):
+    """
+    Obtém o manifesto de um diretório de modelos (uma instância por diretório no processo).
+
+    :param model_dir: str - Diretório dos modelos.
+    :return: ModelManifest
+    """
+    path = os.path.join(model_dir, MODEL_MANIFEST_FILENAME)
+    with _manifests_lock:
+        manifest = _manifests.get(path)
+        if manifest is None:
+            manifest = _manifests[path] = ModelManifest(path)
+        return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Manutenção do manifesto dos modelos.')
+    parser.add_argument('command', choices=['rebuild', 'list'])
+    parser.add_argument('--model-dir', default=MODEL_DIR)
+    parser.add_argument('--limit', type=int, default=100)
+    parser.add_argument('--offset', type=int, default=0)
+    args = parser.parse_args()
+
+    manifest = manifest_for(args.model_dir)
+    if args.command == 'rebuild':
+        print(f'{manifest.rebuild(args.model_dir)} modelo(s) registrado(s) em {manifest.path}')
+    else:
+        page = manifest.page(args.limit, args.offset)
+        print(' '.join(f'{column:>16}' for column in COLUMNS))
+        for item in page['items']:
+            print(' '.join(f'{str(item[column]):>16}' for column in COLUMNS))
+        print(f'{len(page["items"])} de {page["total"]} modelo(s)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,219 @@
+"""
+Métricas do serviço no formato de exposição do Prometheus.
+
+Registro próprio e mínimo (contadores e histogramas com labels), exposto em ``GET /metrics``. As métricas são
+do processo: com vários workers do uvicorn, cada um expõe as suas, e os treinamentos (que rodam no pool de
+processos) são medidos pelo processo da API ao fim de cada job.
+
+Labels por usuário multiplicam o número de séries, por isso só são incluídas com METRICS_USER_LABELS=true.
+"""
+
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+METRICS_USER_LABELS = os.getenv('METRICS_USER_LABELS', 'false').lower() in ('1', 'true', 'yes')
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+TRAINING_BUCKETS = (0.1, 0.5, 1, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+SIZE_BUCKETS = tuple(4**i * 1024 for i in range(11))  # 1 KiB a 1 GiB
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 5000)
+
+
+def user_labels(user_id):
+    """
+    Labels de usuário a incluir em uma observação, se habilitados.
+
+    :param user_id: Id do usuário.
+    :return: dict - ``{'user': user_id}`` ou vazio.
+    """
+    return {'user': str(user_id)} if METRICS_USER_LABELS else {}
+
+
+def _format_labels(labels: tuple, extra: str = ''):
+    parts = [f'{name}="{_escape(value)}"' for name, value in labels]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_value(value: float):
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Metric:
+    """Base das métricas: nome, descrição e uma série por combinação de labels."""
+
+    kind = None
+
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self._series = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(labels: dict):
+        return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        with self._lock:
+            series = sorted(self._series.items())
+            lines.extend(line for key, value in series for line in self._render_series(key, value))
+        return lines
+
+    def _render_series(self, key, value):
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    """Contador monotônico."""
+
+    kind = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+    def _render_series(self, key, value):
+        yield f'{self.name}_total{_format_labels(key)} {_format_value(value)}'
+
+
+class Histogram(Metric):
+    """Histograma cumulativo com buckets fixos."""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, buckets: tuple = LATENCY_BUCKETS):
+        super().__init__(name, documentation)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value: float, **labels):
+        """
+        Registra uma observação.
+
+        :param value: float - Valor observado (segundos, bytes, itens...).
+        :param labels: Labels da série.
+        """
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series['counts'][i] += 1
+                    break
+            series['sum'] += value
+            series['count'] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Mede a duração do bloco, em segundos."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _render_series(self, key, value):
+        cumulative = 0
+        for bound, count in zip(self.buckets, value['counts']):
+            cumulative += count
+            le = 'le="' + _format_value(bound) + '"'
+            yield f'{self.name}_bucket{_format_labels(key, le)} {cumulative}'
+        yield f'{self.name}_sum{_format_labels(key)} {_format_value(value["sum"])}'
+        yield f'{self.name}_count{_format_labels(key)} {value["count"]}'
+
+
+class Registry:
+    """Conjunto das métricas expostas pelo processo."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: Metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f'Métrica já registrada: {metric.name}')
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str):
+        return self.register(Counter(name, documentation))
+
+    def histogram(self, name: str, documentation: str, buckets: tuple = LATENCY_BUCKETS):
+        return self.register(Histogram(name, documentation, buckets))
+
+    def render(self):
+        """
+        Gera o texto no formato de exposição do Prometheus (versão 0.0.4).
+
+        :return: str
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return '\n'.join(line for metric in metrics for line in metric.render()) + '\n'
+
+
+registry = Registry()
+
+HTTP_REQUEST_SECONDS = registry.histogram(
+    'transaction_classifier_http_request_seconds', 'Duração das requisições HTTP por rota e status.'
+)
+TOKEN_VALIDATION_SECONDS = registry.histogram(
+    'transaction_classifier_token_validation_seconds', 'Duração da validação do token por origem e resultado.'
+)
+DATA_FETCH_SECONDS = registry.histogram(
+    'transaction_classifier_data_fetch_seconds', 'Duração das requisições ao backend Django por recurso.'
+)
+MODEL_LOAD_SECONDS = registry.histogram(
+    'transaction_classifier_model_load_seconds', 'Duração do carregamento do modelo (cache ou disco).'
+)
+MODEL_LOAD_BYTES = registry.histogram(
+    'transaction_classifier_model_load_bytes', 'Tamanho dos arquivos de modelo lidos do disco.', SIZE_BUCKETS
+)
+MODEL_SAVE_SECONDS = registry.histogram(
+    'transaction_classifier_model_save_seconds', 'Duração da gravação do modelo.'
+)
+MODEL_SAVE_BYTES = registry.histogram(
+    'transaction_classifier_model_save_bytes', 'Tamanho dos arquivos de modelo gravados.', SIZE_BUCKETS
+)
+PREDICT_SECONDS = registry.histogram(
+    'transaction_classifier_predict_seconds', 'Duração das previsões (individuais ou em lote), com o carregamento.'
+)
+PREDICT_BATCH_SIZE = registry.histogram(
+    'transaction_classifier_predict_batch_size', 'Quantidade de lançamentos por previsão em lote.', COUNT_BUCKETS
+)
+TRAIN_SECONDS = registry.histogram(
+    'transaction_classifier_train_seconds',
+    'Duração dos treinamentos por preditor, modo e resultado.',
+    TRAINING_BUCKETS,
+)
+FEEDBACK_BATCH_SIZE = registry.histogram(
+    'transaction_classifier_feedback_batch_size',
+    'Quantidade de feedbacks por requisição recebida e por lote aplicado ao modelo.',
+    COUNT_BUCKETS,
+)
+FEEDBACK_APPLY_SECONDS = registry.histogram(
+    'transaction_classifier_feedback_apply_seconds', 'Duração da aplicação de um lote de feedbacks ao modelo.'
+)
+PREDICTION_CACHE_LOOKUPS = registry.counter(
+    'transaction_classifier_prediction_cache_lookups',
+    'Consultas ao cache de previsões por preditor e resultado (hit ou miss).',
+)
+DESCRIPTOR_INDEX_LOOKUPS = registry.counter(
+    'transaction_classifier_descriptor_index_lookups',
+    'Consultas ao índice de descritores do preditor de subcategorias, por resultado (hit ou miss).',
+)
@@ -0,0 +1,142 @@
+"""
+Cache em memória, compartilhado pelo processo, dos modelos carregados do disco.
+
+Cada entrada é indexada por (user_id, tipo do preditor) e guarda o estado já desserializado junto com a
+assinatura (mtime, inode e tamanho) do arquivo lido. Como os modelos são publicados por renomeação atômica,
+cada nova versão é um novo inode: a entrada é descartada quando o arquivo muda no disco (por exemplo, ao ser
+publicado por outro processo) ou quando ``save_model``/``delete_model`` a invalidam explicitamente.
+A remoção segue a política LRU, limitada por número de entradas e por um orçamento de memória
+estimado a partir do tamanho do arquivo no disco.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+MODEL_CACHE_MAX_MB = float(os.getenv('MODEL_CACHE_MAX_MB', 512))
+MODEL_CACHE_MAX_ENTRIES = int(os.getenv('MODEL_CACHE_MAX_ENTRIES', 1000))
+
+
+def file_signature(filepath: str):
+    """
+    Identifica a versão de um arquivo no disco.
+
+    :param filepath: str - Caminho do arquivo.
+    :return: tuple|None - (mtime em ns, inode, tamanho) ou None se o arquivo não existir.
+    """
+    try:
+        stat = os.stat(filepath)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_ino, stat.st_size
+
+
+class ModelCache:
+    """Cache LRU de modelos com invalidação pela assinatura do arquivo."""
+
+    def __init__(self, max_bytes: int, max_entries: int):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0 and self.max_entries > 0
+
+    def get(self, key: tuple, filepath: str):
+        """
+        Obtém o estado cacheado de um modelo, se ainda corresponder ao arquivo no disco.
+
+        :param key: tuple - (user_id, tipo do preditor).
+        :param filepath: str - Caminho do arquivo do modelo.
+        :return: dict|None - Estado do modelo ou None em caso de miss.
+        """
+        signature = file_signature(filepath)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            if signature is None or entry['signature'] != signature:
+                self._remove(key)
+                self.invalidations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry['state']
+
+    def put(self, key: tuple, signature: tuple, state: dict, size: int):
+        """
+        Armazena o estado de um modelo recém-carregado.
+
+        :param key: tuple - (user_id, tipo do preditor).
+        :param signature: tuple - Assinatura do arquivo lido (ver ``file_signature``), obtida antes da leitura.
+        :param state: dict - Estado desserializado do modelo.
+        :param size: int - Tamanho estimado em bytes (tamanho do arquivo no disco).
+        """
+        if not self.enabled or size > self.max_bytes:
+            return
+
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = {'signature': signature, 'state': state, 'size': size}
+            self.current_bytes += size
+
+            while self._entries and (
+                self.current_bytes > self.max_bytes or len(self._entries) > self.max_entries
+            ):
+                oldest_key = next(iter(self._entries))
+                self._remove(oldest_key)
+                self.evictions += 1
+
+    def invalidate(self, key: tuple):
+        """
+        Remove um modelo do cache (chamado ao salvar ou apagar o modelo).
+
+        :param key: tuple - (user_id, tipo do preditor).
+        """
+        with self._lock:
+            if self._remove(key):
+                self.invalidations += 1
+
+    def clear(self):
+        """Esvazia o cache sem zerar os contadores."""
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self):
+        """Retorna os contadores de uso do cache."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return False
+        self.current_bytes -= entry['size']
+        return True
+
+
+model_cache = ModelCache(int(MODEL_CACHE_MAX_MB * 1024 * 1024), MODEL_CACHE_MAX_ENTRIES)
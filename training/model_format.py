@@ -0,0 +1,748 @@
+"""
+Formato compacto e versionado dos arquivos de modelo.
+
+Em vez de serializar os objetos do River com pickle, o arquivo guarda apenas o estado aprendido, em arrays
+numéricos, e os pipelines são reconstruídos a partir de ``training/pipelines/*.build_pipeline``. Assim o
+arquivo não depende do layout interno das classes do River.
+
+Layout do arquivo::
+
+    MAGIC (8 bytes) | versão (uint32) | tamanho do cabeçalho (uint32) | cabeçalho JSON | padding | payload
+
+O cabeçalho descreve cada array do payload (dtype, shape e offset) e guarda os valores escalares. Todas as
+strings (tokens, características, rótulos) ficam em uma única tabela de tokens, de modo que cada string
+aparece uma só vez no arquivo e vira um único objeto ``str`` ao carregar. Os arrays ficam alinhados em 64 bytes
+e são lidos com ``np.frombuffer`` sobre o payload, sem cópia; como o River guarda o estado em dicionários, eles são
+convertidos em listas e dicionários Python ao reconstruir os modelos (o estado carregado não fica ligado ao
+arquivo). Com ``zlib``, o payload inteiro é comprimido.
+
+Migração dos arquivos ``.pkl`` antigos::
+
+    python -m training.model_format migrate [--model-dir training/model] [--keep-legacy]
+    python -m training.model_format compare [--model-dir training/model]
+
+Com MODEL_INTERN_TOKENS, os tokens lidos são internados (``sys.intern``): a tabela de strings do processo guarda
+um único objeto por token, compartilhado por todos os modelos em cache, e o id de cada token no arquivo aponta
+para ele. O efeito na memória é medido com::
+
+    python -m training.model_format memory [--model-dir training/model] [--limit 200]
+"""
+
+import argparse
+import collections
+import gc
+import json
+import os
+import pickle
+import struct
+import sys
+import threading
+import time
+import tracemalloc
+import zlib
+
+import numpy as np
+from river import feature_extraction, naive_bayes, preprocessing
+
+from training.correction_index import INDEX_VERSION, CorrectionIndex
+from training.pipelines.subcategory import build_pipeline as build_subcategory_pipeline
+
+FORMAT_MAGIC = b'TCMODEL\x00'
+FORMAT_VERSION = 1
+FORMAT_EXTENSION = '.model'
+LEGACY_EXTENSION = '.pkl'
+ALIGNMENT = 64
+MODEL_COMPRESSION = os.getenv('MODEL_COMPRESSION', 'none')
+MODEL_INTERN_TOKENS = os.getenv('MODEL_INTERN_TOKENS', 'true').lower() in ('1', 'true', 'yes')
+TOKEN_SEPARATOR = '\x00'
+
+_PREFIX = struct.Struct('<8sII')
+
+
+class ModelFormatError(ValueError):
+    """Arquivo de modelo inválido ou de versão não suportada."""
+
+
+def to_json(value):
+    """
+    Converte um valor Python em uma estrutura JSON preservando dicionários com chaves não textuais.
+
+    :param value: Valor composto de dict, list, tuple, set, str, int, float, bool e None.
+    :return: Estrutura serializável em JSON.
+    """
+    if isinstance(value, dict):
+        if all(isinstance(key, str) for key in value):
+            return {key: to_json(item) for key, item in value.items()}
+        return {'__pairs__': [[to_json(key), to_json(item)] for key, item in value.items()]}
+    if isinstance(value, (list, tuple)):
+        return [to_json(item) for item in value]
+    if isinstance(value, set):
+        return {'__set__': [to_json(item) for item in value]}
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def from_json(value):
+    """
+    Desfaz a conversão de ``to_json``.
+
+    :param value: Estrutura lida do JSON.
+    :return: Valor Python original.
+    """
+    if isinstance(value, dict):
+        if '__pairs__' in value:
+            return {_hashable(from_json(key)): from_json(item) for key, item in value['__pairs__']}
+        if '__set__' in value:
+            return {_hashable(from_json(item)) for item in value['__set__']}
+        return {key: from_json(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [from_json(item) for item in value]
+    return value
+
+
+def _hashable(value):
+    return tuple(value) if isinstance(value, list) else value
+
+
+class ModelWriter:
+    """Monta o conteúdo de um arquivo de modelo."""
+
+    def __init__(self, predictor_type: str):
+        self.header = {'format_version': FORMAT_VERSION, 'predictor': predictor_type, 'arrays': {}, 'values': {}}
+        self.arrays = {}
+        self.tokens = {}
+
+    def intern(self, token: str):
+        """Retorna o id do token na tabela de tokens do arquivo, adicionando-o se necessário."""
+        token_id = self.tokens.get(token)
+        if token_id is None:
+            token_id = self.tokens[token] = len(self.tokens)
+        return token_id
+
+    def set_value(self, name: str, value):
+        """Guarda um valor escalar ou pequeno no cabeçalho."""
+        self.header['values'][name] = to_json(value)
+
+    def add_array(self, name: str, array):
+        """Guarda um array numérico no payload."""
+        self.arrays[name] = np.ascontiguousarray(array)
+
+    def add_numbers(self, name: str, values: list):
+        """Guarda uma lista de números como int64 (se todos forem inteiros) ou float64."""
+        is_integer = all(isinstance(value, (int, np.integer)) and not isinstance(value, bool) for value in values)
+        self.add_array(name, np.asarray(values, dtype=np.int64 if is_integer else np.float64))
+
+    def add_keys(self, name: str, keys: list):
+        """
+        Guarda uma lista de chaves: strings viram ids da tabela de tokens, inteiros viram int64 e qualquer
+        outra combinação é guardada no cabeçalho.
+        """
+        if all(isinstance(key, str) for key in keys):
+            self.add_array(name, np.fromiter((self.intern(key) for key in keys), dtype=np.uint32, count=len(keys)))
+            self.header['values'][f'{name}.kind'] = 'token'
+        elif all(isinstance(key, (int, np.integer)) and not isinstance(key, bool) for key in keys):
+            self.add_array(name, np.asarray(keys, dtype=np.int64))
+            self.header['values'][f'{name}.kind'] = 'int'
+        else:
+            self.set_value(name, list(keys))
+            self.header['values'][f'{name}.kind'] = 'json'
+
+    def encode(self, compression: str = MODEL_COMPRESSION):
+        """
+        Monta o conteúdo do arquivo.
+
+        :param compression: str - 'none' ou 'zlib'.
+        :return: list[bytes] - Partes do arquivo, na ordem.
+        """
+        self._add_token_table()
+
+        chunks = []
+        offset = 0
+        for name, array in self.arrays.items():
+            padding = -offset % ALIGNMENT
+            chunks.append(b'\x00' * padding)
+            offset += padding
+            self.header['arrays'][name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset}
+            chunks.append(array.tobytes())
+            offset += array.nbytes
+
+        payload = b''.join(chunks)
+        self.header['payload_size'] = len(payload)
+        self.header['compression'] = compression
+        if compression == 'zlib':
+            payload = zlib.compress(payload, 6)
+        elif compression != 'none':
+            raise ModelFormatError(f'Compressão não suportada: {compression}')
+
+        header = json.dumps(self.header, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        prefix = _PREFIX.pack(FORMAT_MAGIC, FORMAT_VERSION, len(header))
+        padding = b'\x00' * (-(len(prefix) + len(header)) % ALIGNMENT)
+        return [prefix, header, padding, payload]
+
+    def size(self, compression: str = 'none'):
+        """
+        Calcula o tamanho que o arquivo teria, sem gravá-lo (ex: para comparar com um orçamento).
+
+        :param compression: str - 'none' ou 'zlib'.
+        :return: int - Tamanho em bytes.
+        """
+        return sum(len(part) for part in self.encode(compression))
+
+    def write(self, filepath: str, compression: str = MODEL_COMPRESSION):
+        """
+        Grava o arquivo.
+
+        :param filepath: str - Caminho de destino.
+        :param compression: str - 'none' ou 'zlib'.
+        :return: int - Tamanho do arquivo em bytes.
+        """
+        parts = self.encode(compression)
+
+        # O arquivo é escrito ao lado do destino e publicado com uma renomeação atômica: quem lê o caminho vê
+        # sempre a versão anterior completa ou a nova completa, nunca um arquivo pela metade
+        temp_path = f'{filepath}.{os.getpid()}.{threading.get_ident()}.tmp'
+        try:
+            with open(temp_path, 'wb') as f:
+                for part in parts:
+                    f.write(part)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, filepath)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        return sum(len(part) for part in parts)
+
+    def _add_token_table(self):
+        tokens = list(self.tokens)
+        if any(TOKEN_SEPARATOR in token for token in tokens):
+            self.header['values']['tokens'] = tokens
+            return
+        blob = TOKEN_SEPARATOR.join(tokens).encode('utf-8')
+        self.arrays['tokens'] = np.frombuffer(blob, dtype=np.uint8)
+        self.header['values']['tokens.count'] = len(tokens)
+
+
+def _read_header(f, filepath: str):
+    prefix = f.read(_PREFIX.size)
+    if len(prefix) < _PREFIX.size:
+        raise ModelFormatError(f'Arquivo de modelo truncado: {filepath}')
+    magic, version, header_size = _PREFIX.unpack(prefix)
+    if magic != FORMAT_MAGIC:
+        raise ModelFormatError(f'Arquivo não está no formato de modelo: {filepath}')
+    if version > FORMAT_VERSION:
+        raise ModelFormatError(f'Versão de formato não suportada ({version}): {filepath}')
+    return json.loads(f.read(header_size).decode('utf-8')), header_size
+
+
+def read_header(filepath: str):
+    """
+    Lê apenas o cabeçalho de um arquivo de modelo, sem carregar o payload.
+
+    :param filepath: str - Caminho do arquivo.
+    :return: dict - Cabeçalho do arquivo.
+    """
+    with open(filepath, 'rb') as f:
+        return _read_header(f, filepath)[0]
+
+
+def read_model_version(filepath: str):
+    """
+    Obtém a versão publicada de um modelo.
+
+    :param filepath: str - Caminho do arquivo.
+    :return: int - Versão do modelo ou 0 se o arquivo não existir.
+    """
+    try:
+        return read_header(filepath)['values'].get('model_version', 0)
+    except FileNotFoundError:
+        return 0
+
+
+class ModelReader:
+    """Lê o conteúdo de um arquivo de modelo."""
+
+    def __init__(self, filepath: str, intern_tokens: bool = MODEL_INTERN_TOKENS):
+        with open(filepath, 'rb') as f:
+            self.header, header_size = _read_header(f, filepath)
+            payload_start = _PREFIX.size + header_size
+            payload_start += -payload_start % ALIGNMENT
+
+            f.seek(payload_start)
+            self.payload = f.read()
+            if self.header['compression'] == 'zlib':
+                self.payload = zlib.decompress(self.payload)
+
+        self.tokens = self._read_token_table()
+        if intern_tokens:
+            # Todos os modelos carregados no processo passam a compartilhar um único objeto str por token (ex:
+            # "supermercado", "uber"), usado como chave nos dicionários do River e do DescriptionPredictor
+            self.tokens = list(map(sys.intern, self.tokens))
+
+    @property
+    def predictor_type(self):
+        return self.header['predictor']
+
+    def has(self, name: str):
+        return name in self.header['arrays'] or name in self.header['values']
+
+    def value(self, name: str, default=None):
+        """Obtém um valor do cabeçalho."""
+        if name not in self.header['values']:
+            return default
+        return from_json(self.header['values'][name])
+
+    def array(self, name: str):
+        """Obtém um array do payload, como uma view somente leitura (sem cópia)."""
+        spec = self.header['arrays'][name]
+        dtype = np.dtype(spec['dtype'])
+        count = int(np.prod(spec['shape'])) if spec['shape'] else 1
+        return np.frombuffer(self.payload, dtype=dtype, count=count, offset=spec['offset']).reshape(spec['shape'])
+
+    def numbers(self, name: str):
+        """Obtém uma lista de números gravada com ``add_numbers``."""
+        return self.array(name).tolist()
+
+    def keys(self, name: str):
+        """Obtém uma lista de chaves gravada com ``add_keys``."""
+        kind = self.header['values'][f'{name}.kind']
+        if kind == 'token':
+            tokens = self.tokens
+            return [tokens[token_id] for token_id in self.array(name).tolist()]
+        if kind == 'int':
+            return self.array(name).tolist()
+        return [_hashable(key) for key in self.value(name)]
+
+    def _read_token_table(self):
+        if 'tokens' in self.header['values']:
+            return self.header['values']['tokens']
+        count = self.header['values'].get('tokens.count', 0)
+        if not count:
+            return []
+        return self.array('tokens').tobytes().decode('utf-8').split(TOKEN_SEPARATOR)
+
+
+def write_multinomial_nb(writer: ModelWriter, prefix: str, model):
+    """
+    Grava as tabelas de contagem de um MultinomialNB.
+
+    As contagens por característica são gravadas em formato CSR (uma linha por característica), omitindo os
+    zeros. As características sem nenhuma contagem continuam registradas, pois fazem parte do vocabulário
+    usado na suavização.
+    """
+    classes = list(dict.fromkeys([*model.class_counts, *model.class_totals]))
+    class_index = {label: index for index, label in enumerate(classes)}
+    features = list(model.feature_counts)
+
+    indptr, class_ids, counts = [0], [], []
+    for feature in features:
+        for label, count in model.feature_counts[feature].items():
+            if count:
+                class_ids.append(class_index[label])
+                counts.append(count)
+        indptr.append(len(counts))
+
+    writer.set_value(f'{prefix}/alpha', model.alpha)
+    writer.add_keys(f'{prefix}/classes', classes)
+    writer.add_numbers(f'{prefix}/class_counts', [model.class_counts.get(label, 0) for label in classes])
+    writer.add_numbers(f'{prefix}/class_totals', [model.class_totals.get(label, 0) for label in classes])
+    writer.add_keys(f'{prefix}/features', features)
+    writer.add_array(f'{prefix}/indptr', np.asarray(indptr, dtype=np.int64))
+    writer.add_array(f'{prefix}/class_ids', np.asarray(class_ids, dtype=np.uint32))
+    writer.add_numbers(f'{prefix}/counts', counts)
+
+
+def read_multinomial_nb(reader: ModelReader, prefix: str, model=None):
+    """
+    Restaura as tabelas de contagem de um MultinomialNB.
+
+    :param model: naive_bayes.MultinomialNB (opcional) - Instância a preencher; se omitida, uma nova é criada.
+    :return: naive_bayes.MultinomialNB
+    """
+    if model is None:
+        model = naive_bayes.MultinomialNB(alpha=reader.value(f'{prefix}/alpha', 1.0))
+    else:
+        model.alpha = reader.value(f'{prefix}/alpha', model.alpha)
+
+    classes = reader.keys(f'{prefix}/classes')
+    class_counts = reader.numbers(f'{prefix}/class_counts')
+    class_totals = reader.numbers(f'{prefix}/class_totals')
+    model.class_counts = collections.Counter(
+        {label: count for label, count in zip(classes, class_counts) if count}
+    )
+    model.class_totals = collections.Counter({label: total for label, total in zip(classes, class_totals) if total})
+
+    features = reader.keys(f'{prefix}/features')
+    indptr = reader.numbers(f'{prefix}/indptr')
+    labels = [classes[class_id] for class_id in reader.numbers(f'{prefix}/class_ids')]
+    counts = reader.numbers(f'{prefix}/counts')
+
+    model.feature_counts = collections.defaultdict(
+        collections.Counter,
+        {
+            feature: _counter(zip(labels[start:end], counts[start:end]))
+            for feature, start, end in zip(features, indptr, indptr[1:])
+        },
+    )
+    return model
+
+
+_new_counter = collections.Counter.__new__
+
+
+def _counter(items):
+    # Equivale a Counter(dict(items)), mas sem passar pelo __init__/update em Python do Counter, que domina o
+    # tempo de carregamento quando há muitas características
+    counter = _new_counter(collections.Counter)
+    dict.update(counter, items)
+    return counter
+
+
+def write_tfidf(writer: ModelWriter, prefix: str, tfidf):
+    """Grava as frequências de documentos e o número de documentos de um TFIDF."""
+    writer.set_value(f'{prefix}/n', tfidf.n)
+    writer.add_keys(f'{prefix}/terms', list(tfidf.dfs))
+    writer.add_numbers(f'{prefix}/dfs', list(tfidf.dfs.values()))
+
+
+def read_tfidf(reader: ModelReader, prefix: str, tfidf):
+    """Restaura as frequências de documentos e o número de documentos de um TFIDF."""
+    tfidf.n = reader.value(f'{prefix}/n', 0)
+    tfidf.dfs = collections.Counter(dict(zip(reader.keys(f'{prefix}/terms'), reader.numbers(f'{prefix}/dfs'))))
+    return tfidf
+
+
+def write_one_hot(writer: ModelWriter, prefix: str, encoder):
+    """Grava os valores vistos por coluna de um OneHotEncoder."""
+    columns = list(encoder.values)
+    writer.set_value(f'{prefix}/columns', columns)
+    for index, column in enumerate(columns):
+        writer.add_keys(f'{prefix}/values/{index}', list(encoder.values[column]))
+
+
+def read_one_hot(reader: ModelReader, prefix: str, encoder):
+    """Restaura os valores vistos por coluna de um OneHotEncoder."""
+    encoder.values = collections.defaultdict(set)
+    for index, column in enumerate(reader.value(f'{prefix}/columns', [])):
+        encoder.values[column] = set(reader.keys(f'{prefix}/values/{index}'))
+    return encoder
+
+
+def write_mapping(writer: ModelWriter, prefix: str, mapping: dict):
+    """Grava um dicionário de chaves e valores simples (strings ou números)."""
+    writer.add_keys(f'{prefix}/keys', list(mapping))
+    values = list(mapping.values())
+    if all(isinstance(value, str) for value in values):
+        writer.add_keys(f'{prefix}/values', values)
+    elif all(isinstance(value, (int, float, np.number)) and not isinstance(value, bool) for value in values):
+        writer.add_numbers(f'{prefix}/values', values)
+        writer.set_value(f'{prefix}/values.kind', 'number')
+    else:
+        writer.set_value(f'{prefix}/values', values)
+        writer.set_value(f'{prefix}/values.kind', 'json')
+
+
+def read_mapping(reader: ModelReader, prefix: str):
+    """Restaura um dicionário gravado com ``write_mapping``."""
+    keys = reader.keys(f'{prefix}/keys')
+    kind = reader.value(f'{prefix}/values.kind')
+    if kind == 'number':
+        values = reader.numbers(f'{prefix}/values')
+    elif kind == 'json':
+        values = reader.value(f'{prefix}/values')
+    else:
+        values = reader.keys(f'{prefix}/values')
+    return dict(zip(keys, values))
+
+
+def _pipeline_steps(pipeline):
+    """Percorre as etapas de um pipeline, incluindo as etapas internas das uniões de transformadores."""
+    for step in pipeline.steps.values():
+        if hasattr(step, 'transformers'):
+            yield from step.transformers.values()
+        else:
+            yield step
+
+
+def write_subcategory_state(writer: ModelWriter, state: dict):
+    """Grava o estado do SubcategoryPredictor (pipeline, estado extra e índice de descritores)."""
+    for step in _pipeline_steps(state['pipeline']):
+        if isinstance(step, feature_extraction.TFIDF):
+            write_tfidf(writer, 'tfidf', step)
+        elif isinstance(step, preprocessing.OneHotEncoder):
+            write_one_hot(writer, 'one_hot', step)
+        elif isinstance(step, naive_bayes.MultinomialNB):
+            write_multinomial_nb(writer, 'model', step)
+    writer.set_value('extra_state', state.get('extra_state', {}))
+    write_mapping(writer, 'descriptor_index', state.get('descriptor_index', {}))
+    writer.add_keys('descriptor_conflicts', sorted(state.get('descriptor_conflicts', ())))
+
+
+def read_subcategory_state(reader: ModelReader):
+    """Reconstrói o pipeline de subcategorias a partir de build_pipeline e restaura o estado aprendido."""
+    pipeline = build_subcategory_pipeline()
+    for step in _pipeline_steps(pipeline):
+        if isinstance(step, feature_extraction.TFIDF):
+            read_tfidf(reader, 'tfidf', step)
+        elif isinstance(step, preprocessing.OneHotEncoder):
+            read_one_hot(reader, 'one_hot', step)
+        elif isinstance(step, naive_bayes.MultinomialNB):
+            read_multinomial_nb(reader, 'model', step)
+
+    # Arquivos gravados antes do índice de descritores não têm essas entradas
+    has_index = reader.has('descriptor_index/keys')
+    return {
+        'pipeline': pipeline,
+        'extra_state': reader.value('extra_state', {}),
+        'descriptor_index': read_mapping(reader, 'descriptor_index') if has_index else {},
+        'descriptor_conflicts': set(reader.keys('descriptor_conflicts')) if has_index else set(),
+    }
+
+
+def write_correction_index(writer: ModelWriter, prefix: str, index: CorrectionIndex):
+    """Grava o índice de busca aproximada do mapa de correções (listas invertidas em formato CSR)."""
+    state = index.to_state()
+    writer.add_keys(f'{prefix}/keys', state['keys'])
+    writer.add_array(f'{prefix}/sizes', np.asarray(state['sizes'], dtype=np.uint32))
+    writer.add_keys(f'{prefix}/grams', state['grams'])
+    writer.add_array(f'{prefix}/offsets', np.asarray(state['offsets'], dtype=np.uint32))
+    writer.add_array(f'{prefix}/ids', np.asarray(state['ids'], dtype=np.uint32))
+    writer.set_value(f'{prefix}/version', INDEX_VERSION)
+
+
+def read_correction_index(reader: ModelReader, prefix: str):
+    """Restaura um índice gravado com ``write_correction_index``."""
+    return CorrectionIndex.from_state(
+        {
+            'keys': reader.keys(f'{prefix}/keys'),
+            'sizes': reader.numbers(f'{prefix}/sizes'),
+            'grams': reader.keys(f'{prefix}/grams'),
+            'offsets': reader.numbers(f'{prefix}/offsets'),
+            'ids': reader.numbers(f'{prefix}/ids'),
+        }
+    )
+
+
+def write_description_state(writer: ModelWriter, state: dict):
+    """
+    Grava o estado do DescriptionPredictor (modelo, vocabulário, mapa de correções, índice de busca aproximada e
+    estado extra).
+    """
+    write_multinomial_nb(writer, 'model', state['model'])
+    write_mapping(writer, 'vectorizer', state['vectorizer'])
+    write_mapping(writer, 'correction_map', state['correction_map'])
+    write_correction_index(writer, 'correction_index', state.get('correction_index') or CorrectionIndex())
+    writer.set_value('preprocessing_enabled', state.get('preprocessing_enabled', True))
+    writer.set_value('extra_state', state.get('extra_state', {}))
+
+
+def read_description_state(reader: ModelReader):
+    """Restaura o estado do DescriptionPredictor."""
+    correction_map = read_mapping(reader, 'correction_map')
+    # Arquivos gravados antes do índice de busca aproximada, ou com trigramas de outra versão: o índice é montado a
+    # partir do mapa de correções
+    if reader.has('correction_index/keys') and reader.value('correction_index/version', 1) == INDEX_VERSION:
+        correction_index = read_correction_index(reader, 'correction_index')
+    else:
+        correction_index = CorrectionIndex(correction_map)
+    return {
+        'model': read_multinomial_nb(reader, 'model'),
+        'vectorizer': read_mapping(reader, 'vectorizer'),
+        'correction_map': correction_map,
+        'correction_index': correction_index,
+        'preprocessing_enabled': reader.value('preprocessing_enabled', True),
+        'extra_state': reader.value('extra_state', {}),
+    }
+
+
+CODECS = {
+    'subcategory': (write_subcategory_state, read_subcategory_state),
+    'description': (write_description_state, read_description_state),
+}
+
+
+def save_state(
+    filepath: str, predictor_type: str, state: dict, compression: str = MODEL_COMPRESSION, model_version: int = 0
+):
+    """
+    Grava o estado de um preditor no formato compacto, publicando o arquivo de forma atômica.
+
+    :param filepath: str - Caminho de destino.
+    :param predictor_type: str - Tipo do preditor ('subcategory' ou 'description').
+    :param state: dict - Estado retornado por ``get_state`` do preditor.
+    :param compression: str - 'none' ou 'zlib'.
+    :param model_version: int - Versão publicada do modelo.
+    :return: int - Tamanho do arquivo em bytes.
+    """
+    writer = ModelWriter(predictor_type)
+    writer.set_value('model_version', model_version)
+    CODECS[predictor_type][0](writer, state)
+    return writer.write(filepath, compression)
+
+
+def load_state(filepath: str, predictor_type: str, intern_tokens: bool = MODEL_INTERN_TOKENS):
+    """
+    Lê o estado de um preditor gravado no formato compacto.
+
+    :param filepath: str - Caminho do arquivo.
+    :param predictor_type: str - Tipo esperado do preditor.
+    :param intern_tokens: bool - Se os tokens devem ser internados, compartilhando as strings entre os modelos.
+    :return: dict - Estado no formato aceito por ``set_state`` do preditor, com a versão em 'model_version'.
+    :raises ModelFormatError: Se o arquivo for inválido ou de outro tipo de preditor.
+    """
+    reader = ModelReader(filepath, intern_tokens=intern_tokens)
+    if reader.predictor_type != predictor_type:
+        raise ModelFormatError(f'O arquivo {filepath} é de um preditor {reader.predictor_type}, não {predictor_type}')
+    state = CODECS[predictor_type][1](reader)
+    state['model_version'] = reader.value('model_version', 0)
+    return state
+
+
+def legacy_path(filepath: str):
+    """Obtém o caminho do arquivo pickle antigo correspondente a um arquivo no formato compacto."""
+    return os.path.splitext(filepath)[0] + LEGACY_EXTENSION
+
+
+def _legacy_files(model_dir: str):
+    for filename in sorted(os.listdir(model_dir)):
+        if filename.endswith(LEGACY_EXTENSION):
+            predictor_type = filename.split('_model_user_')[0]
+            if predictor_type in CODECS:
+                yield os.path.join(model_dir, filename), predictor_type
+
+
+def _timed(function, repeat: int):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def migrate(model_dir: str, keep_legacy: bool = False):
+    """
+    Converte todos os arquivos ``.pkl`` de um diretório para o formato compacto.
+
+    Cada modelo é publicado pelo ``save_model`` do preditor, como na conversão automática do primeiro uso: o arquivo
+    vai para o shard do usuário (ver training.model_store), recebe a versão seguinte e é registrado no manifesto. A
+    compressão é a de MODEL_COMPRESSION.
+
+    :param model_dir: str - Diretório dos modelos.
+    :param keep_legacy: bool - Mantém os arquivos pickle após a conversão.
+    """
+    from training.jobs import get_predictor_class
+    from training.manifest import parse_user_id
+
+    converted = 0
+    for pickle_path, predictor_type in _legacy_files(model_dir):
+        user_id = parse_user_id(os.path.basename(pickle_path)[: -len(LEGACY_EXTENSION)].split('_model_user_', 1)[1])
+        predictor = get_predictor_class(predictor_type)(user_id)
+        predictor.model_dir = model_dir
+        legacy_size = os.path.getsize(pickle_path)
+        if not predictor.migrate_legacy_model(keep_legacy=keep_legacy):
+            continue
+        target = predictor.get_model_path()
+        converted += 1
+        print(f'{pickle_path} -> {target} ({legacy_size} -> {os.path.getsize(target)} bytes)')
+    print(f'{converted} modelo(s) convertido(s).')
+
+
+def compare(model_dir: str, repeat: int = 5):
+    """
+    Compara tamanho e tempo de carregamento entre o pickle e o formato compacto (com e sem compressão).
+
+    :param model_dir: str - Diretório com arquivos ``.pkl``.
+    :param repeat: int - Número de repetições (é considerado o melhor tempo).
+    """
+    print(f'{"arquivo":<45} {"pickle":>10} {"compacto":>10} {"zlib":>10} {"pkl ms":>8} {"cmp ms":>8} {"zlib ms":>8}')
+    for pickle_path, predictor_type in _legacy_files(model_dir):
+        with open(pickle_path, 'rb') as f:
+            state = pickle.load(f)
+
+        plain_path = pickle_path + '.compare' + FORMAT_EXTENSION
+        zlib_path = pickle_path + '.compare.zlib' + FORMAT_EXTENSION
+        try:
+            plain_size = save_state(plain_path, predictor_type, state, 'none')
+            zlib_size = save_state(zlib_path, predictor_type, state, 'zlib')
+
+            def load_pickle():
+                with open(pickle_path, 'rb') as f:
+                    pickle.load(f)
+
+            pickle_time = _timed(load_pickle, repeat)
+            plain_time = _timed(lambda: load_state(plain_path, predictor_type), repeat)
+            zlib_time = _timed(lambda: load_state(zlib_path, predictor_type), repeat)
+        finally:
+            for path in (plain_path, zlib_path):
+                if os.path.exists(path):
+                    os.remove(path)
+
+        print(
+            f'{os.path.basename(pickle_path):<45} {os.path.getsize(pickle_path):>10} {plain_size:>10} {zlib_size:>10} '
+            f'{pickle_time * 1000:>8.2f} {plain_time * 1000:>8.2f} {zlib_time * 1000:>8.2f}'
+        )
+
+
+def memory(model_dir: str, limit: int = 200):
+    """
+    Mede a memória ocupada pelos modelos carregados (como no cache de modelos), sem e com a internação dos tokens.
+
+    :param model_dir: str - Diretório dos modelos.
+    :param limit: int - Quantidade máxima de modelos carregados.
+    :return: dict - Modelos, tokens (total e distintos) e bytes alocados em cada modo.
+    """
+    from training.model_store import iter_model_files
+
+    files = [
+        (entry.path, predictor_type)
+        for entry, _, predictor_type, storage in iter_model_files(model_dir)
+        if storage == 'hot' and predictor_type in CODECS
+    ][:limit]
+    tokens = [ModelReader(path, intern_tokens=False).tokens for path, _ in files]
+    result = {
+        'models': len(files),
+        'tokens': sum(len(table) for table in tokens),
+        'distinct_tokens': len(set().union(*tokens)),
+    }
+    del tokens
+
+    # O modo sem internação é medido primeiro, para que as strings internadas não sejam reaproveitadas por ele
+    for mode, intern_tokens in (('plain', False), ('interned', True)):
+        gc.collect()
+        tracemalloc.start()
+        states = [load_state(path, predictor_type, intern_tokens=intern_tokens) for path, predictor_type in files]
+        result[f'{mode}_bytes'], _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del states
+
+    result['saved_bytes'] = result['plain_bytes'] - result['interned_bytes']
+    if files:
+        result['plain_bytes_per_model'] = result['plain_bytes'] // len(files)
+        result['interned_bytes_per_model'] = result['interned_bytes'] // len(files)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Migração, comparação e uso de memória dos arquivos de modelo.')
+    parser.add_argument('command', choices=['migrate', 'compare', 'memory'])
+    parser.add_argument('--model-dir', default=os.path.join('training', 'model'))
+    parser.add_argument('--keep-legacy', action='store_true', help='Mantém os arquivos .pkl após a migração.')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--limit', type=int, default=200, help='Modelos carregados no relatório de memória.')
+    args = parser.parse_args()
+
+    if args.command == 'migrate':
+        migrate(args.model_dir, args.keep_legacy)
+    elif args.command == 'compare':
+        compare(args.model_dir, args.repeat)
+    else:
+        result = memory(args.model_dir, args.limit)
+        width = max(len(name) for name in result)
+        for name, value in result.items():
+            print(f'{name:<{width}}  {value}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,342 @@
+"""
+Organização dos arquivos de modelo no disco: diretórios por hash, armazenamento frio e orçamento de disco.
+
+Os modelos ficam em ``{model_dir}/{shard}/{tipo}_model_user_{id}.model``, onde ``shard`` são os primeiros dígitos
+hexadecimais do SHA-1 do id do usuário, de modo que nenhum diretório acumule os arquivos de todos os usuários.
+Arquivos de instalações anteriores, gravados direto em ``model_dir``, são movidos para o shard no primeiro uso.
+
+Modelos sem uso há mais de MODEL_IDLE_DAYS são regravados com zlib no armazenamento frio (MODEL_COLD_DIR) e
+voltam ao diretório principal, sem compressão, na próxima vez que forem carregados. Se o total ainda passar de
+MODEL_DISK_BUDGET_MB, os modelos usados há mais tempo são removidos: o manifesto os mantém como ``evicted`` e a
+próxima previsão do usuário enfileira um novo treinamento (no máximo um a cada MODEL_RETRAIN_BACKOFF segundos,
+para que um treinamento que falha não seja repetido a cada previsão). O último uso de cada modelo é registrado no manifesto,
+no máximo uma vez a cada MODEL_USAGE_INTERVAL segundos por processo.
+
+A política é aplicada pelo comando de manutenção (ex: em um cron)::
+
+    python -m training.model_store report
+    python -m training.model_store enforce [--dry-run]
+"""
+
+import argparse
+import fcntl
+import hashlib
+import logging
+import os
+import threading
+import time
+
+from training.manifest import LEGACY_FILE_PATTERN, MODEL_DIR, MODEL_FILE_PATTERN, manifest_for, parse_user_id
+
+MODEL_SHARD_CHARS = 2
+MODEL_COLD_DIR = os.getenv('MODEL_COLD_DIR', '')
+MODEL_IDLE_DAYS = float(os.getenv('MODEL_IDLE_DAYS', 30))
+MODEL_DISK_BUDGET_MB = float(os.getenv('MODEL_DISK_BUDGET_MB', 0))
+MODEL_USAGE_INTERVAL = float(os.getenv('MODEL_USAGE_INTERVAL', 300))
+MODEL_RETRAIN_BACKOFF = float(os.getenv('MODEL_RETRAIN_BACKOFF', 900))
+MODEL_EVICTED_CHECK_TTL = float(os.getenv('MODEL_EVICTED_CHECK_TTL', 60))
+
+logger = logging.getLogger(__name__)
+
+
+def shard(user_id):
+    """Obtém o diretório (shard) dos modelos de um usuário."""
+    return hashlib.sha1(str(user_id).encode('utf-8')).hexdigest()[:MODEL_SHARD_CHARS]
+
+
+def model_filename(predictor_type: str, user_id):
+    from training.model_format import FORMAT_EXTENSION
+
+    return f'{predictor_type}_model_user_{user_id}{FORMAT_EXTENSION}'
+
+
+def cold_dir(model_dir: str):
+    """Diretório do armazenamento frio: MODEL_COLD_DIR ou ``{model_dir}/cold``."""
+    return MODEL_COLD_DIR or os.path.join(model_dir, 'cold')
+
+
+def model_path(model_dir: str, predictor_type: str, user_id):
+    """Caminho do modelo em uso (no shard do usuário)."""
+    return os.path.join(model_dir, shard(user_id), model_filename(predictor_type, user_id))
+
+
+def cold_path(model_dir: str, predictor_type: str, user_id):
+    """Caminho do modelo no armazenamento frio."""
+    return os.path.join(cold_dir(model_dir), shard(user_id), model_filename(predictor_type, user_id))
+
+
+def flat_path(model_dir: str, predictor_type: str, user_id):
+    """Caminho do modelo no layout anterior aos shards (direto no diretório dos modelos)."""
+    return os.path.join(model_dir, model_filename(predictor_type, user_id))
+
+
+def iter_model_files(model_dir: str):
+    """
+    Percorre os arquivos de modelo do diretório principal (shards e layout antigo) e do armazenamento frio.
+
+    Um modelo pode aparecer em mais de um lugar se uma movimentação foi interrompida; os arquivos são percorridos
+    na ordem de preferência do carregamento (shards, layout antigo, armazenamento frio).
+
+    :param model_dir: str - Diretório dos modelos.
+    :return: Gerador de tuplas (os.DirEntry, user_id, tipo do preditor, 'hot' ou 'cold').
+    """
+
+    def shards(root: str):
+        if not os.path.isdir(root):
+            return []
+        return sorted(
+            entry.path for entry in os.scandir(root) if entry.is_dir() and len(entry.name) == MODEL_SHARD_CHARS
+        )
+
+    directories = [(path, 'hot') for path in shards(model_dir)] + [(model_dir, 'hot')]
+    directories += [(path, 'cold') for path in shards(cold_dir(model_dir))]
+    for directory, storage in directories:
+        if not os.path.isdir(directory):
+            continue
+        for entry in os.scandir(directory):
+            match = MODEL_FILE_PATTERN.match(entry.name)
+            if match and entry.is_file():
+                yield entry, parse_user_id(match['user_id']), match['type'], storage
+
+
+def iter_legacy_files(model_dir: str):
+    """
+    Percorre os pickles antigos (ver training.model_format) do diretório dos modelos, ainda não convertidos.
+
+    :param model_dir: str - Diretório dos modelos.
+    :return: Gerador de tuplas (os.DirEntry, user_id, tipo do preditor).
+    """
+    if not os.path.isdir(model_dir):
+        return
+    for entry in os.scandir(model_dir):
+        match = LEGACY_FILE_PATTERN.match(entry.name)
+        if match and entry.is_file():
+            yield entry, parse_user_id(match['user_id']), match['type']
+
+
+_last_usage = {}
+_last_usage_lock = threading.Lock()
+
+
+def record_usage(model_dir: str, user_id, predictor_type: str):
+    """
+    Registra no manifesto o uso de um modelo, no máximo uma vez a cada MODEL_USAGE_INTERVAL segundos.
+
+    Chamado a cada carregamento (inclusive do cache); fora do intervalo custa apenas uma consulta a um dict.
+    """
+    key = (model_dir, user_id, predictor_type)
+    now = time.time()
+    with _last_usage_lock:
+        if now - _last_usage.get(key, 0) < MODEL_USAGE_INTERVAL:
+            return
+        _last_usage[key] = now
+    try:
+        manifest_for(model_dir).record_usage(user_id, predictor_type, now)
+    except Exception:
+        logger.exception('Erro ao registrar o uso do modelo', extra={'user_id': user_id, 'type': predictor_type})
+
+
+_evicted = {}
+_evicted_lock = threading.Lock()
+
+
+def is_evicted(model_dir: str, user_id, predictor_type: str):
+    """
+    Verifica no manifesto se o modelo foi removido pela política de armazenamento.
+
+    Consultado nas previsões de usuários sem modelo: a resposta fica em memória por MODEL_EVICTED_CHECK_TTL
+    segundos, para não ler o manifesto a cada previsão.
+    """
+    key = (model_dir, user_id, predictor_type)
+    now = time.monotonic()
+    with _evicted_lock:
+        cached = _evicted.get(key)
+        if cached is not None and cached[0] > now:
+            return cached[1]
+    try:
+        evicted = manifest_for(model_dir).for_user(user_id).get(predictor_type, {}).get('state') == 'evicted'
+    except Exception:
+        logger.exception('Erro ao consultar o manifesto', extra={'user_id': user_id, 'type': predictor_type})
+        return False
+    with _evicted_lock:
+        _evicted[key] = (now + MODEL_EVICTED_CHECK_TTL, evicted)
+    return evicted
+
+
+def claim_retrain(model_dir: str, user_id, predictor_type: str):
+    """
+    Reserva o novo treinamento de um modelo removido (ver ModelManifest.claim_retrain), respeitando
+    MODEL_RETRAIN_BACKOFF.
+
+    :return: bool - True se o treinamento deve ser enfileirado.
+    """
+    try:
+        return manifest_for(model_dir).claim_retrain(user_id, predictor_type, time.time(), MODEL_RETRAIN_BACKOFF)
+    except Exception:
+        logger.exception('Erro ao consultar o manifesto', extra={'user_id': user_id, 'type': predictor_type})
+        return False
+
+
+class ModelStore:
+    """Relatório e aplicação da política de armazenamento (inatividade e orçamento de disco)."""
+
+    def __init__(
+        self,
+        model_dir: str = MODEL_DIR,
+        idle_days: float = MODEL_IDLE_DAYS,
+        budget_mb: float = MODEL_DISK_BUDGET_MB,
+    ):
+        self.model_dir = model_dir
+        self.idle_seconds = idle_days * 86400
+        self.budget_bytes = int(budget_mb * 1024 * 1024)
+        self.manifest = manifest_for(model_dir)
+
+    def _predictor(self, user_id, predictor_type: str):
+        from training.jobs import get_predictor_class
+
+        predictor = get_predictor_class(predictor_type)(user_id)
+        predictor.model_dir = self.model_dir
+        return predictor
+
+    def plan(self, now: float = None):
+        """
+        Calcula as ações da política, sem aplicá-las.
+
+        :param now: float (opcional) - Timestamp de referência. Padrão: agora.
+        :return: dict - Modelos a mover para o armazenamento frio ('cool') e a remover ('evict'), como
+            (user_id, tipo do preditor), e o total em bytes antes e depois.
+        """
+        now = now or time.time()
+        models = self.manifest.stored()
+        cool = []
+        if self.idle_seconds > 0:
+            cool = [
+                (model['user_id'], model['type'])
+                for model in models
+                if model['state'] == 'hot' and (model['last_used_at'] or model['saved_at']) < now - self.idle_seconds
+            ]
+
+        # O tamanho de um modelo no armazenamento frio só é conhecido depois de comprimido: o plano usa o tamanho
+        # atual, um limite superior, e ``enforce`` refaz o cálculo depois de mover os modelos inativos
+        total = remaining = sum(model['size'] for model in models)
+        evict = []
+        if self.budget_bytes > 0:
+            for model in models:  # do uso mais antigo para o mais recente
+                if remaining <= self.budget_bytes:
+                    break
+                evict.append((model['user_id'], model['type']))
+                remaining -= model['size']
+        cool = [model for model in cool if model not in set(evict)]
+        return {'cool': cool, 'evict': evict, 'bytes': total, 'bytes_after': remaining}
+
+    def report(self):
+        """
+        Resume o uso de disco por estado (em uso, frio, removido) e o que ``enforce`` faria.
+
+        :return: dict
+        """
+        storage = {state: {'models': 0, 'bytes': 0} for state in ('hot', 'cold', 'evicted')}
+        for state, models, size in self.manifest.storage_totals():
+            storage.setdefault(state, {'models': 0, 'bytes': 0}).update(models=models, bytes=size or 0)
+        plan = self.plan()
+        return {
+            'model_dir': self.model_dir,
+            'cold_dir': cold_dir(self.model_dir),
+            'storage': storage,
+            'bytes': plan['bytes'],
+            'budget_bytes': self.budget_bytes or None,
+            'idle_days': self.idle_seconds / 86400 or None,
+            'to_cool': len(plan['cool']),
+            'to_evict': len(plan['evict']),
+            'stale_files': len(list(self.stale_files())),
+        }
+
+    def stale_files(self):
+        """
+        Lista os arquivos auxiliares que sobraram no diretório principal: locks de modelos que não estão mais
+        nele e temporários de gravações interrompidas há mais de uma hora.
+        """
+        from training.model_format import FORMAT_EXTENSION
+
+        cutoff = time.time() - 3600
+        for root, _, filenames in os.walk(self.model_dir):
+            for filename in filenames:
+                path = os.path.join(root, filename)
+                if filename.endswith(f'{FORMAT_EXTENSION}.lock') and not os.path.exists(path[: -len('.lock')]):
+                    yield path
+                elif filename.endswith('.tmp') and os.path.getmtime(path) < cutoff:
+                    yield path
+
+    def _remove_lock(self, path: str):
+        # Só remove o lock que ninguém está segurando; quem já o abriu percebe a troca do inode (ver writer_lock)
+        with open(path, 'a') as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return False
+            os.remove(path)
+        return True
+
+    def enforce(self, dry_run: bool = False):
+        """
+        Aplica a política: move os modelos inativos para o armazenamento frio, remove os usados há mais tempo
+        até caber no orçamento e apaga os arquivos auxiliares que sobraram.
+
+        :param dry_run: bool - Apenas calcula as ações.
+        :return: dict - Quantidade de modelos movidos, removidos, arquivos apagados e bytes liberados.
+        """
+        plan = self.plan()
+        result = {'cooled': 0, 'evicted': 0, 'removed_files': 0, 'bytes_freed': 0, 'dry_run': dry_run}
+        if dry_run:
+            result.update(cooled=len(plan['cool']), evicted=len(plan['evict']))
+            result['bytes_freed'] = plan['bytes'] - plan['bytes_after']
+            result['removed_files'] = len(list(self.stale_files()))
+            return result
+
+        for user_id, predictor_type in plan['cool']:
+            try:
+                result['bytes_freed'] += self._predictor(user_id, predictor_type).move_to_cold()
+                result['cooled'] += 1
+            except Exception:
+                logger.exception(
+                    'Erro ao mover modelo para o armazenamento frio', extra={'user_id': user_id, 'type': predictor_type}
+                )
+        if result['cooled'] and self.budget_bytes > 0:
+            plan = self.plan()
+        for user_id, predictor_type in plan['evict']:
+            try:
+                result['bytes_freed'] += self._predictor(user_id, predictor_type).evict_model()
+                result['evicted'] += 1
+            except Exception:
+                logger.exception('Erro ao remover modelo', extra={'user_id': user_id, 'type': predictor_type})
+        for path in list(self.stale_files()):
+            if not path.endswith('.lock'):
+                os.remove(path)
+                result['removed_files'] += 1
+            elif self._remove_lock(path):
+                result['removed_files'] += 1
+
+        logger.info('Política de armazenamento aplicada', extra=result)
+        return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Relatório e aplicação do orçamento de disco dos modelos.')
+    parser.add_argument('command', choices=['report', 'enforce'])
+    parser.add_argument('--model-dir', default=MODEL_DIR)
+    parser.add_argument('--idle-days', type=float, default=MODEL_IDLE_DAYS, help='0 desativa.')
+    parser.add_argument('--budget-mb', type=float, default=MODEL_DISK_BUDGET_MB, help='0 desativa.')
+    parser.add_argument('--dry-run', action='store_true', help='Apenas mostra o que seria feito.')
+    args = parser.parse_args()
+
+    store = ModelStore(args.model_dir, args.idle_days, args.budget_mb)
+    result = store.report() if args.command == 'report' else store.enforce(args.dry_run)
+    width = max(len(name) for name in result)
+    for name, value in result.items():
+        if isinstance(value, dict):
+            value = '  '.join(f'{key}: {item["models"]} modelo(s), {item["bytes"]} bytes' for key, item in value.items())
+        print(f'{name:<{width}}  {value}')
+
+
+if __name__ == '__main__':
+    main()
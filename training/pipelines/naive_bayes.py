@@ -0,0 +1,131 @@
+"""
+Utilitários para o MultinomialNB do River: aprendizado com peso, pontuação em lote e seleção dos top-k.
+
+O ``learn_one`` do River não aceita peso, então reforçar um exemplo exigia repetir a chamada ``w`` vezes.
+``learn_weighted`` aplica o peso diretamente nas contagens, com o mesmo resultado e custo de uma única chamada.
+
+O ``predict_proba_many`` do River depende de ``transform_many`` em todas as etapas do pipeline, o que o TFIDF
+não implementa, e monta uma tabela densa com todo o vocabulário a cada chamada. Aqui a pontuação é feita com
+uma matriz esparsa contendo apenas as características presentes no lote, produzindo as mesmas
+probabilidades que ``predict_proba_one``.
+"""
+
+import numpy as np
+from river import compose
+from scipy import sparse, special
+
+
+def learn_weighted(model, x: dict, y, w: float = 1.0):
+    """
+    Atualiza um MultinomialNB com um exemplo de peso ``w``.
+
+    Equivale a chamar ``model.learn_one(x, y)`` ``w`` vezes, mas percorre as características uma única vez.
+
+    :param model: naive_bayes.MultinomialNB - Modelo a atualizar.
+    :param x: dict - Vetor de características (frequências).
+    :param y: Classe do exemplo.
+    :param w: float - Peso do exemplo.
+    """
+    if w <= 0:
+        return
+
+    model.class_counts[y] += w
+    for feature, frequency in x.items():
+        model.feature_counts[feature][y] += frequency * w
+        model.class_totals[y] += frequency * w
+
+
+def pipeline_learn_weighted(pipeline: compose.Pipeline, x: dict, y, w: float = 1.0):
+    """
+    Atualiza um pipeline terminado em MultinomialNB com um exemplo de peso ``w``.
+
+    Os transformadores aprendem o exemplo uma única vez (um documento continua sendo um documento para o TFIDF)
+    e apenas o classificador recebe o peso. O ``Pipeline.learn_one`` do River não repassa parâmetros para a
+    última etapa, por isso as etapas são percorridas aqui.
+
+    :param pipeline: compose.Pipeline - Pipeline cuja última etapa é um MultinomialNB.
+    :param x: dict - Exemplo com as características originais.
+    :param y: Classe do exemplo.
+    :param w: float - Peso do exemplo.
+    """
+    if w <= 0:
+        return
+
+    *transformers, model = pipeline.steps.values()
+    for step in transformers:
+        x_pre = x
+        sub_steps = step.transformers.values() if isinstance(step, compose.TransformerUnion) else [step]
+        for sub_step in sub_steps:
+            if not sub_step._supervised:
+                sub_step.learn_one(x)
+        x = step.transform_one(x)
+        for sub_step in sub_steps:
+            if sub_step._supervised:
+                sub_step.learn_one(x_pre, y)
+
+    learn_weighted(model, x, y, w)
+
+
+def predict_proba_batch(model, rows: list[dict]):
+    """
+    Calcula as probabilidades de classe de um MultinomialNB para vários vetores de uma só vez.
+
+    :param model: naive_bayes.MultinomialNB - Modelo treinado.
+    :param rows: list[dict] - Vetores de características já transformados.
+    :return: tuple - (lista de classes, matriz numpy de probabilidades com uma linha por vetor).
+    """
+    classes = list(model.class_counts)
+    if not classes or not rows:
+        return classes, np.zeros((len(rows), len(classes)))
+
+    features = {}
+    indptr, indices, data = [0], [], []
+    for x in rows:
+        for feature, value in x.items():
+            # Características com valor zero não contribuem para a verossimilhança
+            if value:
+                indices.append(features.setdefault(feature, len(features)))
+                data.append(value)
+        indptr.append(len(data))
+
+    X = sparse.csr_matrix((data, indices, indptr), shape=(len(rows), len(features)), dtype=np.float64)
+
+    counts = np.zeros((len(features), len(classes)))
+    for feature, j in features.items():
+        feature_counts = model.feature_counts.get(feature)
+        if feature_counts:
+            counts[j] = [feature_counts.get(c, 0.0) for c in classes]
+
+    class_totals = np.array([model.class_totals[c] for c in classes], dtype=np.float64)
+    log_prob = np.log(counts + model.alpha) - np.log(class_totals + model.alpha * model.n_terms)
+
+    class_counts = np.array([model.class_counts[c] for c in classes], dtype=np.float64)
+    log_prior = np.log(class_counts / class_counts.sum())
+
+    jll = np.asarray(X @ log_prob) + log_prior
+    proba = np.exp(jll - special.logsumexp(jll, axis=1, keepdims=True))
+    return classes, proba
+
+
+def top_k(classes: list, proba_row, k: int = 1):
+    """
+    Seleciona as ``k`` classes mais prováveis de uma linha de probabilidades.
+
+    A ordenação é estável: em caso de empate vence a classe que aparece primeiro, como no ``argmax`` e no
+    ``predict_one`` do River.
+
+    :param classes: list - Classes, na ordem das colunas.
+    :param proba_row: Sequência de probabilidades (ex: uma linha de ``predict_proba_batch``).
+    :param k: int - Quantidade de candidatos.
+    :return: list[tuple] - (classe, probabilidade), da mais para a menos provável.
+    """
+    if not classes or k <= 0:
+        return []
+
+    row = np.asarray(proba_row, dtype=np.float64)
+    if k == 1:
+        best = int(row.argmax())
+        return [(classes[best], float(row[best]))]
+
+    order = np.argsort(-row, kind='stable')[:k]
+    return [(classes[i], float(row[i])) for i in order]
@@ -0,0 +1,128 @@
+"""
+Cache em memória, compartilhado pelo processo, das previsões já calculadas.
+
+O fluxo de importação do MyFinance reenvia as mesmas descrições várias vezes (pré-visualização, nova
+pré-visualização, confirmação). Cada previsão é guardada com a chave (usuário, preditor, descrição normalizada,
+categoria, top_k, versão do modelo, geração): um modelo publicado por outro processo muda a versão lida em
+``load_model`` e ``save_model``/``delete_model`` incrementam a geração do usuário neste processo. Nos dois casos
+as entradas antigas deixam de ser encontradas e saem pela política LRU ou pelo TTL.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+PREDICTION_CACHE_MAX_ENTRIES = int(os.getenv('PREDICTION_CACHE_MAX_ENTRIES', 100000))
+PREDICTION_CACHE_TTL = float(os.getenv('PREDICTION_CACHE_TTL', 600))
+
+
+class PredictionCache:
+    """Cache LRU com TTL de previsões, invalidado pela versão do modelo."""
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._generations = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0 and self.ttl > 0
+
+    def key(self, user_id, predictor_type: str, model_version: int, *parts):
+        """
+        Monta a chave de uma previsão.
+
+        :param user_id: Id do usuário.
+        :param predictor_type: str - Tipo do preditor.
+        :param model_version: int - Versão do modelo carregado.
+        :param parts: Entrada normalizada da previsão (descrição, categoria, top_k...).
+        :return: tuple
+        """
+        with self._lock:
+            generation = self._generations.get((user_id, predictor_type), 0)
+        return (user_id, predictor_type, model_version, generation, *parts)
+
+    def get(self, key: tuple):
+        """
+        Obtém uma previsão cacheada.
+
+        :param key: tuple - Chave montada por ``key``.
+        :return: dict|None - Previsão (somente leitura) ou None em caso de miss.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            if entry['expires'] <= time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry['result']
+
+    def put(self, key: tuple, result: dict):
+        """
+        Armazena uma previsão.
+
+        :param key: tuple - Chave montada por ``key``.
+        :param result: dict - Previsão; não deve ser alterada depois de armazenada.
+        """
+        if not self.enabled:
+            return
+
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = {'result': result, 'expires': time.monotonic() + self.ttl}
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, user_id, predictor_type: str):
+        """
+        Descarta as previsões de um usuário e preditor (chamado ao salvar ou apagar o modelo).
+
+        :param user_id: Id do usuário.
+        :param predictor_type: str - Tipo do preditor.
+        """
+        with self._lock:
+            key = (user_id, predictor_type)
+            self._generations[key] = self._generations.get(key, 0) + 1
+            self.invalidations += 1
+
+    def clear(self):
+        """Esvazia o cache sem zerar os contadores."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Retorna os contadores de uso do cache."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+
+prediction_cache = PredictionCache(PREDICTION_CACHE_MAX_ENTRIES, PREDICTION_CACHE_TTL)
@@ -1,14 +1,31 @@
+import hashlib
+import json
+import logging
 import os
-import pickle
-import traceback
-import unicodedata
+import time
+import zlib
+from collections import Counter
 
 from river import compose, feature_extraction, naive_bayes, preprocessing
 
+from training.correction_index import DESCRIPTION_FUZZY_THRESHOLD, CorrectionIndex
 from training.data_fetcher import get_data
+from training.evaluation import PROGRESSIVE_VALIDATION_CHUNK, ProgressiveMetrics
+from training.metrics import PREDICT_SECONDS, user_labels
+from training.model_format import ModelWriter, write_mapping, write_multinomial_nb
 from training.pipelines.description import build_pipeline
+from training.pipelines.naive_bayes import learn_weighted, predict_proba_batch, top_k as select_top_k
+from training.prediction_cache import prediction_cache
+from training.text import normalize
 from training.transaction_classifier import TransactionClassifier
 
+DESCRIPTION_HASH_BUCKETS = int(os.getenv('DESCRIPTION_HASH_BUCKETS', 0))
+DESCRIPTION_MIN_TOKEN_COUNT = int(os.getenv('DESCRIPTION_MIN_TOKEN_COUNT', 1))
+DESCRIPTION_MAX_VOCABULARY = int(os.getenv('DESCRIPTION_MAX_VOCABULARY', 0))
+DESCRIPTION_MAX_MODEL_KB = float(os.getenv('DESCRIPTION_MAX_MODEL_KB', 0))
+
+logger = logging.getLogger(__name__)
+
 
 class DescriptionPredictor(TransactionClassifier):
     """
@@ -23,8 +40,24 @@ class DescriptionPredictor(TransactionClassifier):
         self.model = naive_bayes.MultinomialNB()
         self.vectorizer = {}  # Dicionário para armazenar vocabulário
         self.correction_map = {}  # Mapeia descrições originais para correções exatas
+        self.correction_index = CorrectionIndex()  # Busca aproximada nas chaves do mapa de correções
+        self.fuzzy_threshold = DESCRIPTION_FUZZY_THRESHOLD  # Similaridade mínima da busca aproximada
         self.preprocessing_enabled = True  # Habilita ou desabilita o pré-processamento
 
+    def model_summary(self):
+        """
+        Resume o modelo para o manifesto.
+
+        :return: dict - Exemplos aprendidos (somando os pesos), descrições corrigidas conhecidas e validação
+            progressiva.
+        """
+        class_counts = self.model.class_counts
+        return {
+            'samples': float(sum(class_counts.values())),
+            'classes': len(class_counts),
+            **self.evaluation_summary(),
+        }
+
     def ensure_serializable(self, obj):
         """
         Garante que um objeto seja serializável para JSON.
@@ -47,67 +80,81 @@ class DescriptionPredictor(TransactionClassifier):
             except:
                 return "Objeto não serializável"
 
-    def preprocess_text(self, text):
-        """
-        Pré-processa o texto para melhorar a qualidade do modelo
+    def analyze(self, text):
         """
-        if not self.preprocessing_enabled:
-            return text
+        Normaliza o texto uma única vez, obtendo o texto normalizado, as palavras e a chave de correção.
+        O resultado é memorizado em training.text e reaproveitado pelo treinamento e pela previsão.
 
+        :param text: str - Descrição original.
+        :return: NormalizedText
+        """
         if not isinstance(text, str):
-            print(
-                f"AVISO: Tipo de entrada inválido para preprocess_text: {type(text)}")
+            logger.warning('Tipo de entrada inválido para analyze: %s', type(text))
             if isinstance(text, dict) and 'description' in text:
                 text = text['description']
             else:
-                return str(text)
-
-        # Converter para minúsculas
-        text = text.lower()
+                text = str(text)
 
-        # Remover acentos (forma simples)
-        try:
+        return normalize(text, self.preprocessing_enabled)
 
-            text = unicodedata.normalize('NFKD', text).encode(
-                'ASCII', 'ignore').decode('ASCII')
-        except Exception as e:
-            print(f"Erro ao remover acentos: {e}")
+    def preprocess_text(self, text):
+        """
+        Pré-processa o texto para melhorar a qualidade do modelo
+        """
+        return self.analyze(text).text
 
-        return text
+    @property
+    def hash_buckets(self):
+        """Quantidade de buckets do modo hashing com que o modelo foi treinado (0 usa as próprias palavras)."""
+        return self.extra_state.get('hash_buckets', 0)
 
-    def vectorize_text(self, text):
+    def features(self, normalized):
         """
-        Converte o texto em um vetor de características usando contagem de palavras
+        Obtém as características de um texto já normalizado: as próprias palavras ou, no modo hashing, o bucket de
+        cada palavra. O bucket vem do crc32, que, ao contrário de ``hash``, é o mesmo em todos os processos.
+
+        :param normalized: NormalizedText - Resultado de ``analyze``.
+        :return: list - Palavras (str) ou buckets (int).
         """
-        if not isinstance(text, str):
-            print(
-                f"AVISO: Tipo de entrada inválido para vectorize_text: {type(text)}")
-            if isinstance(text, dict) and 'description' in text:
-                text = text['description']
-            else:
-                return {}
+        buckets = self.hash_buckets
+        if not buckets:
+            return normalized.tokens
+        return [zlib.crc32(token.encode('utf-8')) % buckets for token in normalized.tokens]
 
-        text = self.preprocess_text(text)
-        words = text.split()
-        vector = {}
+    def vectorize(self, normalized, update_vocabulary=True):
+        """
+        Converte um texto já normalizado em um vetor de características usando contagem de palavras
 
-        for word in words:
-            if word not in vector:
-                vector[word] = 0
-            vector[word] += 1
+        :param normalized: NormalizedText - Resultado de ``analyze``.
+        :param update_vocabulary: bool - Se o vocabulário global deve ser atualizado (apenas no treinamento).
+            Na previsão o vocabulário é somente leitura, pois é compartilhado pelo cache de modelos.
+        """
+        vector = dict(Counter(self.features(normalized)))
 
-            # Atualizar o vocabulário global
-            if word not in self.vectorizer:
-                self.vectorizer[word] = 0
-            self.vectorizer[word] += 1
+        # Atualizar o vocabulário global
+        if update_vocabulary:
+            for word, count in vector.items():
+                self.vectorizer[word] = self.vectorizer.get(word, 0) + count
 
         return vector
 
+    def vectorize_text(self, text, update_vocabulary=True):
+        """
+        Converte o texto em um vetor de características usando contagem de palavras
+
+        :param update_vocabulary: bool - Se o vocabulário global deve ser atualizado (apenas no treinamento).
+        """
+        if not isinstance(text, str) and not (isinstance(text, dict) and 'description' in text):
+            logger.warning('Tipo de entrada inválido para vectorize_text: %s', type(text))
+            return {}
+
+        return self.vectorize(self.analyze(text), update_vocabulary)
+
     def correction_key(self, description):
         """
         Normaliza a descrição para uso no mapa de correções exatas.
         """
-        return ' '.join(self.preprocess_text(description).split())
+        return self.analyze(description).key
 
     def register_correction(self, description, corrected_description):
         """
@@ -116,20 +163,52 @@ class DescriptionPredictor(TransactionClassifier):
         key = self.correction_key(description)
         if key:
             self.correction_map[key] = corrected_description
+            self.correction_index.add(key)
 
-    def train(self, token: str):
+    @staticmethod
+    def data_hash(feedbacks):
+        """
+        Calcula uma assinatura dos feedbacks usados no treinamento.
+
+        :param feedbacks: list[dict] - Feedbacks retornados pela API.
+        :return: str - Hash que muda quando algum feedback é criado, removido ou alterado.
+        """
+        items = sorted(
+            (str(feedback.get('description')), str(feedback.get('corrected_description')))
+            for feedback in feedbacks
+            if isinstance(feedback, dict)
+        )
+        return hashlib.sha1(json.dumps(items, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+    def train(self, token: str, skip_unchanged: bool = False):
+        """
+        Treina o modelo do zero com os feedbacks do usuário.
+
+        :param token: str - Um token JWT criado pela aplicação Django que será usado na autentificação.
+        :param skip_unchanged: bool - Não treina se os feedbacks forem os mesmos do modelo salvo.
+        """
         try:
             feedbacks = get_data('categorization-feedback', token)
 
             if not feedbacks:
                 raise ValueError('Não foi possível obter feedbacks.')
 
-            self.delete_model()
-
-            # Limpar modelo e vetorizador
+            data_hash = self.data_hash(feedbacks)
+            if skip_unchanged and self.is_trained(self.type):
+                self.load_model(use_cache=False)
+                if self.extra_state.get('data_hash') == data_hash:
+                    return {
+                        'success': True,
+                        'message': f'Nenhum feedback novo para o modelo do usuário {self.user_id}.',
+                        'skipped': True,
+                    }
+
+            # Limpar modelo e vetorizador (o modelo publicado continua servindo previsões até ser substituído)
             self.model = naive_bayes.MultinomialNB()
             self.vectorizer = {}
             self.correction_map = {}
+            self.correction_index = CorrectionIndex()
+            self.extra_state = {'data_hash': data_hash, 'hash_buckets': DESCRIPTION_HASH_BUCKETS}
 
             used_feedbacks = 0
             training_data = []
@@ -137,222 +216,335 @@ class DescriptionPredictor(TransactionClassifier):
             for feedback in feedbacks:
                 # Verificar se a entrada é válida
                 if not isinstance(feedback, dict):
-                    print(
-                        f"AVISO: Formato de feedback inválido: {type(feedback)}")
+                    logger.warning('Formato de feedback inválido: %s', type(feedback))
                     continue
 
                 if 'description' not in feedback or 'corrected_description' not in feedback:
-                    print("AVISO: Feedback não contém os campos necessários")
+                    logger.warning('Feedback não contém os campos necessários')
                     continue
 
                 # Ignora feedbacks sem correção de descrição
                 if feedback['description'] != feedback['corrected_description']:
                     try:
-                        # Extrair texto e vetorizar
+                        # Extrair texto e contar as palavras no vocabulário
                         description = feedback['description']
-                        vector = self.vectorize_text(description)
+                        normalized = self.analyze(description)
+                        self.vectorize(normalized)
                         target = feedback['corrected_description']
                         self.register_correction(description, target)
 
-                        # Treinar o modelo
-                        self.model.learn_one(vector, target)
-
-                        training_data.append({
-                            'description': description,
-                            'corrected_description': target
-                        })
+                        training_data.append({'corrected_description': target, 'normalized': normalized})
                         used_feedbacks += 1
-                    except Exception as e:
-                        print(f"Erro ao processar feedback: {e}")
+                    except Exception:
+                        logger.exception('Erro ao processar feedback')
+
+            # O vocabulário é podado antes do treino, de modo que as palavras raras nem entram nas tabelas do modelo.
+            # Cada exemplo é previsto antes de ser aprendido (validação progressiva, ver training.evaluation)
+            self.prune_vocabulary(DESCRIPTION_MIN_TOKEN_COUNT, DESCRIPTION_MAX_VOCABULARY)
+            metrics = ProgressiveMetrics()
+            for start in range(0, len(training_data), PROGRESSIVE_VALIDATION_CHUNK):
+                chunk = training_data[start:start + PROGRESSIVE_VALIDATION_CHUNK]
+                vectors = []
+                for item in chunk:
+                    vector = self.vectorize(item['normalized'], update_vocabulary=False)
+                    vectors.append({feature: count for feature, count in vector.items() if feature in self.vectorizer})
+                targets = [item['corrected_description'] for item in chunk]
+                metrics.update_many(targets, *predict_proba_batch(self.model, vectors))
+                for vector, target in zip(vectors, targets):
+                    self.model.learn_one(vector, target)
+            self.extra_state['progressive_metrics'] = metrics.get_state()
+            evaluation = metrics.summary(per_class=False)
 
             if used_feedbacks < self.min_samples:
-                print(f"Aviso: Apenas {used_feedbacks} exemplos foram utilizados para treinamento. "
-                      f"Recomendamos pelo menos {self.min_samples} para um modelo confiável.")
-
-            # Validação simples
-            if used_feedbacks > 0:
-                correct = 0
-                for item in training_data:
-                    vector = self.vectorize_text(item['description'])
-                    prediction = self.model.predict_one(vector)
-                    if prediction == item['corrected_description']:
-                        correct += 1
-                accuracy = correct / len(training_data) if training_data else 0
-                print(
-                    f"Acurácia do modelo nos dados de treinamento: {accuracy:.2f}")
+                logger.warning(
+                    'Apenas %d exemplos foram utilizados para treinamento. '
+                    'Recomendamos pelo menos %d para um modelo confiável.',
+                    used_feedbacks,
+                    self.min_samples,
+                    extra={'user_id': self.user_id, 'type': self.type},
+                )
+
+            logger.info(
+                'Validação progressiva do treinamento',
+                extra={'user_id': self.user_id, 'type': self.type, **evaluation},
+            )
 
             # Salvar modelo
+            self.compact_if_needed()
             self.save_model()
 
             return {
                 'success': True,
                 'message': f'Modelo do usuário {self.user_id} treinado com sucesso! '
-                f'com {used_feedbacks} feedback(s) utilizados.'
+                f'com {used_feedbacks} feedback(s) utilizados.',
+                'metrics': evaluation,
             }
 
         except Exception as e:
-            traceback.print_exc()
+            logger.exception('Erro ao treinar modelo', extra={'user_id': self.user_id, 'type': self.type})
             return {
                 'success': False,
                 'message': f'Erro ao treinar modelo: {str(e)}'
             }
 
-    def predict(self, description: str, category: str = None):
+    def predict(self, description: str, category: str = None, top_k: int = 1):
         """
         Faz uma previsão da descrição corrigida para uma descrição dada.
+
+        :param description: str - Descrição original.
+        :param category: str (opcional) - Não utilizada por este preditor.
+        :param top_k: int - Quantidade de descrições candidatas retornadas em 'candidates'.
         """
         try:
-            print("Carregando modelo...")
-            self.load_model()
-            print(f"Modelo carregado para {self.user_id}")
+            with PREDICT_SECONDS.time(type=self.type, mode='single', **user_labels(self.user_id)):
+                self.load_model()
+                return self._predict_cached(description, category, top_k)
 
-            print(f"Fazendo previsão para: {description}")
+        except Exception as e:
+            logger.exception('Erro ao realizar predição', extra={'user_id': self.user_id, 'type': self.type})
+            # Garantir que a resposta de erro seja completamente serializável
+            return {
+                'success': False,
+                'prediction': None,
+                'message': f'Erro ao realizar predição: {str(e)}'
+            }
 
-            correction = self.correction_map.get(self.correction_key(description))
-            if correction:
-                print(f"Correção exata encontrada: {correction}")
-                return {
-                    'success': True,
-                    'prediction': correction,
-                    'confidence': 1.0,
-                    'message': 'Correção exata encontrada no histórico de feedback.'
-                }
+    def prediction_key(self, description: str, category: str = None, top_k: int = 1):
+        """
+        Chave da previsão no cache de previsões. Usa a descrição original, e não a normalizada, pois as respostas
+        para descrições inéditas devolvem o próprio texto recebido. A categoria não é usada por este preditor.
+        """
+        return prediction_cache.key(self.user_id, self.type, self.model_version, description, top_k)
 
-            # Verificar se o vocabulário da descrição está presente no vetor treinado
-            tokens = self.preprocess_text(description).split()
-            known_tokens = [token for token in tokens if token in self.vectorizer]
+    def _predict_one(self, description: str, category: str = None, top_k: int = 1):
+        """
+        Faz uma previsão da descrição corrigida para uma descrição dada, com o modelo já carregado.
 
-            if not known_tokens:
-                print("Aviso: Nenhuma palavra da descrição foi vista no treinamento")
-                return {
-                    'success': True,
-                    'prediction': description,
-                    'message': 'Não foi possível prever: a descrição parece inédita para o modelo.'
-                }
+        O modelo é pontuado uma única vez: a descrição prevista, a confiança e os candidatos saem da mesma
+        distribuição de probabilidades.
+        """
+        try:
+            # A descrição é normalizada uma única vez e reaproveitada em todas as etapas abaixo
+            normalized = self.analyze(description)
+
+            shortcut = self._shortcut(description, normalized)
+            if shortcut:
+                return shortcut
 
-            # Vetorizar o texto e fazer a previsão
             try:
-                vector = self.vectorize_text(description)
-                print(f"Texto vetorizado: {len(vector)} características")
-
-                prediction = self.model.predict_one(vector)
-                print(f"Previsão bruta: {prediction}")
-
-                # Garantir que a previsão seja serializável
-                if prediction is None:
-                    prediction_str = None
-                else:
-                    prediction_str = str(prediction)
-
-                # Calcular confiança
-                confidence = 0.0
-                if hasattr(self.model, 'predict_proba_one'):
-                    probas = self.model.predict_proba_one(vector)
-                    print(f"Probabilidades: {probas}")
-
-                    if prediction_str in probas:
-                        confidence = probas[prediction_str]
-                    elif prediction in probas:
-                        confidence = probas[prediction]
-
-                    print(f"Confiança da previsão: {confidence:.2f}")
-
-                    if confidence < self.min_confidence:
-                        print("Aviso: Confiança abaixo do limite")
-                        return {
-                            'success': True,
-                            'prediction': None,
-                            'message': f'Baixa confiança na previsão para esta descrição (confiança: {confidence:.2f}).'
-                        }
+                vector = self.vectorize(normalized, update_vocabulary=False)
+                probas = self.model.predict_proba_one(vector)
+            except Exception as predict_error:
+                return self._predict_error(predict_error)
+
+            return self._prediction(description, normalized, list(probas), list(probas.values()), top_k)
 
+        except Exception as e:
+            logger.exception('Erro ao realizar predição', extra={'user_id': self.user_id, 'type': self.type})
+            # Garantir que a resposta de erro seja completamente serializável
+            return {
+                'success': False,
+                'prediction': None,
+                'message': f'Erro ao realizar predição: {str(e)}'
+            }
+
+    def _predict_many(self, transactions: list, top_k: int = 1):
+        """
+        Faz a previsão das descrições corrigidas para vários lançamentos, com o modelo já carregado.
+
+        Correções exatas e descrições inéditas são resolvidas sem o modelo; as demais são pontuadas juntas, em
+        uma única passada.
+
+        :param transactions: list - Objetos Transaction.
+        :param top_k: int - Quantidade de descrições candidatas por lançamento.
+        :return: list[dict] - Previsões, na mesma ordem da entrada.
+        """
+        results = [None] * len(transactions)
+        pending = []
+        for index, transaction in enumerate(transactions):
+            try:
+                normalized = self.analyze(transaction.description)
+                results[index] = self._shortcut(transaction.description, normalized)
+                if results[index] is None:
+                    pending.append((index, normalized, self.vectorize(normalized, update_vocabulary=False)))
             except Exception as predict_error:
-                print(f"Erro na previsão: {str(predict_error)}")
-                traceback.print_exc()
-                return {
-                    'success': True,
-                    'prediction': None,
-                    'message': f'Não foi possível fazer uma previsão para esta descrição: {str(predict_error)}'
-                }
+                results[index] = self._predict_error(predict_error)
+
+        if pending:
+            try:
+                classes, proba = predict_proba_batch(self.model, [vector for _, _, vector in pending])
+            except Exception as predict_error:
+                for index, _, _ in pending:
+                    results[index] = self._predict_error(predict_error)
+                return results
 
-            print(f"Previsão realizada: {prediction_str}")
+            for (index, normalized, _), row in zip(pending, proba):
+                results[index] = self._prediction(transactions[index].description, normalized, classes, row, top_k)
 
-            # Se a previsão for muito próxima da entrada ou None, retornamos None
-            if prediction_str is None or self.preprocess_text(prediction_str) == self.preprocess_text(description):
-                print("Aviso: Previsão igual à entrada")
-                return {
-                    'success': True,
-                    'prediction': None,
-                    'message': 'Nenhuma correção sugerida para esta descrição.'
-                }
+        return results
+
+    def _shortcut(self, description: str, normalized):
+        """
+        Resolve a previsão sem consultar o modelo, quando possível.
+
+        :param description: str - Descrição original.
+        :param normalized: NormalizedText - Descrição normalizada.
+        :return: dict ou None - A resposta, para correções exatas e descrições inéditas; None se o modelo
+            precisar ser consultado.
+        """
+        correction = self.correction_map.get(normalized.key)
+        if correction:
+            logger.debug('Correção exata encontrada: %s', correction)
+            return {
+                'success': True,
+                'prediction': correction,
+                'confidence': 1.0,
+                'candidates': [{'description': correction, 'probability': 1.0}],
+                'message': 'Correção exata encontrada no histórico de feedback.'
+            }
 
-            # Adiciona informações de debug à resposta
-            response = {
+        # Descrições que só diferem da corrigida por parcelas, datas ou códigos (ex: "PARC 03/12")
+        match = self.correction_index.lookup(normalized.key, self.fuzzy_threshold)
+        if match:
+            key, similarity = match
+            correction = self.correction_map[key]
+            logger.debug('Correção aproximada encontrada: %s (%s, similaridade %.2f)', correction, key, similarity)
+            return {
                 'success': True,
-                'prediction': prediction_str,
-                'confidence': float(confidence) if isinstance(confidence, (int, float)) else 0.0
+                'prediction': correction,
+                'confidence': similarity,
+                'candidates': [{'description': correction, 'probability': similarity}],
+                'message': 'Correção aproximada encontrada no histórico de feedback.'
             }
 
-            # Garantir que a resposta seja completamente serializável
-            response = self.ensure_serializable(response)
+        # Verificar se o vocabulário da descrição está presente no vetor treinado
+        if not any(feature in self.vectorizer for feature in self.features(normalized)):
+            logger.debug('Nenhuma palavra da descrição foi vista no treinamento: %s', description)
+            return {
+                'success': True,
+                'prediction': description,
+                'candidates': [],
+                'message': 'Não foi possível prever: a descrição parece inédita para o modelo.'
+            }
 
-            print(f"Retornando resposta: {response}")
-            return response
+        return None
 
+    def _prediction(self, description: str, normalized, classes: list, proba_row, top_k: int = 1):
+        """
+        Monta a resposta a partir da distribuição de probabilidades do modelo.
+
+        :param description: str - Descrição original.
+        :param normalized: NormalizedText - Descrição normalizada.
+        :param classes: list - Descrições conhecidas pelo modelo.
+        :param proba_row: Probabilidades, na ordem de ``classes``.
+        :param top_k: int - Quantidade de candidatos.
+        :return: dict
+        """
+        candidates = [
+            {'description': str(label), 'probability': probability}
+            for label, probability in select_top_k(classes, proba_row, max(top_k, 1))
+        ]
+        prediction_str = candidates[0]['description'] if candidates else None
+        confidence = candidates[0]['probability'] if candidates else 0.0
+        candidates = candidates[:top_k]
+
+        logger.debug('Previsão %s com confiança %.2f para: %s', prediction_str, confidence, description)
+
+        if candidates and confidence < self.min_confidence:
+            return self.ensure_serializable({
+                'success': True,
+                'prediction': None,
+                'confidence': confidence,
+                'candidates': candidates,
+                'message': f'Baixa confiança na previsão para esta descrição (confiança: {confidence:.2f}).'
+            })
+
+        # Se a previsão for muito próxima da entrada ou None, retornamos None
+        if prediction_str is None or self.preprocess_text(prediction_str) == normalized.text:
+            return self.ensure_serializable({
+                'success': True,
+                'prediction': None,
+                'confidence': confidence,
+                'candidates': candidates,
+                'message': 'Nenhuma correção sugerida para esta descrição.'
+            })
+
+        # Garantir que a resposta seja completamente serializável
+        return self.ensure_serializable({
+            'success': True,
+            'prediction': prediction_str,
+            'confidence': confidence,
+            'candidates': candidates,
+        })
+
+    def _predict_error(self, predict_error: Exception):
+        logger.exception('Erro na previsão', extra={'user_id': self.user_id, 'type': self.type})
+        return {
+            'success': True,
+            'prediction': None,
+            'message': f'Não foi possível fazer uma previsão para esta descrição: {str(predict_error)}'
+        }
+
+    def retrain_from_feedback(self, feedbacks: list, token: str):
+        """
+        Re-treina o modelo com base nas correções feitas pelo usuário, com peso igual à quantidade de vezes que
+        cada correção aparece nos feedbacks.
+
+        :param feedbacks: uma lista de feedbacks.
+        :param token: str - Um token JWT criado pela aplicação Django que será usado na autentificação.
+        """
+        try:
+            return self.apply_feedback(feedbacks, token)
         except Exception as e:
-            traceback.print_exc()
-            print(f"Erro geral: {str(e)}")
-            # Garantir que a resposta de erro seja completamente serializável
+            logger.exception('Erro ao re-treinar modelo', extra={'user_id': self.user_id, 'type': self.type})
             return {
                 'success': False,
-                'prediction': None,
-                'message': f'Erro ao realizar predição: {str(e)}'
+                'message': f'Erro ao re-treinar modelo: {str(e)}'
             }
 
-    def retrain_from_feedback(self, feedbacks: list, token: str):
+    def apply_feedback(self, feedbacks: list, token: str):
         """
-        Re-treina o modelo com base nas correções feitas pelo usuário, usando pesos inteligentes baseados no
-        histórico de correções.
+        Aplica as correções como ``retrain_from_feedback``, propagando os erros de carga e gravação do modelo.
 
         :param feedbacks: uma lista de feedbacks.
         :param token: str - Um token JWT criado pela aplicação Django que será usado na autentificação.
         """
-        try:
-            if not feedbacks:
-                return {
-                    'success': False,
-                    'message': 'Nenhum feedback fornecido para re-treinamento.'
-                }
+        if not feedbacks:
+            return {
+                'success': False,
+                'message': 'Nenhum feedback fornecido para re-treinamento.'
+            }
 
-            self.load_model()
+        # Carrega, altera e publica sob o lock de escrita: feedbacks simultâneos do mesmo usuário são aplicados
+        # em sequência e as previsões seguem lendo a versão anterior até a publicação
+        with self.writer_lock():
+            self.load_model(use_cache=False)
 
-            correction_counts = {}  # Para contar frequência das correções
-            training_examples = []
+            corrections = Counter()  # Ocorrências de cada (descrição, correção)
 
             used_feedbacks = 0
 
             for feedback in feedbacks:
                 if not isinstance(feedback, dict):
-                    print(f"AVISO: Formato inválido de feedback: {type(feedback)}")
+                    logger.warning('Formato inválido de feedback: %s', type(feedback))
                     continue
 
                 if 'description' not in feedback or 'corrected_description' not in feedback:
-                    print("AVISO: Feedback incompleto")
+                    logger.warning('Feedback incompleto')
                     continue
 
                 if feedback['description'] != feedback['corrected_description']:
                     try:
                         description = feedback['description']
                         corrected = feedback['corrected_description']
-                        vector = self.vectorize_text(description)
+                        self.vectorize_text(description)
 
-                        # Contar correções para aplicar peso
-                        correction_counts[corrected] = correction_counts.get(corrected, 0) + 1
-                        training_examples.append((description, corrected))
+                        corrections[(description, corrected)] += 1
                         self.register_correction(description, corrected)
 
                         used_feedbacks += 1
-                    except Exception as e:
-                        print(f"Erro ao processar feedback: {e}")
+                    except Exception:
+                        logger.exception('Erro ao processar feedback')
 
             if used_feedbacks == 0:
                 return {
@@ -360,80 +552,140 @@ class DescriptionPredictor(TransactionClassifier):
                     'message': 'Nenhum feedback válido para re-treinamento.'
                 }
 
-            # Reaplicar os feedbacks com pesos (ex: feedbacks mais frequentes reforçam mais)
-            for description, corrected in training_examples:
-                vector = self.vectorize_text(description)
-                weight = correction_counts[corrected]
-                for _ in range(weight):
-                    self.model.learn_one(vector, corrected)
+            # Cada correção é aprendida uma vez, com peso igual às suas ocorrências: o peso total cresce na mesma
+            # proporção dos feedbacks, e o resultado é o mesmo com os feedbacks em lote ou um a um
+            for (description, corrected), occurrences in corrections.items():
+                vector = self.vectorize_text(description, update_vocabulary=False)
+                learn_weighted(self.model, vector, corrected, occurrences)
 
+            self.compact_if_needed()
             self.save_model()
 
-            return {
-                'success': True,
-                'message': f'{used_feedbacks} feedback(s) aplicado(s) com sucesso no modelo do usuário {self.user_id}.'
-            }
+        return {
+            'success': True,
+            'message': f'{used_feedbacks} feedback(s) aplicado(s) com sucesso no modelo do usuário {self.user_id}.'
+        }
 
-        except Exception as e:
-            traceback.print_exc()
-            return {
-                'success': False,
-                'message': f'Erro ao re-treinar modelo: {str(e)}'
-            }
+    def prune_vocabulary(self, min_count: int = 1, max_vocabulary: int = 0):
+        """
+        Remove do vocabulário e das tabelas do modelo as características menos frequentes.
 
-    def save_model(self):
+        :param min_count: int - Frequência mínima para manter uma característica.
+        :param max_vocabulary: int - Quantidade máxima de características mantidas (as mais frequentes). 0: sem
+            limite.
+        :return: int - Quantidade de características removidas.
         """
-        Salva o modelo e o vetorizador em um arquivo
+        kept = [feature for feature, count in self.vectorizer.items() if count >= min_count]
+        if max_vocabulary and len(kept) > max_vocabulary:
+            # A ordenação é estável: nos empates ficam as características vistas primeiro
+            kept = sorted(kept, key=self.vectorizer.__getitem__, reverse=True)[:max_vocabulary]
+        if len(kept) == len(self.vectorizer):
+            return 0
+
+        kept = set(kept)
+        removed = [feature for feature in self.vectorizer if feature not in kept]
+        for feature in removed:
+            del self.vectorizer[feature]
+            # O total de cada classe é a soma das contagens das características; sem a característica, o modelo fica
+            # igual ao que seria treinado sem ela
+            for label, count in self.model.feature_counts.pop(feature, {}).items():
+                self.model.class_totals[label] -= count
+        return len(removed)
+
+    def model_bytes(self):
         """
-        model_data = {
-            'model': self.model,
-            'vectorizer': self.vectorizer,
-            'correction_map': self.correction_map,
-            'preprocessing_enabled': self.preprocessing_enabled
-        }
-
-        model_path = f"training/model/{self.type}_model_user_{self.user_id}.pkl"
-        os.makedirs(os.path.dirname(model_path), exist_ok=True)
+        Estima o tamanho no arquivo (e, com o cache de modelos, na memória) das tabelas do modelo e do vocabulário.
+        O mapa de correções exatas não entra na conta, pois não é compactado.
 
-        with open(model_path, 'wb') as f:
-            pickle.dump(model_data, f)
-
-        print(f"Modelo salvo em {model_path}")
-
-    def load_model(self):
-        """
-        Carrega o modelo e o vetorizador de um arquivo
+        :return: int - Tamanho em bytes.
         """
-        model_path = f"training/model/{self.type}_model_user_{self.user_id}.pkl"
+        writer = ModelWriter(self.type)
+        write_multinomial_nb(writer, 'model', self.model)
+        write_mapping(writer, 'vectorizer', self.vectorizer)
+        return writer.size()
 
-        if not os.path.exists(model_path):
-            print(f"Modelo não encontrado em {model_path}")
-            # Criar modelo vazio
-            self.model = naive_bayes.MultinomialNB()
-            self.vectorizer = {}
-            self.correction_map = {}
-            self.preprocessing_enabled = True
-            return
+    def vocabulary_stats(self):
+        """
+        Resume o tamanho do modelo.
 
-        print(f"Carregando modelo de {model_path}")
+        :return: dict - Características no vocabulário, entradas nas tabelas do modelo e tamanho estimado em bytes.
+        """
+        return {
+            'vocabulary': len(self.vectorizer),
+            'entries': sum(len(counts) for counts in self.model.feature_counts.values()),
+            'bytes': self.model_bytes(),
+        }
 
-        with open(model_path, 'rb') as f:
-            model_data = pickle.load(f)
+    def compact(
+        self,
+        max_bytes: float = DESCRIPTION_MAX_MODEL_KB * 1024,
+        max_vocabulary: int = DESCRIPTION_MAX_VOCABULARY,
+        min_count: int = DESCRIPTION_MIN_TOKEN_COUNT,
+    ):
+        """
+        Compacta o modelo: aplica a poda configurada e, se ainda passar do orçamento, reduz o vocabulário às
+        características mais frequentes até caber. O relatório fica em ``extra_state['compaction']``.
 
-        self.model = model_data.get('model', naive_bayes.MultinomialNB())
-        self.vectorizer = model_data.get('vectorizer', {})
-        self.correction_map = model_data.get('correction_map', {})
-        self.preprocessing_enabled = model_data.get(
-            'preprocessing_enabled', True)
+        :param max_bytes: float - Orçamento do modelo e do vocabulário (ver ``model_bytes``). 0: sem orçamento.
+        :param max_vocabulary: int - Quantidade máxima de características. 0: sem limite.
+        :param min_count: int - Frequência mínima das características.
+        :return: dict - Tamanhos antes ('before') e depois ('after') da compactação.
+        """
+        before = self.vocabulary_stats()
+        self.prune_vocabulary(min_count, max_vocabulary)
+        size = self.model_bytes()
+        while max_bytes and size > max_bytes and len(self.vectorizer) > 1:
+            # O tamanho é aproximadamente proporcional ao vocabulário; a estimativa é refeita até caber
+            target = min(len(self.vectorizer) - 1, int(len(self.vectorizer) * max_bytes / size))
+            self.prune_vocabulary(max_vocabulary=max(target, 1))
+            size = self.model_bytes()
+
+        report = {'before': before, 'after': self.vocabulary_stats(), 'compacted_at': time.time()}
+        self.extra_state['compaction'] = report
+        logger.info(
+            'Modelo compactado',
+            extra={
+                'user_id': self.user_id,
+                'type': self.type,
+                'vocabulary': f'{before["vocabulary"]}->{report["after"]["vocabulary"]}',
+                'bytes': f'{before["bytes"]}->{report["after"]["bytes"]}',
+            },
+        )
+        return report
+
+    def compact_if_needed(self):
+        """
+        Compacta o modelo antes de salvar, se ele passar do orçamento (DESCRIPTION_MAX_MODEL_KB) ou do tamanho
+        máximo do vocabulário (DESCRIPTION_MAX_VOCABULARY).
 
-        print(f"Modelo carregado de {model_path}")
+        :return: dict ou None - Relatório da compactação, se houve.
+        """
+        over_vocabulary = DESCRIPTION_MAX_VOCABULARY and len(self.vectorizer) > DESCRIPTION_MAX_VOCABULARY
+        max_bytes = DESCRIPTION_MAX_MODEL_KB * 1024
+        if over_vocabulary or (max_bytes and self.model_bytes() > max_bytes):
+            return self.compact(max_bytes, DESCRIPTION_MAX_VOCABULARY, DESCRIPTION_MIN_TOKEN_COUNT)
+        return None
 
-    def delete_model(self):
+    def get_state(self):
         """
-        Remove o arquivo do modelo
+        Obtém o modelo, o vetorizador, o mapa de correções e o seu índice, que serão persistidos
         """
-        model_path = f"training/model/{self.type}_model_user_{self.user_id}.pkl"
+        return {
+            'model': self.model,
+            'vectorizer': self.vectorizer,
+            'correction_map': self.correction_map,
+            'correction_index': self.correction_index,
+            'preprocessing_enabled': self.preprocessing_enabled,
+            'extra_state': self.extra_state,
+        }
 
-        if os.path.exists(model_path):
-            os.remove(model_path)
-            print(f"Modelo excluído de {model_path}")
+    def set_state(self, data):
+        """
+        Restaura o modelo, o vetorizador, o mapa de correções e o seu índice persistidos
+        """
+        self.model = data.get('model', naive_bayes.MultinomialNB())
+        self.vectorizer = data.get('vectorizer', {})
+        self.correction_map = data.get('correction_map', {})
+        self.correction_index = data.get('correction_index') or CorrectionIndex(self.correction_map)
+        self.preprocessing_enabled = data.get('preprocessing_enabled', True)
+        self.extra_state = data.get('extra_state', {})
@@ -1,9 +1,23 @@
+import hashlib
+import json
 import logging
+import os
+import time
 
-from training.data_fetcher import get_data
+from training.data_fetcher import get_data, get_many_data, iter_pages
+from training.evaluation import PROGRESSIVE_VALIDATION_CHUNK, ProgressiveMetrics
+from training.metrics import DESCRIPTOR_INDEX_LOOKUPS, user_labels
+from training.pipelines.naive_bayes import pipeline_learn_weighted, predict_proba_batch, top_k as select_top_k
 from training.pipelines.subcategory import build_pipeline
+from training.text import normalize
 from training.transaction_classifier import TransactionClassifier
 
+SUBCATEGORY_INDEX_ENABLED = os.getenv('SUBCATEGORY_INDEX_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+# Idade máxima (em horas) do último treino completo para que o treino incremental seja usado. 0: sem limite
+SUBCATEGORY_FULL_REBUILD_HOURS = float(os.getenv('SUBCATEGORY_FULL_REBUILD_HOURS', 24))
+
+logger = logging.getLogger(__name__)
+
 
 class SubcategoryPredictor(TransactionClassifier):
     """
@@ -16,16 +30,160 @@ class SubcategoryPredictor(TransactionClassifier):
     def __init__(self, user_id):
         super().__init__(user_id)
         self.pipeline = build_pipeline()
+        # Mapeia descritor normalizado (e categoria) para a subcategoria confirmada pelo usuário
+        self.descriptor_index = {}
+        self.descriptor_conflicts = set()  # Descritores vistos com mais de uma subcategoria
+
+    def get_state(self):
+        """
+        Obtém o estado do modelo: pipeline, estado extra e índice de descritores.
+        """
+        return {
+            **super().get_state(),
+            'descriptor_index': self.descriptor_index,
+            'descriptor_conflicts': self.descriptor_conflicts,
+        }
+
+    def set_state(self, data):
+        """
+        Restaura o pipeline, o estado extra e o índice de descritores, convertendo o formato antigo do estado
+        extra (apenas o mapeamento de subcategoria para categoria) para o formato atual.
+
+        :param data: dict - Estado retornado por get_state.
+        """
+        super().set_state(data)
+        if 'subcategory_categories' not in self.extra_state:
+            self.extra_state = {'subcategory_categories': self.extra_state, 'watermark': None, 'taxonomy_hash': None}
+        self.descriptor_index = data.get('descriptor_index', {})
+        self.descriptor_conflicts = data.get('descriptor_conflicts', set())
+
+    def category_for(self, subcategory_id):
+        """
+        Obtém a categoria de uma subcategoria conhecida pelo modelo.
+
+        :param subcategory_id: Id da subcategoria.
+        :return: Id da categoria ou None.
+        """
+        return self.extra_state.get('subcategory_categories', {}).get(subcategory_id)
+
+    def model_summary(self):
+        """
+        Resume o modelo para o manifesto.
+
+        :return: dict - Exemplos aprendidos (somando os pesos), subcategorias conhecidas e validação progressiva.
+        """
+        class_counts = self.pipeline[-1].class_counts
+        return {
+            'samples': float(sum(class_counts.values())),
+            'classes': len(class_counts),
+            **self.evaluation_summary(),
+        }
+
+    @staticmethod
+    def taxonomy_hash(categories: list, subcategories: list):
+        """
+        Calcula uma assinatura do conjunto de categorias e subcategorias do usuário.
+
+        :param categories: list - Categorias retornadas pela API.
+        :param subcategories: list - Subcategorias retornadas pela API.
+        :return: str - Hash que muda quando alguma categoria ou subcategoria é criada, removida ou alterada.
+        """
+        taxonomy = (
+            sorted((category['id'], category['description']) for category in categories),
+            sorted(
+                (subcategory['id'], subcategory['description'], subcategory['category'])
+                for subcategory in subcategories
+            ),
+        )
+        return hashlib.sha1(json.dumps(taxonomy, default=str).encode('utf-8')).hexdigest()
 
-    def train(self, token: str):
+    @staticmethod
+    def descriptor_key(description: str, category: str = ''):
+        """
+        Chave do índice de descritores: descrição e categoria normalizadas.
+
+        :param description: str - Descrição do lançamento.
+        :param category: str - Descrição da categoria ('' para qualquer categoria).
+        :return: str - Chave, ou '' se a descrição não tiver nenhuma palavra.
+        """
+        descriptor = normalize(description).key
+        if not descriptor:
+            return ''
+        return f'{descriptor}\t{normalize(category).key}' if category else f'{descriptor}\t'
+
+    def index_transaction(self, description: str, category: str, subcategory_id):
+        """
+        Registra um lançamento no índice de descritores, com e sem a categoria.
+
+        Um descritor só é indexado enquanto todos os seus lançamentos tiverem a mesma subcategoria. Ao aparecer
+        com uma subcategoria diferente, ele sai do índice e passa a ser previsto pelo modelo.
+
+        :param description: str - Descrição do lançamento.
+        :param category: str - Descrição da categoria do lançamento.
+        :param subcategory_id: Id da subcategoria do lançamento.
+        """
+        for key in {self.descriptor_key(description, category), self.descriptor_key(description)}:
+            if not key or key in self.descriptor_conflicts:
+                continue
+            indexed = self.descriptor_index.setdefault(key, subcategory_id)
+            if indexed != subcategory_id:
+                del self.descriptor_index[key]
+                self.descriptor_conflicts.add(key)
+
+    def confirm_descriptor(self, description: str, category: str, subcategory_id):
+        """
+        Registra no índice a subcategoria confirmada por um feedback, que prevalece sobre o histórico.
+
+        :param description: str - Descrição do lançamento.
+        :param category: str - Descrição da categoria informada no feedback.
+        :param subcategory_id: Id da subcategoria confirmada.
+        """
+        for key in {self.descriptor_key(description, category), self.descriptor_key(description)}:
+            if key:
+                self.descriptor_index[key] = subcategory_id
+                self.descriptor_conflicts.discard(key)
+
+    def indexed_subcategory(self, example: dict):
+        """
+        Consulta o índice de descritores antes do modelo.
+
+        :param example: dict - Exemplo com 'description' e 'category'.
+        :return: Id da subcategoria confirmada ou None.
+        """
+        if not SUBCATEGORY_INDEX_ENABLED:
+            return None
+
+        subcategory_id = self.descriptor_index.get(self.descriptor_key(example['description'], example['category']))
+        # Subcategorias fora do mapeamento atual (ex: removidas) ficam a cargo do modelo
+        if subcategory_id is not None and self.category_for(subcategory_id) is None:
+            subcategory_id = None
+        DESCRIPTOR_INDEX_LOOKUPS.inc(result='miss' if subcategory_id is None else 'hit', **user_labels(self.user_id))
+        return subcategory_id
+
+    def train(self, token: str, incremental: bool = False):
         """
         Função para processar dados e treinar o modelo para o usuário
 
+        No modo incremental, se o modelo salvo foi treinado com as mesmas categorias e subcategorias, apenas os
+        lançamentos posteriores à marca d'água (maior id já aprendido) são buscados e aprendidos. Caso
+        contrário, o modelo é reconstruído do zero.
+
+        A marca d'água é um id: lançamentos editados ou reclassificados depois de aprendidos mantêm o id antigo e
+        não são reaprendidos no modo incremental. Por isso, o modelo também é reconstruído do zero quando o último
+        treino completo tem mais de SUBCATEGORY_FULL_REBUILD_HOURS horas.
+
         :param token: str - Um token JWT criado pela aplicação Django que será usado na autentificação.
+        :param incremental: bool - Se deve aprender apenas os lançamentos novos quando possível.
         """
-        categories = get_data('categories', token)
-        subcategories = get_data('subcategories', token)
-        transactions = get_data('transactions', token)
+        if incremental:
+            # O modelo publicado é carregado e estendido: o lock de escrita evita que um feedback publicado durante
+            # a atualização seja perdido. O treino completo não parte do modelo salvo e só precisa do lock ao salvar
+            with self.writer_lock():
+                return self._train(token, incremental=True)
+        return self._train(token)
+
+    def _train(self, token: str, incremental: bool = False):
+        categories, subcategories = get_many_data(['categories', 'subcategories'], token)
 
         if not categories:
             raise ValueError(
@@ -35,60 +193,235 @@ class SubcategoryPredictor(TransactionClassifier):
             raise ValueError(
                 'Não foi possível obter as subcategorias para treinar o modelo. Verifique se o token é válido'
             )
-        if not transactions:
-            raise ValueError(
-                'Não foi possível obter os lançamentos para treinar o modelo. Verifique se o token é válido'
+
+        taxonomy_hash = self.taxonomy_hash(categories, subcategories)
+        watermark = None
+
+        if incremental and self.is_trained(self.type):
+            self.load_model(use_cache=False)
+            rebuilt_at = self.extra_state.get('rebuilt_at')
+            is_recent = rebuilt_at is not None and (
+                not SUBCATEGORY_FULL_REBUILD_HOURS or time.time() - rebuilt_at < SUBCATEGORY_FULL_REBUILD_HOURS * 3600
             )
-        # Apaga o arquivo para resetar o treinamento
-        self.delete_model()
+            if self.extra_state.get('taxonomy_hash') == taxonomy_hash and is_recent:
+                watermark = self.extra_state.get('watermark')
+
+        # Sem marca d'água válida, o modelo é treinado do zero em memória e só substitui o arquivo anterior ao
+        # final do treinamento
+        is_incremental = watermark is not None
+        if not is_incremental:
+            self.pipeline = build_pipeline()
+            self.extra_state = {
+                'subcategory_categories': {subcategory['id']: subcategory['category'] for subcategory in subcategories},
+                'watermark': None,
+                'taxonomy_hash': taxonomy_hash,
+                'indexed': True,
+                'rebuilt_at': time.time(),
+            }
+            self.descriptor_index = {}
+            self.descriptor_conflicts = set()
 
+        # Modelos treinados antes do índice só passam a tê-lo no próximo treino completo: indexar apenas os
+        # lançamentos novos deixaria de fora os conflitos com o histórico
+        build_index = self.extra_state.get('indexed', False)
         self.subcategories = subcategories
-        self.extra_state = {subcategory['id']: subcategory['category'] for subcategory in subcategories}
 
         category_id_to_description = {category['id']: category['description'] for category in categories}
 
         # Primeiro: treino com base nas descrições das subcategorias
-        for subcategory in subcategories:
-            example = {
-                'description': subcategory['description'],
-                'category': category_id_to_description.get(subcategory['category'], ''),
-            }
-            target = subcategory['id']
-            self.pipeline.learn_one(example, target)
+        self.report_progress(mode='incremental' if is_incremental else 'full', subcategories=len(subcategories))
+        if not is_incremental:
+            self.report_progress(stage='subcategories')
+            for subcategory in subcategories:
+                example = {
+                    'description': subcategory['description'],
+                    'category': category_id_to_description.get(subcategory['category'], ''),
+                }
+                target = subcategory['id']
+                self.pipeline.learn_one(example, target)
 
-        # Segundo: treino com base nos lançamentos reais cadastrados na aplicação
-        for transaction in transactions:
-            example = {
-                'description': transaction['description'],
-                'category': category_id_to_description.get(transaction['category'], ''),
+        # Segundo: treino com base nos lançamentos reais cadastrados na aplicação, página por página. Cada
+        # lançamento é previsto antes de ser aprendido (validação progressiva); no modo incremental, as contagens
+        # continuam as do treino anterior
+        metrics = ProgressiveMetrics(self.extra_state.get('progressive_metrics') if is_incremental else None)
+        transaction_count = 0
+        chunk = []
+        params = {'ordering': 'id'}
+        if is_incremental:
+            params['id__gt'] = watermark
+
+        self.report_progress(stage='transactions', pages=0, transactions=0, total=None)
+        for page, total in iter_pages('transactions', token, params=params):
+            for transaction in page:
+                # Garante o filtro mesmo que o backend ignore o parâmetro id__gt
+                if is_incremental and transaction.get('id', 0) <= watermark:
+                    continue
+                example = {
+                    'description': transaction['description'],
+                    'category': category_id_to_description.get(transaction['category'], ''),
+                }
+                chunk.append((example, transaction['subcategory']))
+                if len(chunk) >= PROGRESSIVE_VALIDATION_CHUNK:
+                    self._learn_chunk(chunk, metrics, build_index)
+                    chunk = []
+                transaction_count += 1
+                if transaction.get('id') is not None:
+                    self.extra_state['watermark'] = max(self.extra_state['watermark'] or 0, transaction['id'])
+
+            self.report_progress(pages=self.progress['pages'] + 1, transactions=transaction_count, total=total)
+        self._learn_chunk(chunk, metrics, build_index)
+
+        self.extra_state['progressive_metrics'] = metrics.get_state()
+        evaluation = metrics.summary(per_class=False)
+
+        if is_incremental:
+            if transaction_count:
+                self.report_progress(stage='saving')
+                self.save_model()
+            self.report_progress(stage='done')
+            return {
+                'success': True,
+                'message': f'Modelo do usuário {self.user_id} atualizado incrementalmente '
+                f'com {transaction_count} novo(s) lançamento(s).',
+                'skipped': not transaction_count,
+                'metrics': evaluation,
             }
-            target = transaction['subcategory']
-            self.pipeline.learn_one(example, target)
 
+        if not transaction_count:
+            raise ValueError(
+                'Não foi possível obter os lançamentos para treinar o modelo. Verifique se o token é válido'
+            )
+
+        self.report_progress(stage='saving')
         self.save_model()
+        self.report_progress(stage='done')
 
         return {
             'success': True,
             'message': f'Modelo do usuário {self.user_id} treinado com sucesso! '
             f'com {len(subcategories)} subcategorias '
-            f'e {len(transactions)} lançamentos.',
+            f'e {transaction_count} lançamentos.',
+            'metrics': evaluation,
         }
 
-    def predict(self, description: str, category: str = ''):
+    def _learn_chunk(self, chunk: list, metrics: ProgressiveMetrics, build_index: bool):
+        """
+        Aprende um bloco de lançamentos, depois de prevê-los de uma só vez (validação progressiva).
+
+        :param chunk: list[tuple] - (exemplo, subcategoria) de cada lançamento.
+        :param metrics: ProgressiveMetrics - Contagens da validação progressiva.
+        :param build_index: bool - Se os lançamentos também entram no índice de descritores.
+        """
+        if not chunk:
+            return
+        vectors = [self.pipeline._transform_one(example)[0] for example, _ in chunk]
+        metrics.update_many([target for _, target in chunk], *predict_proba_batch(self.pipeline[-1], vectors))
+        for example, target in chunk:
+            self.pipeline.learn_one(example, target)
+            if build_index:
+                self.index_transaction(example['description'], example['category'], target)
+
+    def _predict_one(self, description: str, category: str = '', top_k: int = 1):
         """
         Faz uma previsão de categoria e subcategoria para uma descrição dada.
 
         :param description: Descrição da transação.
         :param category: (Opcional) Categoria informada pelo usuário.
-        :return: dicionário com IDs previstos de categoria e subcategoria.
+        :param top_k: Quantidade de subcategorias candidatas.
+        :return: dicionário com IDs previstos de categoria e subcategoria, confiança e candidatos.
+        """
+        return self._predict([{'description': description, 'category': category or ''}], top_k)[0]
+
+    def _predict_many(self, transactions: list, top_k: int = 1):
+        """
+        Faz a previsão de categoria e subcategoria para vários lançamentos em uma única passada pelo modelo.
+
+        :param transactions: Lista de objetos Transaction.
+        :param top_k: Quantidade de subcategorias candidatas por lançamento.
+        :return: lista de dicionários com IDs previstos de categoria e subcategoria, confiança e candidatos.
         """
-        self.load_model()
+        examples = [{'description': t.description, 'category': t.category or ''} for t in transactions]
+        return self._predict(examples, top_k)
 
-        example = {'description': description, 'category': category}
-        predicted_subcategory_id = self.pipeline.predict_one(example)
-        predicted_category_id = self.extra_state.get(predicted_subcategory_id)
+    def _predict(self, examples: list[dict], top_k: int = 1):
+        """
+        Resolve pelo índice de descritores os exemplos já confirmados e pontua os demais com o modelo.
+
+        Com ``top_k`` maior que 1, os exemplos indexados também são pontuados, para completar a lista de
+        candidatos; a subcategoria confirmada vem sempre em primeiro lugar.
+
+        :param examples: list[dict] - Exemplos com 'description' e 'category'.
+        :param top_k: int - Quantidade de candidatos por exemplo.
+        :return: list[dict]
+        """
+        indexed = [self.indexed_subcategory(example) for example in examples]
+        positions = [i for i, subcategory_id in enumerate(indexed) if subcategory_id is None or top_k > 1]
+
+        results = [None] * len(examples)
+        for i, result in zip(positions, self._score([examples[i] for i in positions], top_k)):
+            results[i] = result
+
+        for i, subcategory_id in enumerate(indexed):
+            if subcategory_id is not None:
+                results[i] = self._indexed_result(subcategory_id, results[i], top_k)
+        return results
+
+    def _indexed_result(self, subcategory_id, scored: dict = None, top_k: int = 1):
+        """
+        Monta a previsão de um exemplo encontrado no índice de descritores.
+
+        :param subcategory_id: Id da subcategoria confirmada.
+        :param scored: dict (opcional) - Previsão do modelo, usada para completar os candidatos.
+        :param top_k: int - Quantidade de candidatos.
+        :return: dict
+        """
+        category_id = self.category_for(subcategory_id)
+        candidates = [{'subcategory_id': subcategory_id, 'category_id': category_id, 'probability': 1.0}]
+        if scored:
+            candidates += [c for c in scored['candidates'] if c['subcategory_id'] != subcategory_id]
+        return {
+            'subcategory_id': subcategory_id,
+            'category_id': category_id,
+            'confidence': 1.0,
+            'candidates': candidates[:top_k],
+            'source': 'index',
+        }
 
-        return {'subcategory_id': predicted_subcategory_id, 'category_id': predicted_category_id}
+    def _score(self, examples: list[dict], top_k: int = 1):
+        """
+        Pontua os exemplos com uma única passada pelo modelo e monta as previsões com os ``top_k`` candidatos.
+
+        As probabilidades são as mesmas de ``predict_proba_one`` e a subcategoria prevista é a de maior
+        probabilidade, como em ``predict_one``. A categoria de cada candidato vem do mapeamento salvo no treino.
+
+        :param examples: list[dict] - Exemplos com 'description' e 'category'.
+        :param top_k: int - Quantidade de candidatos por exemplo.
+        :return: list[dict]
+        """
+        vectors = [self.pipeline._transform_one(example)[0] for example in examples]
+        classes, proba = predict_proba_batch(self.pipeline[-1], vectors)
+
+        results = []
+        for row in proba:
+            candidates = [
+                {
+                    'subcategory_id': subcategory_id,
+                    'category_id': self.category_for(subcategory_id),
+                    'probability': probability,
+                }
+                for subcategory_id, probability in select_top_k(classes, row, max(top_k, 1))
+            ]
+            best = candidates[0] if candidates else {'subcategory_id': None, 'category_id': None, 'probability': 0.0}
+            results.append(
+                {
+                    'subcategory_id': best['subcategory_id'],
+                    'category_id': best['category_id'],
+                    'confidence': best['probability'],
+                    'candidates': candidates[:top_k],
+                    'source': 'model',
+                }
+            )
+        return results
 
     def retrain_from_feedback(self, feedbacks: list, token: str):
         """
@@ -98,39 +431,44 @@ class SubcategoryPredictor(TransactionClassifier):
         :param feedbacks: uma lista de feedbacks.
         :param token: str - Um token JWT criado pela aplicação Django que será usado na autentificação.
         """
-        self.load_model()
-
         categories = get_data('categories', token)
         category_id_to_description = {category['id']: category['description'] for category in categories}
 
-        for feedback in feedbacks:
-            description = feedback['description']
-            predicted_subcategory = feedback.get('predicted_subcategory_id')
-            corrected_category = feedback.get('corrected_category_id')
-            corrected_subcategory = feedback.get('corrected_subcategory_id')
+        # O modelo é carregado, alterado e publicado sob o lock de escrita para que dois feedbacks simultâneos
+        # não sobrescrevam as atualizações um do outro; as previsões seguem lendo a versão anterior
+        with self.writer_lock():
+            self.load_model(use_cache=False)
 
-            # Verifica se é uma correção real
-            is_correction = predicted_subcategory != corrected_subcategory
+            for feedback in feedbacks:
+                description = feedback['description']
+                predicted_subcategory = feedback.get('predicted_subcategory_id')
+                corrected_category = feedback.get('corrected_category_id')
+                corrected_subcategory = feedback.get('corrected_subcategory_id')
 
-            if description and corrected_category and corrected_subcategory:
-                if is_correction:
-                    # É uma correção, então o peso é 50 vezes maior
-                    weight = 50
-                else:
-                    # Se não é uma correção, não precisa retreinar.
-                    weight = 0
+                # Verifica se é uma correção real
+                is_correction = predicted_subcategory != corrected_subcategory
 
-                if weight > 0:
+                if description and corrected_category and corrected_subcategory:
                     category_description = category_id_to_description.get(corrected_category, '')
-                    example = {'description': description, 'category': category_description}
+                    if self.extra_state.get('indexed'):
+                        self.confirm_descriptor(description, category_description, corrected_subcategory)
 
-                    logging.info('Treinando exemplo %s com peso %d', description, weight)
-                    for _ in range(weight):
-                        self.pipeline.learn_one(example, corrected_subcategory)
-            else:
-                logging.warning('Dados incompletos no feedback %d: ignorado', feedback['id'])
+                    if is_correction:
+                        # É uma correção, então o peso é 50 vezes maior
+                        weight = 50
+                    else:
+                        # Se não é uma correção, não precisa retreinar.
+                        weight = 0
 
-        self.save_model()
+                    if weight > 0:
+                        example = {'description': description, 'category': category_description}
+
+                        logger.debug('Treinando exemplo %s com peso %d', description, weight)
+                        pipeline_learn_weighted(self.pipeline, example, corrected_subcategory, weight)
+                else:
+                    logger.warning('Dados incompletos no feedback %s: ignorado', feedback.get('id'))
+
+            self.save_model()
         return {
             'success': True,
             'message': f'Modelo treinado com sistema de pesos inteligente para o usuário {self.user_id}!',
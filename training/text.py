@@ -0,0 +1,52 @@
+"""
+Normalização das descrições dos lançamentos.
+
+A normalização (minúsculas, remoção de acentos e separação em palavras) é feita uma única vez por texto e o
+resultado fica em um cache LRU limitado, compartilhado pelo treinamento e pela previsão. Como as mesmas
+descrições se repetem muito (estabelecimentos recorrentes), a maior parte das chamadas é atendida pelo cache.
+"""
+
+import os
+import unicodedata
+from functools import lru_cache
+from typing import NamedTuple
+
+TEXT_NORMALIZATION_CACHE_SIZE = int(os.getenv('TEXT_NORMALIZATION_CACHE_SIZE', 50000))
+
+
+class NormalizedText(NamedTuple):
+    """Formas normalizadas de uma descrição."""
+
+    text: str  # Texto em minúsculas e sem acentos
+    tokens: tuple  # Palavras do texto normalizado
+    key: str  # Palavras unidas por um único espaço (chave do mapa de correções)
+
+
+@lru_cache(maxsize=TEXT_NORMALIZATION_CACHE_SIZE)
+def normalize(text: str, strip_accents: bool = True) -> NormalizedText:
+    """
+    Normaliza uma descrição.
+
+    :param text: str - Descrição original.
+    :param strip_accents: bool - Se deve converter para minúsculas e remover os acentos. Se False, apenas
+        separa as palavras.
+    :return: NormalizedText
+    """
+    if strip_accents:
+        text = unicodedata.normalize('NFKD', text.lower()).encode('ASCII', 'ignore').decode('ASCII')
+
+    tokens = tuple(text.split())
+    return NormalizedText(text, tokens, ' '.join(tokens))
+
+
+def cache_stats():
+    """Retorna os contadores do cache de normalização."""
+    info = normalize.cache_info()
+    lookups = info.hits + info.misses
+    return {
+        'entries': info.currsize,
+        'max_entries': info.maxsize,
+        'hits': info.hits,
+        'misses': info.misses,
+        'hit_rate': info.hits / lookups if lookups else 0.0,
+    }
@@ -1,37 +1,84 @@
+import fcntl
+import logging
 import os
 import pickle
+import time
 from abc import ABC, abstractmethod
+from contextlib import contextmanager
 from datetime import datetime
 
+from pydantic import ValidationError
+
+from schemas.transaction import Transaction
+from training.evaluation import ProgressiveMetrics
+from training.metrics import (
+    MODEL_LOAD_BYTES,
+    MODEL_LOAD_SECONDS,
+    MODEL_SAVE_BYTES,
+    MODEL_SAVE_SECONDS,
+    PREDICT_BATCH_SIZE,
+    PREDICT_SECONDS,
+    PREDICTION_CACHE_LOOKUPS,
+    user_labels,
+)
+from training.manifest import manifest_for
+from training.model_cache import file_signature, model_cache
+from training.model_format import legacy_path, load_state, read_model_version, save_state
+from training.model_store import claim_retrain, cold_path, flat_path, is_evicted, model_path, record_usage
+from training.prediction_cache import prediction_cache
+from training.text import normalize
+
+logger = logging.getLogger(__name__)
+
 
 class TransactionClassifier(ABC):
     """
     Classe responsável por fazer o treinamento ou a predição
     """
 
-    debug = True
     type = None
 
     def __init__(self, user_id):
         self.user_id = user_id
         self.model_dir = os.path.join('training', 'model')
         self.extra_state = {}
+        self.progress = {}
+        self.progress_callback = None
+        self.model_version = 0
+        self._writer_lock_depth = 0
+        self._writer_lock_file = None
+
+    @property
+    def manifest(self):
+        """Manifesto do diretório de modelos (ver training.manifest)."""
+        return manifest_for(self.model_dir)
 
     def status(self):
-        """Obtém o status de treinamento dos modelos."""
+        """
+        Obtém o status de treinamento dos modelos, consultando o manifesto.
+
+        Um modelo sem registro no manifesto (ex: pickle antigo ainda não convertido ou manifesto perdido) é
+        procurado nos arquivos, com a data de modificação do arquivo.
+        """
         predictors_info = []
         predictor_names = ['subcategory', 'description']
+        try:
+            models = self.manifest.for_user(self.user_id)
+        except Exception:
+            logger.exception('Erro ao consultar o manifesto', extra={'user_id': self.user_id})
+            models = {}
 
         for name in predictor_names:
-            is_trained = self.is_trained(name)
-            date = self.get_file_modification_date(name)
+            model = models.get(name)
+            saved_at = model['saved_at'] if model else self._stored_mtime(name)
             predictors_info.append(
                 {
                     'ai': 'Transaction Classifier',
                     'name': name,
                     'description': f'{name.capitalize()} Predictor',
-                    'status': 'Treinado' if is_trained else 'Não treinado',
-                    'date': date,
+                    'status': 'Treinado' if saved_at is not None else 'Não treinado',
+                    'date': datetime.fromtimestamp(saved_at).strftime('%Y-%m-%d') if saved_at is not None else None,
+                    'model': model,
                 }
             )
 
@@ -41,87 +88,491 @@ class TransactionClassifier(ABC):
             'data': predictors_info,
         }
 
+    def get_model_path(self, type=None):
+        """Obtém o caminho do arquivo do modelo (ver training.model_store).
+
+        :param type: (Opcional) Tipo do modelo ('subcategory' ou 'description'). Padrão: o tipo do preditor.
+        :return: Caminho do arquivo do modelo do usuário.
+        """
+        return model_path(self.model_dir, type or self.type, self.user_id)
+
+    def stored_paths(self, type=None):
+        """
+        Lista os outros lugares onde o modelo pode estar, na ordem em que são procurados pelo ``load_model``.
+
+        :param type: (Opcional) Tipo do modelo. Padrão: o tipo do preditor.
+        :return: list[str] - Armazenamento frio, layout sem shards e pickle antigo.
+        """
+        flat = flat_path(self.model_dir, type or self.type, self.user_id)
+        return [cold_path(self.model_dir, type or self.type, self.user_id), flat, legacy_path(flat)]
+
+    def _stored_mtime(self, type):
+        for path in [self.get_model_path(type), *self.stored_paths(type)]:
+            if os.path.exists(path):
+                return os.path.getmtime(path)
+        return None
+
     def is_trained(self, type):
-        """Verifica se um modelo salvo existe.
+        """Verifica se um modelo salvo existe (em uso, no armazenamento frio, no layout antigo ou em pickle).
 
         :param type: Tipo do modelo ('subcategory' ou 'description').
         :return: True se o modelo existe, False caso contrário.
         """
-        filepath = os.path.join(self.model_dir, f'{type}_model_user_{self.user_id}.pkl')
-        return os.path.exists(filepath)
+        return any(os.path.exists(path) for path in [self.get_model_path(type), *self.stored_paths(type)])
 
-    def get_file_modification_date(self, type):
-        """Obtém a data de modificação do arquivo do modelo.
+    def is_evicted(self):
+        """Verifica se o modelo foi removido pela política de armazenamento e precisa ser treinado de novo."""
+        return is_evicted(self.model_dir, self.user_id, self.type)
 
-        :param type: Tipo do modelo ('subcategory' ou 'description').
-        :return: Data de modificação no formato 'YYYY-MM-DD' ou None se o arquivo não existir.
+    def claim_retrain(self):
+        """Reserva o novo treinamento de um modelo removido, no máximo um a cada MODEL_RETRAIN_BACKOFF segundos."""
+        return claim_retrain(self.model_dir, self.user_id, self.type)
+
+    def model_summary(self):
+        """
+        Resume o modelo para o manifesto.
+
+        :return: dict - 'samples' (exemplos aprendidos, somando os pesos) e 'classes' (classes conhecidas).
+        """
+        return {}
+
+    def evaluation_summary(self):
+        """
+        Resume a validação progressiva do último treinamento para o manifesto (ver training.evaluation).
+
+        :return: dict - 'evaluated', 'accuracy', 'macro_f1' e 'class_metrics', ou vazio se o modelo não tiver
+            sido avaliado.
+        """
+        state = self.extra_state.get('progressive_metrics')
+        if not state:
+            return {}
+        summary = ProgressiveMetrics(state).summary()
+        summary['class_metrics'] = summary.pop('per_class')
+        return summary
+
+    def report_progress(self, **counters):
+        """
+        Atualiza os contadores de progresso do treinamento e notifica o callback, se houver.
+
+        :param counters: Contadores a atualizar (ex: stage, pages, transactions, total).
+        """
+        self.progress.update(counters)
+        if self.progress_callback:
+            self.progress_callback(dict(self.progress))
+
+    def get_state(self):
+        """
+        Obtém o estado do modelo que será persistido.
+        O estado padrão inclui o pipeline treinado e o mapeamento de subcategoria para categoria.
+        """
+        return {'pipeline': self.pipeline, 'extra_state': self.extra_state}
+
+    def set_state(self, data):
+        """
+        Restaura o estado do modelo a partir dos dados persistidos.
+
+        :param data: dict - Estado retornado por get_state.
+        """
+        self.pipeline = data['pipeline']
+        self.extra_state = data.get('extra_state', {})
+
+    @contextmanager
+    def writer_lock(self):
         """
+        Garante um único escritor por (usuário, preditor), entre threads e processos.
+
+        Só quem altera o modelo precisa do lock: as previsões leem sempre um snapshot imutável, pois cada versão é
+        publicada com uma renomeação atômica. O lock é reentrante dentro da mesma instância, de modo que
+        ``save_model`` pode ser chamado por quem já o detém (ex: ``retrain_from_feedback``).
+        """
+        if self._writer_lock_depth:
+            self._writer_lock_depth += 1
+            try:
+                yield
+            finally:
+                self._writer_lock_depth -= 1
+            return
+
+        lock_path = f'{self.get_model_path()}.lock'
+        os.makedirs(os.path.dirname(lock_path), exist_ok=True)
+        while True:
+            lock_file = open(lock_path, 'a')
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            # A manutenção (training.model_store) apaga locks sem uso: se o arquivo foi trocado enquanto este
+            # aguardava, o lock obtido não vale mais e é preciso abrir o novo
+            try:
+                if os.stat(lock_path).st_ino == os.fstat(lock_file.fileno()).st_ino:
+                    break
+            except FileNotFoundError:
+                pass
+            lock_file.close()
         try:
-            filepath = os.path.join(self.model_dir, f'{type}_model_user_{self.user_id}.pkl')
-            modification_time = os.path.getmtime(filepath)
-            return datetime.fromtimestamp(modification_time).strftime('%Y-%m-%d')
-        except FileNotFoundError:
-            return None
+            self._writer_lock_file = lock_file
+            self._writer_lock_depth = 1
+            try:
+                yield
+            finally:
+                self._writer_lock_depth = 0
+                self._writer_lock_file = None
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+        finally:
+            lock_file.close()
 
     def save_model(self):
         """
-        Salva o modelo treinado para o usuário atual como um arquivo pickle.
-        O modelo inclui o pipeline treinado e o mapeamento de subcategoria para categoria.
+        Publica o modelo do usuário atual no formato compacto (ver training.model_format).
+
+        O arquivo é gravado ao lado do atual e trocado por uma renomeação atômica, recebendo a versão seguinte à
+        publicada no disco. Quem estiver lendo a versão anterior continua com ela até recarregar. Um treino completo
+        de um modelo que estava no armazenamento frio ou no layout antigo substitui essas cópias.
         """
-        os.makedirs(self.model_dir, exist_ok=True)
-        filepath = os.path.join(self.model_dir, f'{self.type}_model_user_{self.user_id}.pkl')
-        with open(filepath, 'wb') as f:
-            pickle.dump({'pipeline': self.pipeline, 'extra_state': self.extra_state}, f)
+        filepath = self.get_model_path()
+        stale_paths = self.stored_paths()[:2]
 
-        if self.debug:
-            print(f'Modelo salvo em {filepath}')
+        with self.writer_lock():
+            start = time.perf_counter()
+            os.makedirs(os.path.dirname(filepath), exist_ok=True)
+            model_version = max(read_model_version(path) for path in [filepath, *stale_paths]) + 1
+            size = save_state(filepath, self.type, self.get_state(), model_version=model_version)
+            for path in stale_paths:
+                if os.path.exists(path):
+                    os.remove(path)
+            self.model_version = model_version
+            model_cache.invalidate((self.user_id, self.type))
+            prediction_cache.invalidate(self.user_id, self.type)
+            self._update_manifest(self.manifest.record, model_version, size, **self.model_summary())
+            seconds = time.perf_counter() - start
+
+        MODEL_SAVE_SECONDS.observe(seconds, type=self.type, **user_labels(self.user_id))
+        MODEL_SAVE_BYTES.observe(size, type=self.type, **user_labels(self.user_id))
+        logger.info(
+            'Modelo salvo',
+            extra={
+                'user_id': self.user_id,
+                'type': self.type,
+                'version': model_version,
+                'bytes': size,
+                'seconds': round(seconds, 6),
+            },
+        )
 
     def delete_model(self):
         """
-        Apaga o arquivo do modelo treinado, se existir
+        Apaga o arquivo do modelo treinado (e as cópias no armazenamento frio ou no layout antigo), se existir
+        """
+        with self.writer_lock():
+            for path in [self.get_model_path(), *self.stored_paths()]:
+                if os.path.exists(path):
+                    os.remove(path)
+            model_cache.invalidate((self.user_id, self.type))
+            prediction_cache.invalidate(self.user_id, self.type)
+            self._update_manifest(self.manifest.remove)
+        self.model_version = 0
+
+    def restore_model(self):
         """
-        filepath = os.path.join(self.model_dir, f'{self.type}_model_user_{self.user_id}.pkl')
+        Traz para o caminho em uso um modelo que está em outro lugar: no armazenamento frio (descomprimido, com a
+        compressão padrão), no layout sem shards ou ainda em pickle.
 
-        if os.path.exists(filepath):
+        :return: True se o modelo está disponível no caminho em uso, False caso contrário.
+        """
+        filepath = self.get_model_path()
+        cold, flat, pickle_path = self.stored_paths()
+        # Sem nenhuma cópia, o lock nem é criado: a maioria das chamadas vem de usuários sem modelo
+        if not any(os.path.exists(path) for path in (cold, flat, pickle_path)):
+            return False
+
+        with self.writer_lock():
+            # Outro processo pode ter restaurado o modelo enquanto este aguardava o lock
+            if os.path.exists(filepath):
+                return True
+            if os.path.exists(cold):
+                state = load_state(cold, self.type)
+                size = save_state(filepath, self.type, state, model_version=state['model_version'])
+                os.remove(cold)
+            elif os.path.exists(flat):
+                os.replace(flat, filepath)
+                size = os.path.getsize(filepath)
+            else:
+                return self.migrate_legacy_model()
+            self._update_manifest(self.manifest.set_storage, 'hot', size)
+
+        logger.info('Modelo restaurado', extra={'user_id': self.user_id, 'type': self.type, 'bytes': size})
+        return True
+
+    def move_to_cold(self):
+        """
+        Move o modelo para o armazenamento frio, regravado com zlib (chamado pela política de inatividade).
+
+        :return: int - Bytes liberados no disco (0 se o modelo não estava em uso).
+        """
+        filepath = self.get_model_path()
+        cold = self.stored_paths()[0]
+
+        with self.writer_lock():
+            if not os.path.exists(filepath):
+                return 0
+            state = load_state(filepath, self.type)
+            os.makedirs(os.path.dirname(cold), exist_ok=True)
+            size = save_state(cold, self.type, state, compression='zlib', model_version=state['model_version'])
+            freed = os.path.getsize(filepath) - size
             os.remove(filepath)
+            model_cache.invalidate((self.user_id, self.type))
+            self._update_manifest(self.manifest.set_storage, 'cold', size)
+
+        logger.info('Modelo movido para o armazenamento frio', extra={'user_id': self.user_id, 'type': self.type})
+        return freed
+
+    def evict_model(self):
+        """
+        Remove o modelo para liberar disco, mantendo-o no manifesto como 'evicted' para ser treinado de novo no
+        próximo uso (chamado pela política de orçamento de disco).
+
+        :return: int - Bytes liberados no disco.
+        """
+        with self.writer_lock():
+            freed = 0
+            for path in [self.get_model_path(), *self.stored_paths()]:
+                if os.path.exists(path):
+                    freed += os.path.getsize(path)
+                    os.remove(path)
+            model_cache.invalidate((self.user_id, self.type))
+            prediction_cache.invalidate(self.user_id, self.type)
+            self._update_manifest(self.manifest.set_storage, 'evicted', 0)
+        self.model_version = 0
+
+        logger.info('Modelo removido', extra={'user_id': self.user_id, 'type': self.type, 'bytes': freed})
+        return freed
 
-    def load_model(self):
+    def _update_manifest(self, method, *args, **kwargs):
+        # O manifesto é derivado dos arquivos (e pode ser reconstruído): uma falha nele não desfaz a gravação
+        try:
+            method(self.user_id, self.type, *args, **kwargs)
+        except Exception:
+            logger.exception('Erro ao atualizar o manifesto', extra={'user_id': self.user_id, 'type': self.type})
+
+    def migrate_legacy_model(self, keep_legacy: bool = False):
+        """
+        Converte o pickle antigo do modelo para o formato compacto, se existir.
+
+        :param keep_legacy: bool - Mantém o arquivo pickle após a conversão.
+        :return: True se um modelo foi convertido, False caso contrário.
+        """
+        pickle_path = self.stored_paths()[2]
+
+        with self.writer_lock():
+            # Outro processo pode ter feito a conversão enquanto este aguardava o lock
+            if not os.path.exists(pickle_path):
+                return os.path.exists(self.get_model_path())
+
+            with open(pickle_path, 'rb') as f:
+                self.set_state(pickle.load(f))
+            self.save_model()
+            if not keep_legacy:
+                os.remove(pickle_path)
+
+        logger.info('Modelo migrado do pickle', extra={'user_id': self.user_id, 'type': self.type, 'path': pickle_path})
+        return True
+
+    def load_model(self, use_cache=True, track_usage=True):
         """
         Carrega o modelo treinado de um arquivo, se existir.
+
+        Os modelos carregados ficam no cache do processo e são compartilhados entre as requisições como snapshots
+        somente leitura. Quem for alterar o modelo (ex: re-treino por feedback) deve fazê-lo dentro de
+        ``writer_lock`` e usar ``use_cache=False`` para obter uma cópia própria, que vira a próxima versão ao ser
+        salva.
+
+        :param use_cache: bool - Se o cache de modelos do processo deve ser consultado e alimentado.
+        :param track_usage: bool - Se o carregamento conta como uso do modelo no manifesto (ver
+            training.model_store). O pré-carregamento do aquecimento não conta.
         """
-        filepath = os.path.join(self.model_dir, f'{self.type}_model_user_{self.user_id}.pkl')
+        key = (self.user_id, self.type)
+        filepath = self.get_model_path()
+        labels = {'type': self.type, **user_labels(self.user_id)}
+        start = time.perf_counter()
 
-        if os.path.exists(filepath):
-            with open(filepath, 'rb') as f:
-                data = pickle.load(f)
-                self.pipeline = data['pipeline']
-                self.extra_state = data.get('extra_state', {})
-            if self.debug:
-                print(f'Modelo carregado de {filepath}')
-        else:
-            if self.debug:
-                print(f'Nenhum modelo salvo encontrado em {filepath}')
+        if track_usage:
+            record_usage(self.model_dir, self.user_id, self.type)
+        if use_cache:
+            data = model_cache.get(key, filepath)
+            if data is not None:
+                self.set_state(data)
+                self.model_version = data.get('model_version', 0)
+                MODEL_LOAD_SECONDS.observe(time.perf_counter() - start, source='cache', **labels)
+                return
 
-    @abstractmethod
-    def train(self, token: str):
-        """Processa dados e treina o modelo para o usuário.
+        signature = file_signature(filepath)
+        if signature is None:
+            if not self.restore_model():
+                logger.debug('Nenhum modelo salvo encontrado', extra={'user_id': self.user_id, 'type': self.type})
+                return
+            signature = file_signature(filepath)
 
-        :param token: Token JWT para autenticação e acesso aos dados do usuário.
-        :raises NotImplementedError: Se não implementado na subclasse.
+        # A assinatura é obtida antes da leitura: se uma nova versão for publicada no meio do caminho, a entrada
+        # do cache fica desatualizada e é descartada na próxima consulta
+        data = load_state(filepath, self.type)
+        self.set_state(data)
+        self.model_version = data.get('model_version', 0)
+
+        if use_cache:
+            model_cache.put(key, signature, data, signature[2])
+
+        seconds = time.perf_counter() - start
+        MODEL_LOAD_SECONDS.observe(seconds, source='disk', **labels)
+        MODEL_LOAD_BYTES.observe(signature[2], **labels)
+        logger.debug(
+            'Modelo carregado do disco',
+            extra={
+                'user_id': self.user_id,
+                'type': self.type,
+                'version': self.model_version,
+                'seconds': round(seconds, 6),
+            },
+        )
+
+    def predict(self, description: str, category: str = None, top_k: int = 1) -> dict:
+        """Prevê o resultado para uma descrição, carregando o modelo do usuário.
+
+        :param description: Descrição da transação.
+        :param category: (Opcional) Categoria informada pelo usuário.
+        :param top_k: Quantidade de candidatos retornados em 'candidates', com suas probabilidades.
+        :return: Dicionário com a previsão do preditor.
         """
-        raise NotImplementedError
+        with PREDICT_SECONDS.time(type=self.type, mode='single', **user_labels(self.user_id)):
+            self.load_model()
+            return self._predict_cached(description, category, top_k)
+
+    def predict_many(self, transactions: list, top_k: int = 1, reload: bool = True) -> list[dict]:
+        """Prevê o resultado para vários lançamentos carregando o modelo uma única vez.
+
+        Todos os lançamentos são validados antes de qualquer previsão, de modo que um item inválido
+        interrompe o lote sem custo de inferência.
+
+        :param transactions: Lista de objetos Transaction ou de dicionários no mesmo formato.
+        :param top_k: Quantidade de candidatos retornados em cada previsão.
+        :param reload: Se False, usa o modelo já carregado, sem consultar o cache de modelos (ex: os lotes de uma
+            mesma importação em streaming são previstos com a mesma versão do modelo).
+        :return: Lista de previsões, na mesma ordem da entrada.
+        :raises ValueError: Se algum lançamento for inválido.
+        """
+        rows = []
+        for index, transaction in enumerate(transactions):
+            try:
+                rows.append(Transaction.model_validate(transaction))
+            except ValidationError as e:
+                raise ValueError(f'Lançamento inválido na posição {index}: {e}') from e
+
+        if not rows:
+            return []
+
+        labels = {'type': self.type, **user_labels(self.user_id)}
+        PREDICT_BATCH_SIZE.observe(len(rows), **labels)
+        with PREDICT_SECONDS.time(mode='batch', **labels):
+            if reload:
+                self.load_model()
+            return self._predict_many_cached(rows, top_k)
+
+    def prediction_key(self, description: str, category: str = None, top_k: int = 1):
+        """Chave de uma previsão no cache de previsões, para a versão do modelo carregada.
+
+        Descrições com a mesma forma normalizada compartilham a previsão.
+
+        :param description: Descrição da transação.
+        :param category: (Opcional) Categoria informada pelo usuário.
+        :param top_k: Quantidade de candidatos.
+        :return: tuple
+        """
+        description_key, category_key = normalize(description).key, normalize(category or '').key
+        return prediction_cache.key(self.user_id, self.type, self.model_version, description_key, category_key, top_k)
+
+    def _predict_cached(self, description: str, category: str = None, top_k: int = 1) -> dict:
+        """Prevê o resultado para uma descrição com o modelo já carregado, consultando o cache de previsões.
+
+        :param description: Descrição da transação.
+        :param category: (Opcional) Categoria informada pelo usuário.
+        :param top_k: Quantidade de candidatos.
+        :return: Dicionário com a previsão do preditor.
+        """
+        if not prediction_cache.enabled:
+            return self._predict_one(description, category, top_k)
+
+        key = self.prediction_key(description, category, top_k)
+        result = prediction_cache.get(key)
+        PREDICTION_CACHE_LOOKUPS.inc(result='miss' if result is None else 'hit', type=self.type)
+        if result is None:
+            result = self._predict_one(description, category, top_k)
+            self._cache_prediction(key, result)
+        return dict(result)
+
+    def _predict_many_cached(self, transactions: list[Transaction], top_k: int = 1) -> list[dict]:
+        """Prevê o resultado para vários lançamentos com o modelo já carregado, consultando o cache de previsões.
+
+        Apenas os lançamentos ausentes do cache vão para ``_predict_many``, e descrições repetidas no lote são
+        previstas uma única vez.
+
+        :param transactions: Lista de objetos Transaction.
+        :param top_k: Quantidade de candidatos.
+        :return: Lista de previsões, na mesma ordem da entrada.
+        """
+        if not prediction_cache.enabled:
+            return self._predict_many(transactions, top_k)
+
+        keys = [self.prediction_key(t.description, t.category, top_k) for t in transactions]
+        results = [prediction_cache.get(key) for key in keys]
+
+        misses = {}
+        for index, (key, result) in enumerate(zip(keys, results)):
+            if result is None:
+                misses.setdefault(key, []).append(index)
+        hits = sum(result is not None for result in results)
+        PREDICTION_CACHE_LOOKUPS.inc(hits, result='hit', type=self.type)
+        PREDICTION_CACHE_LOOKUPS.inc(len(results) - hits, result='miss', type=self.type)
+
+        if misses:
+            predicted = self._predict_many([transactions[indexes[0]] for indexes in misses.values()], top_k)
+            for (key, indexes), result in zip(misses.items(), predicted):
+                self._cache_prediction(key, result)
+                for index in indexes:
+                    results[index] = result
+
+        return [dict(result) for result in results]
+
+    @staticmethod
+    def _cache_prediction(key: tuple, result: dict):
+        # Previsões com erro não são guardadas, para que a próxima requisição tente novamente
+        if result.get('success', True):
+            prediction_cache.put(key, result)
 
     @abstractmethod
-    def predict(self, description: str, category: str = None) -> dict:
-        """Prevê categoria e subcategoria para uma descrição.
+    def _predict_one(self, description: str, category: str = None, top_k: int = 1) -> dict:
+        """Prevê o resultado para uma descrição com o modelo já carregado.
+
+        O modelo deve ser pontuado uma única vez, produzindo a previsão, a confiança e os ``top_k`` candidatos.
 
         :param description: Descrição da transação.
         :param category: (Opcional) Categoria informada pelo usuário.
-        :return: Dicionário com IDs previstos de categoria e subcategoria.
+        :param top_k: Quantidade de candidatos.
+        :return: Dicionário com a previsão do preditor.
         :raises NotImplementedError: Se não implementado na subclasse.
         """
         raise NotImplementedError
 
+    def _predict_many(self, transactions: list[Transaction], top_k: int = 1) -> list[dict]:
+        """Prevê o resultado para vários lançamentos já validados com o modelo já carregado.
+
+        A implementação padrão apenas itera sobre ``_predict_one``; as subclasses podem sobrescrever
+        para pontuar o lote de uma só vez.
+
+        :param transactions: Lista de objetos Transaction.
+        :param top_k: Quantidade de candidatos.
+        :return: Lista de previsões, na mesma ordem da entrada.
+        """
+        return [
+            self._predict_one(transaction.description, transaction.category or '', top_k)
+            for transaction in transactions
+        ]
+
     def retrain_from_feedback(self, feedbacks: list[dict], token: str):
         """Re-treina o modelo com base no feedback do usuário.
 
@@ -132,3 +583,13 @@ class TransactionClassifier(ABC):
         :raises NotImplementedError: Se não implementado na subclasse.
         """
         raise NotImplementedError
+
+    def apply_feedback(self, feedbacks: list[dict], token: str):
+        """Aplica feedbacks como ``retrain_from_feedback``, mas propagando os erros em vez de devolvê-los no
+        resultado (usado pelo buffer de feedbacks, que tenta de novo os lotes que falharam).
+
+        :param feedbacks: Lista de dicionários contendo o feedback do usuário.
+        :param token: Token JWT para autenticação e acesso aos dados do usuário.
+        :return: dict - Resultado do re-treino.
+        """
+        return self.retrain_from_feedback(feedbacks, token)
@@ -0,0 +1,85 @@
+"""
+Relatório e compactação do vocabulário dos modelos de descrição.
+
+O relatório compacta uma cópia em memória de cada modelo e mostra o vocabulário e o tamanho antes e depois, sem
+alterar os arquivos; ``compact`` grava o modelo compactado como uma nova versão. Os limites padrão são os das
+variáveis DESCRIPTION_MAX_MODEL_KB, DESCRIPTION_MAX_VOCABULARY e DESCRIPTION_MIN_TOKEN_COUNT::
+
+    python -m training.vocabulary report --all
+    python -m training.vocabulary compact --users 1,2 --max-kb 256
+"""
+
+import argparse
+import logging
+
+from training.log import configure_logging
+from training.manifest import MODEL_DIR, manifest_for, parse_user_id
+from training.predictors.description import (
+    DESCRIPTION_MAX_MODEL_KB,
+    DESCRIPTION_MAX_VOCABULARY,
+    DESCRIPTION_MIN_TOKEN_COUNT,
+    DescriptionPredictor,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def compact_user(user_id, max_kb: float, max_vocabulary: int, min_count: int, dry_run: bool = True):
+    """
+    Compacta o modelo de descrições de um usuário.
+
+    :param user_id: Id do usuário.
+    :param max_kb: float - Orçamento do modelo em KB. 0: sem orçamento.
+    :param max_vocabulary: int - Quantidade máxima de características. 0: sem limite.
+    :param min_count: int - Frequência mínima das características.
+    :param dry_run: bool - Apenas calcula o resultado, sem salvar o modelo.
+    :return: dict - Tamanhos antes ('before') e depois ('after') da compactação.
+    """
+    predictor = DescriptionPredictor(user_id)
+    with predictor.writer_lock():
+        predictor.load_model(use_cache=False)
+        report = predictor.compact(max_kb * 1024, max_vocabulary, min_count)
+        if not dry_run and report['after'] != report['before']:
+            predictor.save_model()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Relatório e compactação do vocabulário dos modelos de descrição.')
+    parser.add_argument('command', choices=['report', 'compact'])
+    selection = parser.add_mutually_exclusive_group(required=True)
+    selection.add_argument('--users', help='Ids dos usuários, separados por vírgula.')
+    selection.add_argument('--all', action='store_true', help='Todos os usuários registrados no manifesto.')
+    parser.add_argument('--max-kb', type=float, default=DESCRIPTION_MAX_MODEL_KB, help='0 desativa.')
+    parser.add_argument('--max-vocabulary', type=int, default=DESCRIPTION_MAX_VOCABULARY, help='0 desativa.')
+    parser.add_argument('--min-count', type=int, default=DESCRIPTION_MIN_TOKEN_COUNT)
+    args = parser.parse_args()
+
+    configure_logging()
+    if args.all:
+        users = manifest_for(MODEL_DIR).users()
+    else:
+        users = [parse_user_id(user.strip()) for user in args.users.split(',') if user.strip()]
+
+    print(f'{"usuário":>12} {"vocabulário":>21} {"entradas":>21} {"bytes":>23}')
+    for user_id in users:
+        if not DescriptionPredictor(user_id).is_trained('description'):
+            continue
+        try:
+            report = compact_user(
+                user_id, args.max_kb, args.max_vocabulary, args.min_count, dry_run=args.command == 'report'
+            )
+        except Exception:
+            logger.exception('Erro ao compactar modelo', extra={'user_id': user_id, 'type': 'description'})
+            continue
+        before, after = report['before'], report['after']
+        print(
+            f'{str(user_id):>12} '
+            + ' '.join(f'{before[name]:>10}->{after[name]:<10}' for name in ('vocabulary', 'entries'))
+            + f' {before["bytes"]:>11}->{after["bytes"]:<11}',
+            flush=True,
+        )
+
+
+if __name__ == '__main__':
+    main()
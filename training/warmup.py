@@ -0,0 +1,129 @@
+"""
+Aquecimento do processo da API após o deploy.
+
+Os preditores (e, com eles, o River, o SciPy e o NumPy) não são importados junto com a API: o processo abre a
+porta rapidamente e uma thread de fundo faz as importações e carrega no cache os modelos dos usuários listados em
+WARMUP_USERS e dos WARMUP_RECENT_USERS usuários com os modelos alterados mais recentemente (segundo o manifesto
+dos modelos). Enquanto isso,
+``GET /ready`` responde 503 com o progresso, para que o balanceador só envie tráfego a workers aquecidos.
+
+O pré-carregamento não conta como uso dos modelos: a política de inatividade (ver training.model_store) continua
+vendo apenas os usos reais. Se o manifesto não puder ser consultado, apenas os usuários de WARMUP_USERS são
+aquecidos.
+"""
+
+import logging
+import os
+import threading
+import time
+
+from training.jobs import PREDICTOR_CLASSES, get_predictor_class
+from training.manifest import MODEL_DIR, manifest_for, parse_user_id
+
+WARMUP_USERS = [user.strip() for user in os.getenv('WARMUP_USERS', '').split(',') if user.strip()]
+WARMUP_RECENT_USERS = int(os.getenv('WARMUP_RECENT_USERS', 20))
+
+logger = logging.getLogger(__name__)
+
+
+class Warmup:
+    """Importa os preditores e pré-carrega os modelos em uma thread de fundo, registrando o progresso."""
+
+    def __init__(
+        self,
+        users: list = WARMUP_USERS,
+        recent_users: int = WARMUP_RECENT_USERS,
+        model_dir: str = MODEL_DIR,
+    ):
+        self.users = [parse_user_id(str(user)) for user in users]
+        self.recent_users = recent_users
+        self.model_dir = model_dir
+        self.state = 'idle'
+        self.imports_seconds = None
+        self.models_total = 0
+        self.models_loaded = 0
+        self.failures = 0
+        self.started_at = None
+        self.finished_at = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self):
+        # Falhas ao carregar modelos isolados não impedem o tráfego; falha nas importações, sim
+        return self.state == 'done'
+
+    def start(self):
+        """Inicia o aquecimento em segundo plano (chamado na inicialização da API)."""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self.state = 'running'
+            self.started_at = time.time()
+            self._thread = threading.Thread(target=self._run, name='warmup', daemon=True)
+            self._thread.start()
+
+    def status(self):
+        """Retorna o progresso do aquecimento."""
+        with self._lock:
+            end = self.finished_at or time.time()
+            return {
+                'ready': self.ready,
+                'state': self.state,
+                'imports_seconds': self.imports_seconds,
+                'models_total': self.models_total,
+                'models_loaded': self.models_loaded,
+                'failures': self.failures,
+                'seconds': round(end - self.started_at, 3) if self.started_at else None,
+            }
+
+    def targets(self):
+        """
+        Lista os modelos a pré-carregar: os dos usuários configurados e os dos usuários mais recentes.
+
+        :return: list[tuple] - (user_id, tipo do preditor), sem repetições.
+        """
+        targets = [(user_id, predictor_type) for user_id in self.users for predictor_type in PREDICTOR_CLASSES]
+        if self.recent_users > 0:
+            try:
+                recent = manifest_for(self.model_dir).recent(self.recent_users)
+            except Exception:
+                logger.exception('Erro ao consultar o manifesto; aquecendo apenas os usuários configurados')
+                recent = []
+            targets += [
+                (user_id, predictor_type) for user_id, predictor_type in recent if predictor_type in PREDICTOR_CLASSES
+            ]
+        return list(dict.fromkeys(targets))
+
+    def _run(self):
+        try:
+            start = time.perf_counter()
+            predictor_classes = {name: get_predictor_class(name) for name in PREDICTOR_CLASSES}
+            self.imports_seconds = round(time.perf_counter() - start, 3)
+
+            # Usuários configurados podem ainda não ter os dois modelos treinados
+            targets = [
+                (user_id, predictor_type)
+                for user_id, predictor_type in self.targets()
+                if predictor_classes[predictor_type](user_id).is_trained(predictor_type)
+            ]
+            self.models_total = len(targets)
+            for user_id, predictor_type in targets:
+                try:
+                    predictor_classes[predictor_type](user_id).load_model(track_usage=False)
+                    self.models_loaded += 1
+                except Exception:
+                    self.failures += 1
+                    logger.exception('Erro ao pré-carregar modelo', extra={'user_id': user_id, 'type': predictor_type})
+            state = 'done'
+        except Exception:
+            logger.exception('Erro no aquecimento')
+            state = 'failed'
+
+        with self._lock:
+            self.state = state
+            self.finished_at = time.time()
+        logger.info('Aquecimento concluído', extra=self.status())
+
+
+warmup = Warmup()